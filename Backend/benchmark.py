@@ -0,0 +1,301 @@
+"""Reproducible latency/throughput benchmarks for the scoring paths.
+
+Usage:
+    python Backend/benchmark.py [--output results.json] [--baseline baseline.json]
+                                [--threshold 0.10] [--scenarios api_predict,batch,...]
+
+Rows are sampled (fixed seed) from cleaned_cardio.csv. Each scenario reports
+throughput, latency percentiles and the process's peak RSS so far (a
+high-water mark over every scenario run before it, not that scenario's own
+use). Batch sizes larger than the sampled rows are skipped, not repeated.
+Results are written as JSON; with --baseline, any scenario whose p50 latency
+grew by more than --threshold (fraction) is reported as a regression and the
+exit code is 1. The Streamlit scenarios are also held to fixed time budgets
+(STREAMLIT_BUDGET_MS), which fail the run the same way.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BACKEND_DIR)
+DATA_PATH = os.path.join(BACKEND_DIR, "cleaned_cardio.csv")
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process since it started, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def sample_rows(n, seed):
+    """Feature matrix and API payloads for n rows of cleaned_cardio.csv"""
+    from dataset import load_dataset
+    from preprocessing import FEATURES
+    df = load_dataset(DATA_PATH).to_frame().sample(n=n, replace=n > 68000, random_state=seed)
+    X = df[FEATURES].to_numpy(dtype=np.float64)
+    payloads = [
+        {
+            "age": float(r.age),
+            "gender": int(r.gender),
+            "bmi": float(r.bmi),
+            "cholesterol": int(r.cholesterol),
+            "gluc": int(r.gluc),
+            "systolic_bp": float(r.ap_hi),
+            "diastolic_bp": float(r.ap_lo),
+            "smoking_status": int(r.smoke),
+            "alcohol_intake": int(r.alco),
+            "physical_activity": int(r.active),
+        }
+        for r in df.itertuples()
+    ]
+    return X, payloads
+
+
+def measure(fn, calls, rows_per_call=1, warmup=5):
+    """Time fn(i) for each i; returns latency percentiles and throughput"""
+    for i in range(min(warmup, calls)):
+        fn(i)
+    latencies = np.empty(calls)
+    errors = 0
+    start = time.perf_counter()
+    for i in range(calls):
+        t0 = time.perf_counter()
+        if fn(i) is False:
+            errors += 1
+        latencies[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "rows_per_call": rows_per_call,
+        "errors": errors,
+        "throughput_rows_per_s": round(calls * rows_per_call / elapsed, 1),
+        "mean_ms": round(latencies.mean() * 1000, 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 4),
+        "max_ms": round(latencies.max() * 1000, 4),
+        "process_peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def batch_sizes(n):
+    """BATCH_SIZES that fit in n sampled rows (larger ones would overstate rows per call)"""
+    skipped = [size for size in BATCH_SIZES if size > n]
+    if skipped:
+        print(f"Skipping batch sizes {', '.join(map(str, skipped))}: only {n} rows sampled (see --rows)")
+    return [size for size in BATCH_SIZES if size <= n]
+
+
+def bench_api(X, payloads, iterations):
+    from main import app
+    client = app.test_client()
+    n = len(payloads)
+    results = {
+        "api_predict": measure(
+            lambda i: client.post("/api/predict", json=payloads[i % n]).status_code == 200, iterations),
+        "api_report": measure(
+            lambda i: client.post("/api/report", json=dict(payloads[i % n], risk_score=0.5)).status_code == 200,
+            iterations),
+    }
+    for size in batch_sizes(n):
+        if size == 1:
+            continue
+        calls = max(3, iterations // size)
+        batches = [payloads[j:j + size] for j in range(0, n - size + 1, size)]
+        results[f"api_predict_batch_{size}"] = measure(
+            lambda i: client.post("/api/predict/batch", json=batches[i % len(batches)]).status_code == 200,
+            calls, rows_per_call=size)
+    return results
+
+
+def bench_model(X, payloads, iterations):
+    from model_registry import registry
+    predictor = registry.get().predictor
+    n = len(X)
+    results = {
+        "model_single_row": measure(lambda i: predictor.predict_one(X[i % n]), iterations),
+    }
+    for size in batch_sizes(n):
+        calls = max(3, min(iterations, 20 * iterations // size))
+        starts = np.arange(0, n - size + 1, size)
+        results[f"model_batch_{size}"] = measure(
+            lambda i: predictor.predict_proba(X[starts[i % len(starts)]:starts[i % len(starts)] + size]),
+            calls, rows_per_call=size)
+    return results
+
+
+def bench_sklearn(X, payloads, iterations):
+    """The original scaler.transform + predict_proba path, for comparison"""
+    try:
+        import joblib
+        model = joblib.load(os.path.join(BACKEND_DIR, "cardio_model.pkl"))
+        scaler = joblib.load(os.path.join(BACKEND_DIR, "scaler.pkl"))
+    except ImportError:
+        return {}
+    n = len(X)
+    rows = [X[i].reshape(1, -1) for i in range(n)]
+    results = {
+        "sklearn_single_row": measure(lambda i: model.predict_proba(scaler.transform(rows[i % n])), iterations),
+    }
+    if n >= 1000:
+        results["sklearn_batch_1000"] = measure(
+            lambda i: model.predict_proba(scaler.transform(X[:1000])), max(3, iterations // 50), rows_per_call=1000)
+    return results
+
+
+# Streamlit time budgets (p50, ms, one core, about 2x the measured time so the
+# AppTest harness's jitter does not trip them); main() fails when one is exceeded.
+# First run: fresh process, dashboard render including imports and model load.
+STREAMLIT_BUDGET_MS = {
+    "streamlit_first_run": 3500,
+    "streamlit_step0_rerun": 120,
+    "streamlit_step1_rerun": 100,
+    "streamlit_step4_rerun": 120,
+}
+
+STREAMLIT_FIRST_RUN = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+app_test = AppTest.from_file(sys.argv[1], default_timeout=60)
+start = time.perf_counter()
+app_test.run()
+print(time.perf_counter() - start if not app_test.exception else -1)
+"""
+
+
+def bench_streamlit(X, payloads, iterations):
+    """Streamlit first run and full reruns of app.py's dashboard, form and report steps"""
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {}
+    import subprocess
+
+    app_path = os.path.join(ROOT_DIR, "app.py")
+    n = len(payloads)
+
+    def first_run(i):
+        # A fresh interpreter each time, so nothing is imported or cached yet
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", STREAMLIT_FIRST_RUN, app_path],
+                             capture_output=True, text=True).stdout.split()
+        return bool(out) and float(out[-1]) >= 0
+
+    def reruns(step):
+        app_test = AppTest.from_file(app_path, default_timeout=60)
+
+        def rerun(i):
+            p = payloads[i % n]
+            app_test.session_state.step = step
+            app_test.session_state.final_inputs = {
+                "name": "Benchmark Patient",
+                "age": int(p["age"]),
+                "height": 170,
+                "weight": round(p["bmi"] * 1.7 ** 2, 1),
+                "ap_hi": int(p["systolic_bp"]),
+                "ap_lo": int(p["diastolic_bp"]),
+                "chol": ["Normal", "Above Normal", "Well Above Normal"][p["cholesterol"] - 1],
+                "gluc": ["Normal", "Above Normal", "Well Above Normal"][p["gluc"] - 1],
+            }
+            app_test.run()
+            return not app_test.exception
+        return rerun
+
+    calls = max(5, iterations // 50)
+    return {
+        # The subprocess's own wall time is what is measured, interpreter start included
+        "streamlit_first_run": measure(first_run, 3, warmup=0),
+        "streamlit_step0_rerun": measure(reruns(0), calls, warmup=2),
+        "streamlit_step1_rerun": measure(reruns(1), calls, warmup=2),
+        "streamlit_step4_rerun": measure(reruns(4), calls, warmup=2),
+    }
+
+
+SCENARIOS = {
+    "api": bench_api,
+    "model": bench_model,
+    "sklearn": bench_sklearn,
+    "streamlit": bench_streamlit,
+}
+
+
+def compare(results, baseline, threshold):
+    """Scenarios whose p50 latency regressed by more than threshold"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous or not previous.get("p50_ms"):
+            continue
+        change = current["p50_ms"] / previous["p50_ms"] - 1
+        if change > threshold:
+            regressions.append((name, previous["p50_ms"], current["p50_ms"], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the CardioML scoring paths")
+    parser.add_argument("--iterations", type=int, default=1000, help="Calls per single-row scenario")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows sampled from cleaned_cardio.csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown (default: 0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    X, payloads = sample_rows(args.rows, args.seed)
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "settings": {"iterations": args.iterations, "rows": args.rows, "seed": args.seed},
+        "scenarios": {},
+    }
+    for name in args.scenarios.split(","):
+        name = name.strip()
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario '{name}'")
+        for scenario, stats in SCENARIOS[name](X, payloads, args.iterations).items():
+            results["scenarios"][scenario] = stats
+            print(f"{scenario:28s} p50 {stats['p50_ms']:9.4f} ms  p99 {stats['p99_ms']:9.4f} ms  "
+                  f"{stats['throughput_rows_per_s']:12.1f} rows/s  errors {stats['errors']}  "
+                  f"peak RSS so far {stats['process_peak_rss_mb']} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    over_budget = [(name, results["scenarios"][name]["p50_ms"], budget)
+                   for name, budget in STREAMLIT_BUDGET_MS.items()
+                   if results["scenarios"].get(name, {}).get("p50_ms", 0) > budget]
+    for name, p50, budget in over_budget:
+        print(f"OVER BUDGET {name}: p50 {p50:.1f} ms > {budget} ms")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: p50 {before:.4f} ms -> {after:.4f} ms (+{change:.0%})")
+        if regressions:
+            return 1
+        print(f"No p50 regressions above {args.threshold:.0%} against {args.baseline}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Stream a patient CSV through cleaning, feature building and the saved model.
+
+Usage:
+    python Backend/bulk_score.py INPUT.csv OUTPUT.csv [--chunksize 50000]
+
+The input is read in fixed-size chunks and every scored chunk is appended to the
+output straight away, so memory use is bounded by the chunk size rather than the
+file size. Both the raw semicolon-separated cardio_train.csv layout and the
+comma-separated cleaned_cardio.csv layout are accepted.
+
+With --cached the input is cleaned once into the columnar dataset cache
+(dataset.py) and scored from the memory-mapped columns, so scoring the same
+file again skips parsing and cleaning entirely.
+"""
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from dataset import detect_separator, load_dataset
+from preprocessing import RAW_COLUMNS, clean_with_report, build_features
+from risk_levels import classify_risks
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def score_rows(ids, ages, bmis, X, model, scaler):
+    """Scored output rows for one chunk"""
+    risk_scores = model.predict_proba(scaler.transform(X))[:, 1]
+    out = pd.DataFrame({"id": ids} if ids is not None else {})
+    out["age"] = ages
+    out["bmi"] = np.round(bmis, 2)
+    out["risk_score"] = risk_scores.round(4)
+    out["risk_category"] = classify_risks(risk_scores)
+    out["prediction"] = (risk_scores >= 0.5).astype(int)
+    return out
+
+
+def score_csv(input_path, output_path, model, scaler, chunksize=50000, sep=None):
+    """Score a CSV chunk by chunk, appending results to the output file"""
+    sep = sep or detect_separator(input_path)
+    stats = {"rows_read": 0, "rows_scored": 0, "chunks": 0, "dropped_by_rule": {}}
+
+    reader = pd.read_csv(input_path, sep=sep, chunksize=chunksize)
+    header = True
+    for chunk in reader:
+        missing = [c for c in RAW_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f"Input is missing columns: {', '.join(missing)}")
+
+        stats["rows_read"] += len(chunk)
+        cleaned, report = clean_with_report(chunk)
+        for rule, count in report["dropped"].items():
+            stats["dropped_by_rule"][rule] = stats["dropped_by_rule"].get(rule, 0) + count
+        if len(cleaned):
+            ids = cleaned["id"].to_numpy() if "id" in cleaned.columns else None
+            out = score_rows(ids, cleaned["age"].to_numpy(), cleaned["bmi"].to_numpy(),
+                             build_features(cleaned), model, scaler)
+            out.to_csv(output_path, mode="w" if header else "a", header=header, index=False)
+            header = False
+            stats["rows_scored"] += len(out)
+        stats["chunks"] += 1
+
+    if header:
+        # Nothing survived cleaning, still leave a valid (empty) output file
+        pd.DataFrame(columns=["id", "age", "bmi", "risk_score", "risk_category", "prediction"]).to_csv(output_path, index=False)
+    stats["rows_dropped"] = stats["rows_read"] - stats["rows_scored"]
+    return stats
+
+
+def score_dataset(input_path, output_path, model, scaler, chunksize=50000):
+    """Score a CSV from the dataset cache, chunk by chunk over the mapped columns"""
+    dataset = load_dataset(input_path)
+    stats = {"rows_read": dataset.meta["rows_read"], "rows_scored": 0, "chunks": 0,
+             "dropped_by_rule": dict(dataset.meta.get("dropped", {}))}
+    for start in range(0, len(dataset), chunksize):
+        stop = start + chunksize
+        out = score_rows(dataset["id"][start:stop], dataset["age"][start:stop], dataset["bmi"][start:stop],
+                         dataset.feature_matrix(start, stop), model, scaler)
+        out.to_csv(output_path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+        stats["rows_scored"] += len(out)
+        stats["chunks"] += 1
+    if not stats["chunks"]:
+        pd.DataFrame(columns=["id", "age", "bmi", "risk_score", "risk_category", "prediction"]).to_csv(output_path, index=False)
+    stats["rows_dropped"] = stats["rows_read"] - stats["rows_scored"]
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a patient CSV through the cardio risk model")
+    parser.add_argument("input", help="CSV file shaped like cardio_train.csv or cleaned_cardio.csv")
+    parser.add_argument("output", help="Where to write the scored CSV")
+    parser.add_argument("--chunksize", type=int, default=50000, help="Rows per chunk (default: 50000)")
+    parser.add_argument("--sep", default=None, help="CSV separator (default: detected from the header)")
+    parser.add_argument("--cached", action="store_true",
+                        help="Score from the columnar dataset cache (fast when the same file is scored again)")
+    parser.add_argument("--model", default=os.path.join(BACKEND_DIR, "cardio_model.pkl"))
+    parser.add_argument("--scaler", default=os.path.join(BACKEND_DIR, "scaler.pkl"))
+    args = parser.parse_args(argv)
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+
+    start = time.time()
+    if args.cached:
+        stats = score_dataset(args.input, args.output, model, scaler, chunksize=args.chunksize)
+    else:
+        stats = score_csv(args.input, args.output, model, scaler, chunksize=args.chunksize, sep=args.sep)
+    elapsed = time.time() - start
+
+    print(f"Scored {stats['rows_scored']} of {stats['rows_read']} rows "
+          f"({stats['rows_dropped']} dropped by cleaning) in {stats['chunks']} chunks, {elapsed:.2f}s")
+    for rule, count in stats["dropped_by_rule"].items():
+        print(f"  {rule:20s} dropped {count}")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,545 @@
+"""Compile the saved scikit-learn model into flat NumPy arrays and score from them.
+
+Usage:
+    python Backend/compiled_model.py [--no-fold] [--verify-only]
+
+Exports cardio_model.pkl + scaler.pkl into cardio_model.npz and checks the
+compiled predictions against scikit-learn on every row of cleaned_cardio.csv.
+By default the StandardScaler is folded into the model (tree thresholds mapped
+back to raw feature values, logistic regression coefficients rescaled), so
+serving scores raw features in one pass without an intermediate scaled copy.
+Loading and scoring a compiled model only needs NumPy, so the API does not have
+to import scikit-learn at all.
+"""
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BACKEND_DIR, "cardio_model.pkl")
+SCALER_PATH = os.path.join(BACKEND_DIR, "scaler.pkl")
+COMPILED_PATH = os.path.join(BACKEND_DIR, "cardio_model.npz")
+DATA_PATH = os.path.join(BACKEND_DIR, "cleaned_cardio.csv")
+
+# Marks a node without children in scikit-learn trees
+TREE_LEAF = -1
+
+# Largest difference allowed between folded logistic regression and scikit-learn
+# (rescaling the coefficients changes rounding, not the model)
+LINEAR_FOLD_TOLERANCE = 1e-12
+
+
+_expit = None
+
+
+def _stable_sigmoid(z):
+    """Logistic function without overflow: exp() only ever sees -|z|"""
+    z = np.asarray(z)
+    e = np.exp(-np.abs(z))
+    return np.where(z >= 0, 1 / (1 + e), e / (1 + e))
+
+
+def sigmoid(z):
+    """Logistic function
+
+    scikit-learn's logistic regression uses scipy's expit; sharing it keeps
+    probabilities bit-identical (NumPy's vectorised exp can differ by an ulp).
+    scipy is imported on first use, since tree models (and app startup) never
+    need it.
+    """
+    global _expit
+    if _expit is None:
+        try:
+            from scipy.special import expit as _expit
+        except ImportError:
+            _expit = _stable_sigmoid
+    return _expit(z)
+
+
+def _compile_trees(estimators):
+    """Concatenate fitted trees into one set of node arrays"""
+    features, thresholds, lefts, rights, probas = [], [], [], [], []
+    roots, depths = [], []
+    offset = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == TREE_LEAF
+        node_ids = np.arange(n_nodes)
+
+        # Leaves point back at themselves so a fixed number of steps always
+        # ends on the right leaf, whatever the path length
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+        # Leaf values are the class fractions predict_proba returns
+        value = tree.value[:, 0, :estimator.n_classes_]
+        totals = value.sum(axis=1, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            # Older scikit-learn stored class counts rather than fractions
+            totals[totals == 0] = 1
+            value = value / totals
+        probas.append(value)
+
+        roots.append(offset)
+        depths.append(tree.max_depth)
+        offset += n_nodes
+
+    return {
+        "feature": np.concatenate(features).astype(np.intp),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": np.concatenate(lefts).astype(np.intp),
+        "right": np.concatenate(rights).astype(np.intp),
+        "proba": np.concatenate(probas).astype(np.float64),
+        "roots": np.array(roots, dtype=np.intp),
+        "depths": np.array(depths, dtype=np.intp),
+    }
+
+
+def _ordered_key(x):
+    """Map a float64 to an int64 with the same ordering"""
+    bits = struct.unpack("<q", struct.pack("<d", x))[0]
+    return bits if bits >= 0 else -(bits & 0x7FFFFFFFFFFFFFFF)
+
+
+def _from_ordered_key(key):
+    bits = key if key >= 0 else (-key) | -0x8000000000000000
+    return struct.unpack("<d", struct.pack("<q", bits))[0]
+
+
+def _raw_threshold(threshold, mean, scale):
+    """Largest raw value x with float32((x - mean) / scale) <= threshold
+
+    The scaled comparison is monotonic in x, so a tree split on the scaled
+    feature is exactly the split x <= this value on the raw feature.
+    """
+    def goes_left(x):
+        return float(np.float32((x - mean) / scale)) <= threshold
+
+    guess = threshold * scale + mean
+    step = max(abs(guess), 1.0) * 1e-6
+    lo, hi = guess, guess
+    while not goes_left(lo):
+        lo -= step
+        step *= 2
+    while goes_left(hi):
+        hi += step
+        step *= 2
+
+    # Bisect on the float64 bit patterns so the boundary is exact
+    lo_key, hi_key = _ordered_key(lo), _ordered_key(hi)
+    while hi_key - lo_key > 1:
+        mid_key = (lo_key + hi_key) // 2
+        if goes_left(_from_ordered_key(mid_key)):
+            lo_key = mid_key
+        else:
+            hi_key = mid_key
+    return _from_ordered_key(lo_key)
+
+
+def fold_scaler(compiled):
+    """Fold the StandardScaler into the model so it scores raw features directly"""
+    if compiled.folded:
+        return compiled
+    arrays = dict(compiled.arrays)
+    mean, scale = arrays["mean"], arrays["scale"]
+
+    if compiled.kind == "linear":
+        coef = arrays["coef"][:, 0]
+        arrays["coef"] = (coef / scale).reshape(-1, 1)
+        arrays["intercept"] = arrays["intercept"] - np.dot(coef / scale, mean)
+    else:
+        is_leaf = arrays["left"] == np.arange(len(arrays["left"]))
+        thresholds = arrays["threshold"].copy()
+        for i in np.flatnonzero(~is_leaf):
+            f = arrays["feature"][i]
+            thresholds[i] = _raw_threshold(float(thresholds[i]), float(mean[f]), float(scale[f]))
+        arrays["threshold"] = thresholds
+
+    meta = dict(compiled.meta, folded=True)
+    return CompiledModel(meta, arrays)
+
+
+def compile_model(model, scaler):
+    """Turn a fitted model and StandardScaler into a CompiledModel"""
+    arrays = {
+        "mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "classes": np.asarray(model.classes_),
+    }
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        kind = "forest"
+        arrays.update(_compile_trees(model.estimators_))
+    elif hasattr(model, "tree_"):
+        kind = "tree"
+        arrays.update(_compile_trees([model]))
+    elif hasattr(model, "coef_") and len(model.classes_) == 2:
+        kind = "linear"
+        arrays["coef"] = np.asarray(model.coef_, dtype=np.float64).T
+        arrays["intercept"] = np.asarray(model.intercept_, dtype=np.float64)
+    else:
+        raise ValueError(f"Cannot compile {type(model).__name__}")
+
+    if hasattr(model, "feature_importances_"):
+        arrays["feature_importances"] = np.asarray(model.feature_importances_, dtype=np.float64)
+
+    meta = {
+        "kind": kind,
+        "estimator": type(model).__name__,
+        "params": {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "feature_names": [str(f) for f in getattr(scaler, "feature_names_in_", [])],
+    }
+    return CompiledModel(meta, arrays)
+
+
+class CompiledModel:
+    """A model plus its StandardScaler, scored from plain NumPy arrays"""
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.kind = meta["kind"]
+        self.arrays = arrays
+        self.classes_ = arrays["classes"]
+        self.feature_names = meta.get("feature_names", [])
+        self.params = meta.get("params", {})
+        self.folded = meta.get("folded", False)
+        self.n_features = len(arrays["mean"])
+        if "feature_importances" in arrays:
+            self.feature_importances_ = arrays["feature_importances"]
+
+        self._mean = arrays["mean"]
+        self._scale = arrays["scale"]
+        if self.kind in ("tree", "forest"):
+            self._n_trees = len(arrays["roots"])
+            # Plain lists make the single-row walk cheap
+            self._node_lists = tuple(arrays[k].tolist() for k in ("feature", "threshold", "left", "right"))
+            self._proba_list = arrays["proba"].tolist()
+            # Positive-class value of every node, for path attributions
+            self._positive = arrays["proba"][:, 1]
+            self._positive_list = self._positive.tolist()
+
+    @classmethod
+    def load(cls, path=COMPILED_PATH):
+        """Load a compiled model written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {k: data[k] for k in data.files if k != "meta"}
+        return cls(meta, arrays)
+
+    def save(self, path=COMPILED_PATH):
+        """Write the model arrays and metadata to a .npz file"""
+        np.savez(path, meta=np.array(json.dumps(self.meta)), **self.arrays)
+
+    def _check(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        return X
+
+    def _scale_rows(self, X):
+        if self.folded:
+            return X
+        # Same operations, in the same order, as StandardScaler.transform
+        X = X - self._mean
+        X /= self._scale
+        return X
+
+    def _tree_proba(self, X):
+        if not self.folded:
+            # Trees compare float32 inputs, as scikit-learn does
+            X = X.astype(np.float32)
+        a = self.arrays
+        rows = np.arange(X.shape[0])
+        total = np.zeros((X.shape[0], a["proba"].shape[1]), dtype=np.float64)
+        for root, depth in zip(a["roots"], a["depths"]):
+            node = np.full(X.shape[0], root, dtype=np.intp)
+            for _ in range(depth):
+                go_left = X[rows, a["feature"][node]] <= a["threshold"][node]
+                node = np.where(go_left, a["left"][node], a["right"][node])
+            total += a["proba"][node]
+        if self.kind == "forest":
+            total /= self._n_trees
+        return total
+
+    def _linear_proba(self, X):
+        decision = (X @ self.arrays["coef"] + self.arrays["intercept"]).reshape(-1)
+        p = sigmoid(decision)
+        return np.stack([1 - p, p], axis=1)
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2-D array of raw (unscaled) features"""
+        X = self._scale_rows(self._check(X))
+        if self.kind == "linear":
+            return self._linear_proba(X)
+        return self._tree_proba(X)
+
+    def predict(self, X):
+        """Predicted class labels"""
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_one(self, row):
+        """Positive-class probability for a single row of raw features"""
+        x = self._scale_rows(self._check(row))
+        if self.kind == "linear":
+            return float(self._linear_proba(x)[0, 1])
+
+        if not self.folded:
+            x = x.astype(np.float32)
+        x = x[0].tolist()
+        feature, threshold, left, right = self._node_lists
+        total = 0.0
+        for root in self.arrays["roots"].tolist():
+            node = root
+            while left[node] != node:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            total += self._proba_list[node][1]
+        if self.kind == "forest":
+            total /= self._n_trees
+        return total
+
+    def explain(self, X):
+        """Risk scores plus per-feature contributions for a 2-D array of raw features
+
+        Returns (scores, base_value, contributions) where each row satisfies
+        base_value + contributions.sum() == score (up to rounding). Trees and
+        forests use path attributions: every split on the way to the leaf
+        credits its feature with the change in the node's positive-class
+        value, averaged over the trees of a forest. Logistic regression uses
+        coefficient * (value - training mean) in log-odds, rescaled so the
+        contributions add up in probability.
+        """
+        X = self._check(X)
+        if self.kind == "linear":
+            return self._linear_explain(self._scale_rows(X))
+        if not self.folded:
+            X = self._scale_rows(X).astype(np.float32)
+        a = self.arrays
+        positive = self._positive
+        rows = np.arange(X.shape[0])
+        scores = np.zeros(X.shape[0], dtype=np.float64)
+        contributions = np.zeros((X.shape[0], self.n_features), dtype=np.float64)
+        for root, depth in zip(a["roots"], a["depths"]):
+            node = np.full(X.shape[0], root, dtype=np.intp)
+            for _ in range(depth):
+                feature = a["feature"][node]
+                go_left = X[rows, feature] <= a["threshold"][node]
+                child = np.where(go_left, a["left"][node], a["right"][node])
+                # Leaves loop back on themselves and add nothing
+                contributions[rows, feature] += positive[child] - positive[node]
+                node = child
+            scores += positive[node]
+        base_value = float(positive[a["roots"]].mean())
+        if self.kind == "forest":
+            scores /= self._n_trees
+            contributions /= self._n_trees
+        return scores, base_value, contributions
+
+    def explain_one(self, row):
+        """Risk score and per-feature contributions (a list) for a single row"""
+        x = self._scale_rows(self._check(row))
+        if self.kind == "linear":
+            scores, _, contributions = self._linear_explain(x)
+            return float(scores[0]), contributions[0].tolist()
+
+        if not self.folded:
+            x = x.astype(np.float32)
+        x = x[0].tolist()
+        feature, threshold, left, right = self._node_lists
+        positive = self._positive_list
+        contributions = [0.0] * self.n_features
+        total = 0.0
+        for root in self.arrays["roots"].tolist():
+            node = root
+            while left[node] != node:
+                f = feature[node]
+                child = left[node] if x[f] <= threshold[node] else right[node]
+                contributions[f] += positive[child] - positive[node]
+                node = child
+            total += positive[node]
+        if self.kind == "forest":
+            total /= self._n_trees
+            contributions = [c / self._n_trees for c in contributions]
+        return total, contributions
+
+    def _linear_explain(self, X):
+        coef = self.arrays["coef"][:, 0]
+        # The reference point is the training mean (zero once scaled)
+        mean = self._mean if self.folded else np.zeros(self.n_features)
+        scores = self._linear_proba(X)[:, 1]
+        decision = X @ coef + self.arrays["intercept"][0]
+        base_decision = float(mean @ coef + self.arrays["intercept"][0])
+        base_value = float(sigmoid(base_decision))
+        log_odds = (X - mean) * coef
+
+        # Share the change in probability out in proportion to each feature's
+        # log-odds contribution (the slope of the sigmoid at a zero change)
+        change = decision - base_decision
+        slope = base_value * (1 - base_value)
+        ratio = np.divide(scores - base_value, change, out=np.full(len(change), slope), where=change != 0)
+        return scores, base_value, log_odds * ratio[:, None]
+
+
+class SklearnModel:
+    """Fallback wrapper for models neither the compiler nor knn_index.py handles"""
+
+    def __init__(self, model, scaler):
+        self.model = model
+        self.scaler = scaler
+        self.kind = "sklearn"
+        self.classes_ = model.classes_
+        self.params = model.get_params()
+        self.n_features = len(scaler.mean_)
+        if hasattr(model, "feature_importances_"):
+            self.feature_importances_ = model.feature_importances_
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        return self.model.predict(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict_one(self, row):
+        return float(self.predict_proba(np.asarray(row, dtype=np.float64).reshape(1, -1))[0, 1])
+
+
+def load_predictor(compiled_path=COMPILED_PATH, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """Load the compiled model, compiling from the pickles if it is missing or stale
+
+    A compiled model is stale unless it records the fingerprint of the model
+    and scaler pickles it was compiled from (the scaler is folded into its
+    thresholds, so either one changing matters). Without the pickles it is
+    served as it is.
+    """
+    if os.path.exists(compiled_path):
+        compiled = CompiledModel.load(compiled_path)
+        if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+            return compiled
+        if compiled.meta.get("source_fingerprint") == file_fingerprint(model_path, scaler_path):
+            return compiled
+
+    # KNN models are served from their prebuilt index without unpickling them
+    from knn_index import is_knn, load_knn_index, open_knn_index
+    index = open_knn_index(model_path, scaler_path)
+    if index is not None:
+        return index
+
+    import joblib
+    model = joblib.load(model_path)
+    scaler = joblib.load(scaler_path)
+    try:
+        return compile_model(model, scaler)
+    except ValueError:
+        if is_knn(model):
+            return load_knn_index(model, scaler, model_path, scaler_path)
+        return SklearnModel(model, scaler)
+
+
+def file_fingerprint(*paths):
+    """Hash of artifact files, used to detect indexes built from other artifacts"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def save_arrays(arrays, meta, directory):
+    """Write arrays as .npy files plus meta.json into directory, replacing old ones
+
+    Other processes may have the old files memory-mapped, so nothing is
+    overwritten in place: each file is written under a temporary name and
+    renamed over the old one (mappings keep the unlinked old file). meta.json
+    goes last, so arrays without it (or with an old one) read as stale.
+    """
+    os.makedirs(directory, exist_ok=True)
+    suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+    for name, array in arrays.items():
+        path = os.path.join(directory, f"{name}.npy")
+        with open(path + suffix, "wb") as f:
+            np.save(f, array)
+        os.replace(path + suffix, path)
+    path = os.path.join(directory, "meta.json")
+    with open(path + suffix, "w") as f:
+        json.dump(meta, f)
+    os.replace(path + suffix, path)
+
+
+def load_verification_rows(path=DATA_PATH):
+    """Feature matrix for every row of cleaned_cardio.csv (from the dataset cache)"""
+    from dataset import load_dataset
+    return load_dataset(path).feature_matrix()
+
+
+def verify(compiled, model, scaler, X, n_single=2000):
+    """Compare compiled and scikit-learn predictions; returns (exact, max_abs_diff)
+
+    Batches are checked on every row; single rows are checked against
+    scikit-learn scoring the same row on its own, since BLAS may sum a
+    one-row product in a different order than a batch.
+    """
+    expected = model.predict_proba(scaler.transform(X))
+    batch = compiled.predict_proba(X)
+    rows = X[:n_single]
+    expected_single = np.array([model.predict_proba(scaler.transform(r.reshape(1, -1)))[0, 1] for r in rows])
+    single = np.array([compiled.predict_one(r) for r in rows])
+    exact = np.array_equal(batch, expected) and np.array_equal(single, expected_single)
+    diff = max(float(np.abs(batch - expected).max()), float(np.abs(single - expected_single).max()))
+    return exact, diff
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile cardio_model.pkl into a NumPy-only model")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--output", default=COMPILED_PATH)
+    parser.add_argument("--data", default=DATA_PATH, help="CSV used to check predictions")
+    parser.add_argument("--no-fold", action="store_true", help="Keep the scaler as a separate step")
+    parser.add_argument("--verify-only", action="store_true", help="Check an existing compiled model")
+    args = parser.parse_args(argv)
+
+    import joblib
+    import warnings
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+
+    if args.verify_only:
+        compiled = CompiledModel.load(args.output)
+    else:
+        compiled = compile_model(model, scaler)
+        if not args.no_fold:
+            compiled = fold_scaler(compiled)
+
+    X = load_verification_rows(args.data)
+    exact, diff = verify(compiled, model, scaler, X)
+    same_classes = np.array_equal(compiled.predict(X), model.predict(scaler.transform(X)))
+    label = "folded" if compiled.folded else "scaled"
+    print(f"{compiled.meta['estimator']} ({label}): {len(X)} rows, max |diff| = {diff:.3g}, "
+          f"{'bit-for-bit match' if exact else 'predictions differ'}"
+          f"{'' if same_classes else ', PREDICTED CLASSES DIFFER'}")
+    # Rescaled logistic regression coefficients round differently; everything
+    # else must match scikit-learn exactly
+    allowed = LINEAR_FOLD_TOLERANCE if compiled.folded and compiled.kind == "linear" else 0.0
+    if diff > allowed or not same_classes:
+        return 1
+
+    if not args.verify_only:
+        compiled.meta["source_fingerprint"] = file_fingerprint(args.model, args.scaler)
+        compiled.save(args.output)
+        print(f"Compiled model written to {args.output} ({os.path.getsize(args.output)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
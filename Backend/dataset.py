@@ -0,0 +1,341 @@
+"""Columnar binary cache of the cleaned dataset, loaded with memory mapping.
+
+Usage:
+    python Backend/dataset.py [CSV] [--rebuild]
+
+The first load of a CSV runs the cleaning rules from preprocessing.py once
+and writes every model column to its own .npy file with a narrow dtype
+(int8 flags and categories, int16 age and blood pressure). The
+cache directory is named after a hash of the CSV contents and of the
+cleaning code, so editing either one builds a fresh cache instead of reading
+a stale one. Later loads memory-map the column files: no parsing, and pages
+are only read when a column is used.
+
+Newly labelled records (append_dataset) are first copied into an append log
+next to the CSV (cleaned_cardio.appends/ for cleaned_cardio.csv) and then
+added to the cache. Every load replays the log entries a cache is missing,
+so rebuilding it, or a change to the cleaning rules, keeps those rows.
+
+BMI stays float64: training, evaluation and the compiled-model checks must
+see exactly the values the CSV holds and the API scores, and a tree split can
+fall between a BMI and its float32 rounding.
+"""
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import preprocessing
+from compiled_model import save_arrays
+from feature_schema import DATASET_GENDER_CODES, FEATURES
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BACKEND_DIR, "cleaned_cardio.csv")
+CACHE_DIR = os.path.join(BACKEND_DIR, ".cache")
+
+# Bump when the on-disk layout changes
+FORMAT_VERSION = 1
+
+# Stored columns and their dtypes; gender is stored encoded (Female=0, Male=1)
+COLUMN_DTYPES = {
+    "id": np.int32,
+    "age": np.int16,
+    "gender": np.int8,
+    "ap_hi": np.int16,
+    "ap_lo": np.int16,
+    "cholesterol": np.int8,
+    "gluc": np.int8,
+    "smoke": np.int8,
+    "alco": np.int8,
+    "active": np.int8,
+    "bmi": np.float64,
+    "cardio": np.int8,
+}
+
+
+def file_hash(path):
+    """sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def rules_hash():
+    """Hash of the cleaning and feature code, so rule changes invalidate caches"""
+    source = inspect.getsource(preprocessing)
+    source += json.dumps({name: np.dtype(dtype).str for name, dtype in COLUMN_DTYPES.items()})
+    return hashlib.sha256(f"{FORMAT_VERSION}:{source}".encode()).hexdigest()
+
+
+def dataset_key(path):
+    return hashlib.sha256((file_hash(path) + rules_hash()).encode()).hexdigest()[:16]
+
+
+def narrow(values, dtype):
+    """Cast a column to its storage dtype, refusing to lose information"""
+    values = np.asarray(values)
+    narrowed = values.astype(dtype)
+    if np.issubdtype(np.dtype(dtype), np.integer) and not np.array_equal(narrowed, values):
+        raise ValueError(f"Values do not fit {np.dtype(dtype).name} without loss")
+    return narrowed
+
+
+def detect_separator(path):
+    """CSV separator of a file, guessed from its header line (";" for cardio_train.csv, else ",")
+
+    Every loader of raw or cleaned CSVs uses this, so a file parses the same
+    way whichever entry point reads it.
+    """
+    with open(path, "r") as f:
+        header = f.readline()
+    return ";" if header.count(";") > header.count(",") else ","
+
+
+def read_clean(path):
+    """Read a CSV (either separator) and apply the cleaning rules; returns (cleaned, report)"""
+    return preprocessing.clean_with_report(pd.read_csv(path, sep=detect_separator(path)))
+
+
+def column_values(df, first_id=0):
+    """Stored columns of a cleaned DataFrame, narrowed to their dtypes"""
+    columns = {
+        "id": df["id"] if "id" in df.columns else np.arange(first_id, first_id + len(df)),
+        "gender": df["gender"].map(DATASET_GENDER_CODES),
+    }
+    values = {}
+    for name, dtype in COLUMN_DTYPES.items():
+        try:
+            values[name] = narrow(columns[name] if name in columns else df[name], dtype)
+        except ValueError as e:
+            raise ValueError(f"Column '{name}': {e}") from None
+    return values
+
+
+def build_dataset(path, directory):
+    """Clean a CSV and write its columns to directory; returns the row count"""
+    df, report = read_clean(path)
+    columns = column_values(df)
+
+    # Written under a temporary name and renamed, so readers never see half a cache
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "source": os.path.abspath(path),
+        "source_sha256": file_hash(path),
+        "rules_sha256": rules_hash(),
+        "rows_read": report["rows_in"],
+        "rows": len(df),
+        "dropped": report["dropped"],
+        "columns": {name: np.dtype(dtype).name for name, dtype in COLUMN_DTYPES.items()},
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Another process finished the same cache first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return len(df)
+
+
+class Dataset:
+    """Memory-mapped columns of one cleaned dataset"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        # Trimmed to the row count in meta.json: an append interrupted before
+        # meta.json was replaced leaves some columns with rows that are not
+        # part of the dataset yet
+        rows = self.meta["rows"]
+        self.columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")[:rows]
+            for name in self.meta["columns"]
+        }
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def labels(self):
+        return np.asarray(self.columns["cardio"])
+
+    def feature_matrix(self, start=0, stop=None, dtype=np.float64):
+        """Model feature matrix (training column order) for rows start:stop"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        X = np.empty((max(stop - start, 0), len(FEATURES)), dtype=dtype)
+        for j, name in enumerate(FEATURES):
+            X[:, j] = self.columns[name][start:stop]
+        return X
+
+    def take(self, index, dtype=np.float64):
+        """Model feature matrix and labels for the given row numbers"""
+        index = np.asarray(index)
+        X = np.empty((len(index), len(FEATURES)), dtype=dtype)
+        for j, name in enumerate(FEATURES):
+            X[:, j] = self.columns[name][index]
+        return X, np.asarray(self.columns["cardio"][index])
+
+    def to_frame(self):
+        """The columns as a pandas DataFrame (copies them into memory)"""
+        return pd.DataFrame({name: np.asarray(values) for name, values in self.columns.items()})
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+
+def appends_dir(path):
+    """Append log of a dataset CSV: a copy of every records file appended to it"""
+    return f"{os.path.splitext(os.path.abspath(path))[0]}.appends"
+
+
+def read_append_log(path):
+    """Entries of a dataset CSV's append log, oldest first"""
+    log_path = os.path.join(appends_dir(path), "log.json")
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path, "r") as f:
+        return json.load(f)
+
+
+def log_append(path, records_path, digest):
+    """Copy a records file into the append log of the dataset CSV at path (once per contents)"""
+    log = read_append_log(path)
+    if any(entry["sha256"] == digest for entry in log):
+        return
+    directory = appends_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    name = f"{len(log) + 1:05d}-{digest[:12]}.csv"
+    # Written under temporary names and renamed, the log last: an
+    # interrupted append leaves at most an unlisted copy behind
+    suffix = f".tmp-{os.getpid()}"
+    shutil.copyfile(records_path, os.path.join(directory, name) + suffix)
+    os.replace(os.path.join(directory, name) + suffix, os.path.join(directory, name))
+    log.append({"file": name, "sha256": digest, "source": os.path.abspath(records_path),
+                "logged_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    log_path = os.path.join(directory, "log.json")
+    with open(log_path + suffix, "w") as f:
+        json.dump(log, f, indent=2)
+    os.replace(log_path + suffix, log_path)
+
+
+def prepare_append(dataset, path):
+    """Clean a CSV of new labelled records for append_dataset, writing nothing
+
+    Returns (sha256 of the file, stored columns, cleaning report), or None if
+    the file was already appended (same contents).
+    """
+    digest = file_hash(path)
+    if any(a["sha256"] == digest for a in dataset.meta.get("appends", [])):
+        return None
+    df, report = read_clean(path)
+    rows = len(dataset)
+    first_id = int(dataset["id"][-1]) + 1 if rows else 0
+    return digest, column_values(df, first_id), report
+
+
+def append_dataset(dataset, path, prepared=None):
+    """Clean a CSV of new labelled records and append them to a cached dataset
+
+    The file is copied into the source CSV's append log first, then only the
+    new rows are cleaned and each column is written out again with them added,
+    under a temporary name renamed over the old file (readers mapping the old
+    one keep it intact). A file already appended (same contents) is skipped.
+    prepared is the result of prepare_append for the same file, if the rows
+    were already read. Returns (dataset reopened with the new rows, number of
+    rows appended).
+    """
+    if prepared is None:
+        prepared = prepare_append(dataset, path)
+    elif any(a["sha256"] == prepared[0] for a in dataset.meta.get("appends", [])):
+        prepared = None
+    if prepared is None:
+        return dataset, 0
+    digest, columns, report = prepared
+    log_append(dataset.meta["source"], path, digest)
+
+    rows = len(dataset)
+    appended = len(columns["id"])
+    arrays = {name: np.concatenate([dataset[name], values]) for name, values in columns.items()}
+    meta = dict(dataset.meta)
+    meta["rows"] = rows + appended
+    meta["appends"] = dataset.meta.get("appends", []) + [{
+        "source": os.path.abspath(path),
+        "sha256": digest,
+        "rows_read": report["rows_in"],
+        "rows": appended,
+        "dropped": report["dropped"],
+        "appended_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }]
+    # meta.json is replaced last: until then readers keep seeing the old rows
+    save_arrays(arrays, meta, dataset.directory)
+    return Dataset(dataset.directory), appended
+
+
+def load_dataset(path=DATA_PATH, cache_dir=CACHE_DIR, rebuild=False):
+    """Cleaned dataset for a CSV, built into the cache on first use"""
+    directory = os.path.join(cache_dir, f"dataset-{dataset_key(path)}")
+    if rebuild:
+        shutil.rmtree(directory, ignore_errors=True)
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        os.makedirs(cache_dir, exist_ok=True)
+        build_dataset(path, directory)
+    dataset = Dataset(directory)
+    # Records appended since the cache was built (or through another cache)
+    applied = {a["sha256"] for a in dataset.meta.get("appends", [])}
+    for entry in read_append_log(path):
+        if entry["sha256"] not in applied:
+            dataset, _ = append_dataset(dataset, os.path.join(appends_dir(path), entry["file"]))
+    return dataset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect the columnar dataset cache")
+    parser.add_argument("csv", nargs="?", default=DATA_PATH)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild even if a cache exists")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.csv, args.cache_dir, rebuild=args.rebuild)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.csv, args.cache_dir)
+    X = dataset.feature_matrix()
+    cached_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = preprocessing.clean_data(pd.read_csv(args.csv, sep=detect_separator(args.csv)))
+    preprocessing.build_features(df)
+    csv_time = time.perf_counter() - start
+
+    print(f"{len(dataset)} rows cached in {dataset.directory}")
+    print(f"  columns on disk: {dataset.nbytes / 1e6:.2f} MB "
+          f"(DataFrame after cleaning: {df.memory_usage(deep=True).sum() / 1e6:.2f} MB)")
+    print(f"  first load {load_time * 1000:.1f} ms, cached load + feature matrix {cached_time * 1000:.1f} ms, "
+          f"CSV parse + clean {csv_time * 1000:.1f} ms")
+    print(f"  feature matrix {X.shape}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
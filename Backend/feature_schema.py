@@ -0,0 +1,221 @@
+"""The model's input schema, shared by training, the Flask API and the Streamlit app.
+
+Each field lists its training column name, the API field that carries it, the
+other names it is accepted under, its valid range and, for categorical
+fields, the codes the model was trained on with their display labels. FIELDS
+is in training column order (5_final_model_training.ipynb), so encoded rows
+line up with the model whatever order a request uses.
+
+FeatureEncoder turns records into model rows: encode_one() for a single
+request (plain Python, no per-call setup) and encode_many() for batches
+(column-wise, into one preallocated matrix). Both apply the same checks:
+required fields, numbers, ranges, categories (codes or labels) and
+systolic > diastolic blood pressure.
+"""
+import numpy as np
+
+
+class Field:
+    """One model input"""
+
+    def __init__(self, name, api, minimum, maximum, labels=None, default=None, aliases=()):
+        self.name = name
+        self.api = api
+        self.minimum = minimum
+        self.maximum = maximum
+        # Display label -> model code, for categorical fields
+        self.labels = dict(labels or {})
+        self.codes = frozenset(self.labels.values())
+        self.default = default
+        # Keys tried in order when reading a record
+        self.keys = tuple(dict.fromkeys((api, name) + tuple(aliases)))
+        self._lookup = {str(label).lower(): code for label, code in self.labels.items()}
+
+    @property
+    def categorical(self):
+        return bool(self.labels)
+
+    def code(self, label):
+        """Model code for a display label (case-insensitive), or None"""
+        return self._lookup.get(str(label).strip().lower())
+
+    def describe(self):
+        if self.categorical:
+            codes = ", ".join(f"{code} ({label})" for label, code in self.labels.items())
+            return f"{self.api} must be one of {codes}"
+        return f"{self.api} must be between {self.minimum:g} and {self.maximum:g}"
+
+
+LEVELS = {"Normal": 1, "Above Normal": 2, "Well Above Normal": 3}
+YES_NO = {"No": 0, "Yes": 1}
+
+FIELDS = [
+    Field("age", "age", 1, 120),
+    Field("gender", "gender", 0, 1, labels={"Female": 0, "Male": 1}),
+    Field("ap_hi", "systolic_bp", 70, 250),
+    Field("ap_lo", "diastolic_bp", 40, 150),
+    Field("cholesterol", "cholesterol", 1, 3, labels=LEVELS, aliases=("chol",)),
+    Field("gluc", "gluc", 1, 3, labels=LEVELS, aliases=("glucose",)),
+    Field("smoke", "smoking_status", 0, 1, labels=YES_NO),
+    Field("alco", "alcohol_intake", 0, 1, labels=YES_NO, aliases=("alcohol",)),
+    Field("active", "physical_activity", 0, 1, labels={"Inactive": 0, "Active": 1}),
+    Field("bmi", "bmi", 10, 100),
+]
+
+# Training column order
+FEATURES = [field.name for field in FIELDS]
+
+# Gender codes in cardio_train.csv (1 = female, 2 = male) -> model codes
+DATASET_GENDER_CODES = {1: 0, 2: 1}
+
+BY_NAME = {field.name: field for field in FIELDS}
+SYSTOLIC, DIASTOLIC = FEATURES.index("ap_hi"), FEATURES.index("ap_lo")
+
+
+def get_field(name):
+    """Field by training column name or API name"""
+    if name in BY_NAME:
+        return BY_NAME[name]
+    for f in FIELDS:
+        if name in f.keys:
+            return f
+    raise KeyError(name)
+
+
+def validate_bp(systolic, diastolic):
+    """Check a blood pressure reading; returns (ok, message)"""
+    sys_field, dia_field = FIELDS[SYSTOLIC], FIELDS[DIASTOLIC]
+    if systolic <= diastolic:
+        return False, "Systolic BP must be higher than Diastolic BP."
+    if systolic < sys_field.minimum or systolic > sys_field.maximum:
+        return False, "Systolic BP value looks unrealistic."
+    if diastolic < dia_field.minimum or diastolic > dia_field.maximum:
+        return False, "Diastolic BP value looks unrealistic."
+    return True, ""
+
+
+class FeatureEncoder:
+    """Validates records and encodes them into rows in model column order"""
+
+    def __init__(self, fields=FIELDS):
+        self.fields = list(fields)
+        self.n_features = len(self.fields)
+        # Everything encode_one needs, flattened into tuples once
+        self._plan = tuple(
+            (f.keys, f.default, f.minimum, f.maximum, f.codes if f.categorical else None, f)
+            for f in self.fields
+        )
+        self._minimum = np.array([f.minimum for f in self.fields], dtype=np.float64)
+        self._maximum = np.array([f.maximum for f in self.fields], dtype=np.float64)
+
+    def _value(self, f, value):
+        """Number for one raw value, or None if it cannot be one"""
+        if isinstance(value, str) and f.categorical:
+            code = f.code(value)
+            if code is not None:
+                return float(code)
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def encode_one(self, record, out=None):
+        """Encode one record; returns (row, errors) with errors a list of messages"""
+        if not isinstance(record, dict):
+            return np.zeros(self.n_features) if out is None else out, ["Record must be a JSON object"]
+        get = record.get
+        numbers = []
+        errors = []
+        for keys, default, minimum, maximum, codes, f in self._plan:
+            value = get(keys[0])
+            if value is None:
+                for key in keys[1:]:
+                    value = get(key)
+                    if value is not None:
+                        break
+                else:
+                    if default is None:
+                        errors.append(f"Missing required field: {f.api}")
+                        numbers.append(0.0)
+                        continue
+                    value = default
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = self._value(f, value)
+                if number is None:
+                    errors.append(f"Invalid value for {f.api}: {value!r}")
+                    numbers.append(0.0)
+                    continue
+            # NaN and infinities fail the range check too
+            if not minimum <= number <= maximum or (codes is not None and number not in codes):
+                errors.append(f"Invalid value for {f.api}: {value!r} ({f.describe()})")
+            numbers.append(number)
+        if not errors and numbers[SYSTOLIC] <= numbers[DIASTOLIC]:
+            errors.append("systolic_bp must be higher than diastolic_bp")
+        if out is None:
+            return np.array(numbers, dtype=np.float64), errors
+        out[:] = numbers
+        return out, errors
+
+    def encode_many(self, records, row_errors=None):
+        """Validate records column-wise into one matrix; returns (X, valid, row_errors)
+
+        row_errors maps record index -> messages; indices already in it (e.g.
+        lines that were not valid JSON) are reported as they are.
+        """
+        n_rows = len(records)
+        row_errors = dict(row_errors or {})
+        X = np.empty((n_rows, self.n_features), dtype=np.float64)
+        is_record = np.array([isinstance(r, dict) for r in records], dtype=bool)
+        for i in np.flatnonzero(~is_record):
+            row_errors.setdefault(int(i), ["Record must be a JSON object"])
+
+        for j, f in enumerate(self.fields):
+            values = [self._get(r, f) if ok else f.default for r, ok in zip(records, is_record)]
+            try:
+                # Fast path: the whole column converts in one call
+                column = np.array(values, dtype=np.float64)
+            except (TypeError, ValueError):
+                # Labels or bad values somewhere in the column: convert one by one
+                column = np.full(n_rows, np.nan)
+                for i, value in enumerate(values):
+                    number = None if value is None else self._value(f, value)
+                    if number is not None:
+                        column[i] = number
+            bad = ~np.isfinite(column)
+            in_range = (column >= self._minimum[j]) & (column <= self._maximum[j])
+            if f.categorical:
+                in_range &= np.isin(column, list(f.codes))
+            out_of_range = ~bad & ~in_range
+            for i in np.flatnonzero((bad | out_of_range) & is_record):
+                value = values[i]
+                if value is None:
+                    message = f"Missing required field: {f.api}"
+                elif bad[i]:
+                    message = f"Invalid value for {f.api}: {value!r}"
+                else:
+                    message = f"Invalid value for {f.api}: {value!r} ({f.describe()})"
+                row_errors.setdefault(int(i), []).append(message)
+            X[:, j] = column
+
+        inverted = (X[:, SYSTOLIC] <= X[:, DIASTOLIC]) & is_record
+        for i in np.flatnonzero(inverted):
+            if int(i) not in row_errors:
+                row_errors[int(i)] = ["systolic_bp must be higher than diastolic_bp"]
+
+        valid = np.ones(n_rows, dtype=bool)
+        if row_errors:
+            valid[list(row_errors)] = False
+        return X, valid, row_errors
+
+    @staticmethod
+    def _get(record, f):
+        for key in f.keys:
+            value = record.get(key)
+            if value is not None:
+                return value
+        return f.default
+
+
+encoder = FeatureEncoder()
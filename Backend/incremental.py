@@ -0,0 +1,163 @@
+"""Incremental model updates from newly labelled records.
+
+Usage:
+    python Backend/incremental.py NEW_RECORDS.csv [--data cleaned_cardio.csv]
+                                  [--epochs 5] [--learning-rate 0.01] [--no-save]
+
+Updates the deployed model from the new records alone, so the cost grows
+with the size of the update rather than with the whole history, and appends
+them to the dataset (dataset.py: the CSV's append log, then its cache) once
+the update is written:
+
+- Logistic regression: warm-started mini-batch SGD from the current weights
+  (LogisticRegressionTrainer.partial_fit), with the scaler kept as fitted.
+- Decision tree / random forest: each new row is routed through the existing
+  splits and counted at every node on its path, so leaf probabilities (and
+  the explanations built from node probabilities) reflect it. The splits
+  themselves do not move; run train.py now and then to regrow them.
+- KNN: the new rows are added to the neighbour set (the search index is
+  rebuilt, which does scale with the history).
+
+The updated model is written like train.py writes it, under a new version
+in model_report.json (e.g. 2026-10-18T09:00:00+u3 for the third update of
+that training run), so the API's registry swaps it in. With --no-save nothing
+is written, the dataset cache included, so the same records can be applied
+for real afterwards.
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+from dataset import DATA_PATH, append_dataset, load_dataset, prepare_append
+from feature_schema import FEATURES
+from logistic_regression import LogisticRegressionTrainer
+from train import save_artifacts
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def update_tree(tree, X, y):
+    """Add labelled rows to the class counts of a fitted tree's nodes
+
+    X is already scaled. Counts are recovered from the stored class fractions
+    and node weights, the rows are added along their decision paths, and the
+    fractions (and gini impurities) are recomputed.
+    """
+    state = tree.tree_.__getstate__()
+    nodes, values = state["nodes"], state["values"]
+    counts = values[:, 0, :] * nodes["weighted_n_node_samples"][:, None]
+    paths = tree.decision_path(np.ascontiguousarray(X, dtype=np.float32))
+    labels = np.searchsorted(tree.classes_, y)
+    added = np.asarray(paths.T @ np.eye(len(tree.classes_))[labels])
+    counts += added
+    nodes["n_node_samples"] += added.sum(axis=1).astype(nodes["n_node_samples"].dtype)
+    nodes["weighted_n_node_samples"] += added.sum(axis=1)
+    values[:, 0, :] = counts / counts.sum(axis=1, keepdims=True)
+    if tree.criterion == "gini":
+        nodes["impurity"] = 1.0 - (values[:, 0, :] ** 2).sum(axis=1)
+    tree.tree_.__setstate__(state)
+
+
+def update_model(model, scaler, X, y, epochs=5, learning_rate=0.01):
+    """Updated copy of a fitted model given new raw feature rows and labels"""
+    model = copy.deepcopy(model)
+    Xs = scaler.transform(X)
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        for tree in model.estimators_:
+            update_tree(tree, Xs, y)
+    elif hasattr(model, "tree_"):
+        update_tree(model, Xs, y)
+    elif hasattr(model, "coef_"):
+        trainer = LogisticRegressionTrainer.from_sklearn(
+            model, scaler, learning_rate=learning_rate, max_epochs=epochs, batch_size=256)
+        trainer.partial_fit(X, y)
+        model.coef_ = trainer.coef_.copy()
+        model.intercept_ = trainer.intercept_.copy()
+    elif hasattr(model, "_fit_X"):
+        model.fit(np.vstack([model._fit_X, Xs]), np.concatenate([model.classes_[model._y], y]))
+    else:
+        raise ValueError(f"Cannot update {type(model).__name__} incrementally")
+    return model
+
+
+def next_version(report):
+    """Version for the next update of the model described by report"""
+    updates = report.get("updates", [])
+    base = report.get("trained_at", "base")
+    return f"{base}+u{len(updates) + 1}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the deployed model from newly labelled records")
+    parser.add_argument("records", help="CSV of new labelled records, shaped like cardio_train.csv")
+    parser.add_argument("--data", default=DATA_PATH, help="Source CSV of the cached dataset to append to")
+    parser.add_argument("--cache-dir", default=None, help="Dataset cache directory (default: dataset.py's)")
+    parser.add_argument("--model-dir", default=BACKEND_DIR, help="Where the current artifacts are")
+    parser.add_argument("--output-dir", default=None, help="Where to write the update (default: --model-dir)")
+    parser.add_argument("--epochs", type=int, default=5, help="SGD epochs over the new rows (logistic regression)")
+    parser.add_argument("--learning-rate", type=float, default=0.01)
+    parser.add_argument("--no-save", action="store_true", help="Print the update without writing artifacts")
+    args = parser.parse_args(argv)
+    output_dir = args.output_dir or args.model_dir
+
+    model = joblib.load(os.path.join(args.model_dir, "cardio_model.pkl"))
+    scaler = joblib.load(os.path.join(args.model_dir, "scaler.pkl"))
+    with open(os.path.join(args.model_dir, "model_report.json"), "r") as f:
+        report = json.load(f)
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.data) if args.cache_dir is None else load_dataset(args.data, args.cache_dir)
+    # The records are only appended once the updated model is written
+    prepared = prepare_append(dataset, args.records)
+    if prepared is None or not len(prepared[1]["id"]):
+        print(f"{args.records} was already appended (or has no valid rows); nothing to update")
+        return 0
+    columns = prepared[1]
+    X = np.column_stack([columns[name] for name in FEATURES]).astype(np.float64)
+    y = np.asarray(columns["cardio"])
+    rows = len(y)
+    print(f"Read {rows} new rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Accuracy on the new rows before the update is an honest (prequential)
+    # estimate; after the update it shows how far the model moved towards them
+    accuracy_before = float(np.mean(model.predict(scaler.transform(X)) == y))
+    start = time.perf_counter()
+    updated = update_model(model, scaler, X, y, epochs=args.epochs, learning_rate=args.learning_rate)
+    update_time = time.perf_counter() - start
+    accuracy_after = float(np.mean(updated.predict(scaler.transform(X)) == y))
+    print(f"Updated {report.get('best_model', type(model).__name__)} in {update_time * 1000:.1f} ms: "
+          f"accuracy on new rows {accuracy_before:.4f} -> {accuracy_after:.4f}")
+
+    version = next_version(report)
+    report = dict(report)
+    report["version"] = version
+    report["updates"] = report.get("updates", []) + [{
+        "version": version,
+        "records": os.path.abspath(args.records),
+        "rows": rows,
+        "dataset_rows": len(dataset) + rows,
+        "accuracy_before": accuracy_before,
+        "accuracy_after": accuracy_after,
+        "update_time_s": round(update_time, 4),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }]
+    if args.no_save:
+        print(json.dumps(report["updates"][-1], indent=2))
+        return 0
+    save_artifacts(updated, scaler, report, output_dir)
+    print(f"Model version {version} written to {output_dir}")
+    rows_before = len(dataset)
+    dataset, appended = append_dataset(dataset, args.records, prepared)
+    print(f"Appended {appended} rows to the dataset cache ({rows_before} -> {len(dataset)})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Per-stage latency histograms with fixed memory, aggregated across workers.
+
+Every request handler times its stages (parsing, validation, inference,
+feature impact, serialization) with a RequestTimer. Each duration goes into a
+histogram with fixed log-spaced buckets, so memory does not grow with traffic
+and p50/p95/p99 can be read back at any time.
+
+When CARDIO_METRICS_DIR is set (serve.py does this), each worker process keeps
+its histograms in a memory-mapped file in that directory and the metrics
+endpoints sum the files of all workers. Without it, histograms live in
+process memory only.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+METRICS_DIR = os.environ.get("CARDIO_METRICS_DIR")
+
+# Bucket upper bounds in seconds: 1us to ~67s, four buckets per doubling
+BUCKET_BOUNDS = 1e-6 * 2 ** (np.arange(105) / 4)
+
+# Columns after the bucket counts
+COUNT, SUM, MAX = len(BUCKET_BOUNDS) + 1, len(BUCKET_BOUNDS) + 2, len(BUCKET_BOUNDS) + 3
+ROW_WIDTH = len(BUCKET_BOUNDS) + 4
+
+PERCENTILES = (50, 95, 99)
+
+
+class Metrics:
+    """A fixed set of (endpoint, stage) latency histograms"""
+
+    def __init__(self, series, directory=METRICS_DIR):
+        self.series = list(series)
+        self.index = {key: i for i, key in enumerate(self.series)}
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._data = None
+
+    def _storage(self):
+        # One store per process: after a fork the child opens its own file
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    shape = (len(self.series), ROW_WIDTH)
+                    if self.directory:
+                        os.makedirs(self.directory, exist_ok=True)
+                        base = os.path.join(self.directory, f"worker-{os.getpid()}")
+                        with open(base + ".json", "w") as f:
+                            json.dump([list(key) for key in self.series], f)
+                        self._data = np.lib.format.open_memmap(base + ".npy", mode="w+", dtype=np.float64, shape=shape)
+                    else:
+                        self._data = np.zeros(shape, dtype=np.float64)
+                    self._pid = os.getpid()
+        return self._data
+
+    def observe(self, endpoint, stage, seconds):
+        """Record one duration for a stage"""
+        i = self.index.get((endpoint, stage))
+        if i is None:
+            return
+        data = self._storage()
+        bucket = min(int(np.searchsorted(BUCKET_BOUNDS, seconds)), len(BUCKET_BOUNDS))
+        with self._lock:
+            row = data[i]
+            row[bucket] += 1
+            row[COUNT] += 1
+            row[SUM] += seconds
+            if seconds > row[MAX]:
+                row[MAX] = seconds
+
+    def timer(self, endpoint):
+        return RequestTimer(self, endpoint)
+
+    def collect(self):
+        """Histogram rows summed over every worker process"""
+        self._storage()
+        if not self.directory:
+            return self.series, self._data.copy()
+        total = np.zeros((len(self.series), ROW_WIDTH), dtype=np.float64)
+        for path in glob.glob(os.path.join(self.directory, "worker-*.json")):
+            try:
+                with open(path, "r") as f:
+                    names = [tuple(key) for key in json.load(f)]
+                data = np.load(path[:-5] + ".npy", mmap_mode="r")
+            except (OSError, ValueError):
+                continue
+            for key, row in zip(names, data):
+                i = self.index.get(key)
+                if i is not None:
+                    total[i, :MAX] += row[:MAX]
+                    total[i, MAX] = max(total[i, MAX], row[MAX])
+        return self.series, total
+
+    def summary(self):
+        """Count, mean, percentiles and max per stage, in milliseconds"""
+        series, data = self.collect()
+        result = {}
+        for (endpoint, stage), row in zip(series, data):
+            count = int(row[COUNT])
+            stats = {"count": count}
+            if count:
+                stats["mean_ms"] = round(row[SUM] / count * 1000, 3)
+                for p in PERCENTILES:
+                    stats[f"p{p}_ms"] = round(percentile(row, p) * 1000, 3)
+                stats["max_ms"] = round(row[MAX] * 1000, 3)
+            result.setdefault(endpoint, {})[stage] = stats
+        return result
+
+    def prometheus(self):
+        """Histograms in the Prometheus text exposition format"""
+        series, data = self.collect()
+        name = "cardio_request_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each stage of an API request.",
+            f"# TYPE {name} histogram",
+        ]
+        for (endpoint, stage), row in zip(series, data):
+            labels = f'endpoint="{endpoint}",stage="{stage}"'
+            cumulative = np.cumsum(row[:len(BUCKET_BOUNDS)])
+            # Every fourth bound (powers of two) keeps the output short
+            for j in range(3, len(BUCKET_BOUNDS), 4):
+                lines.append(f'{name}_bucket{{{labels},le="{BUCKET_BOUNDS[j]:.6g}"}} {int(cumulative[j])}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {int(row[COUNT])}')
+            lines.append(f"{name}_sum{{{labels}}} {row[SUM]:.9g}")
+            lines.append(f"{name}_count{{{labels}}} {int(row[COUNT])}")
+        return "\n".join(lines) + "\n"
+
+
+def percentile(row, p):
+    """Upper bound of the bucket holding the p-th percentile, capped at the max"""
+    count = row[COUNT]
+    if not count:
+        return 0.0
+    cumulative = np.cumsum(row[:len(BUCKET_BOUNDS) + 1])
+    bucket = int(np.searchsorted(cumulative, count * p / 100))
+    bound = BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else row[MAX]
+    return float(min(bound, row[MAX]))
+
+
+class RequestTimer:
+    """Times consecutive stages of one request"""
+
+    def __init__(self, metrics, endpoint):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, stage):
+        """Record the time since the previous mark as this stage; returns seconds"""
+        now = time.perf_counter()
+        elapsed = now - self.last
+        self.metrics.observe(self.endpoint, stage, elapsed)
+        self.last = now
+        return elapsed
+
+    def finish(self):
+        """Record the whole request as the 'total' stage"""
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.endpoint, "total", elapsed)
+        return elapsed
@@ -0,0 +1,250 @@
+"""Prebuilt nearest-neighbour index for serving the KNN model.
+
+Usage:
+    python Backend/knn_index.py [--model cardio_model.pkl] [--output DIR]
+
+A KNeighborsClassifier pickle carries the whole training matrix (twice: as
+the fitted rows and again inside its KD-tree), and predict_proba on a single
+row spends over a millisecond on input checks and its tree search. This
+module builds a scipy KD-tree over the scaled training rows once and writes
+its arrays (the rows, their order in the tree, the packed tree nodes, and the
+labels as int8) as .npy files next to the model. At load time they are
+memory-mapped and the tree is restored from them without unpickling the model
+or rebuilding anything, so all worker processes share one copy. A batch is a
+single tree query; a single row takes tens of microseconds.
+
+Nine of the ten features are small integers, so neighbours at exactly the
+same distance as the k-th are common. Those ties are broken in the index's
+tree order, which can pick a different (equally near) neighbour than
+scikit-learn's own tree; the check below counts the rows that differ and
+confirms every one of them is such a tie.
+
+load_predictor() serves KNN models from this index. train.py builds it with
+the model; it is (re)built on first load if it is missing or was built from
+different artifacts.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from compiled_model import DATA_PATH, MODEL_PATH, SCALER_PATH, file_fingerprint, save_arrays
+
+INDEX_DIRNAME = "knn_index"
+
+# Points per leaf of the KD-tree
+LEAF_SIZE = int(os.environ.get("CARDIO_KNN_LEAF_SIZE", 16))
+
+# Threads a batch query is split over (-1 for one per core)
+QUERY_WORKERS = int(os.environ.get("CARDIO_KNN_WORKERS", 1))
+
+
+def index_dir(model_path=MODEL_PATH):
+    """Directory holding the index for the model pickle at model_path"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), INDEX_DIRNAME)
+
+
+def is_knn(model):
+    return hasattr(model, "_fit_X") and hasattr(model, "n_neighbors")
+
+
+def _scipy_version():
+    import scipy
+    return scipy.__version__
+
+
+def build_knn_index(model, scaler):
+    """Index arrays and metadata for a fitted KNeighborsClassifier"""
+    from scipy.spatial import cKDTree
+
+    if not is_knn(model):
+        raise ValueError(f"KNN indexes are only built for KNeighborsClassifier, not {type(model).__name__}")
+    if model.weights != "uniform" or model.effective_metric_ != "euclidean":
+        raise ValueError("KNN indexes need uniform weights and the Euclidean metric")
+    data = np.ascontiguousarray(model._fit_X, dtype=np.float64)
+    tree = cKDTree(data, leafsize=LEAF_SIZE)
+    tree_buffer, data, _, _, _, maxes, mins, indices, _, _ = tree.__getstate__()
+    arrays = {
+        "data": data,
+        "indices": indices,
+        "tree": np.frombuffer(tree_buffer.tobytes(), dtype=np.uint8),
+        "maxes": maxes,
+        "mins": mins,
+        "labels": np.asarray(model._y, dtype=np.int8),
+        "classes": np.asarray(model.classes_),
+        "mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scale": np.asarray(scaler.scale_, dtype=np.float64),
+    }
+    meta = {
+        "estimator": type(model).__name__,
+        "params": model.get_params(),
+        "n_neighbors": int(model.n_neighbors),
+        "leaf_size": LEAF_SIZE,
+        "scipy_version": _scipy_version(),
+    }
+    return arrays, meta
+
+
+def save_knn_index(arrays, meta, fingerprint, directory):
+    # Workers may have the old index memory-mapped; save_arrays never writes in place
+    save_arrays(arrays, dict(meta, model_fingerprint=fingerprint), directory)
+
+
+class KNNIndexModel:
+    """Scores rows by querying the prebuilt KD-tree; same interface as CompiledModel"""
+
+    def __init__(self, arrays, meta):
+        from scipy.spatial import cKDTree
+
+        self.arrays = arrays
+        self.meta = meta
+        self.kind = "knn_index"
+        self.params = meta["params"]
+        self.classes_ = np.asarray(arrays["classes"])
+        self.k = meta["n_neighbors"]
+        self.mean = np.asarray(arrays["mean"])
+        self.scale = np.asarray(arrays["scale"])
+        self.labels = np.asarray(arrays["labels"])
+        self.n_features = len(self.mean)
+        self._positive = len(self.classes_) - 1
+
+        # Restoring the tree's pickled state keeps the rows and the tree order
+        # as views of the memory-mapped files; only the node buffer is copied
+        data = arrays["data"]
+        self.tree = cKDTree.__new__(cKDTree)
+        self.tree.__setstate__((
+            np.asarray(arrays["tree"]).view("S1"), data, data.shape[0], data.shape[1], meta["leaf_size"],
+            arrays["maxes"], arrays["mins"], arrays["indices"], None, None,
+        ))
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        names = ["data", "indices", "tree", "maxes", "mins", "labels", "classes", "mean", "scale"]
+        # Memory-mapped: pages are shared between processes
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in names}
+        return cls(arrays, meta)
+
+    def _neighbours(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        _, ind = self.tree.query((X - self.mean) / self.scale, k=[self.k] if self.k == 1 else self.k,
+                                 workers=QUERY_WORKERS)
+        return self.labels[ind]
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2-D array of raw features"""
+        labels = self._neighbours(X)
+        counts = (labels[:, :, None] == np.arange(len(self.classes_))).sum(axis=1)
+        return counts / counts.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def predict_one(self, row):
+        """Positive-class probability for a single row of raw features"""
+        labels = self._neighbours(np.asarray(row, dtype=np.float64).reshape(1, -1))
+        return int(np.count_nonzero(labels == self._positive)) / self.k
+
+
+def open_knn_index(model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """The saved index for these artifacts, or None if there is none or it is stale"""
+    directory = index_dir(model_path)
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path) or not os.path.exists(model_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("scipy_version") != _scipy_version():
+        return None
+    if meta.get("model_fingerprint") != file_fingerprint(model_path, scaler_path):
+        return None
+    return KNNIndexModel.load(directory)
+
+
+def load_knn_index(model, scaler, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """Build and save the index for a loaded KNN model, then serve from the saved files"""
+    arrays, meta = build_knn_index(model, scaler)
+    directory = index_dir(model_path)
+    try:
+        save_knn_index(arrays, meta, file_fingerprint(model_path, scaler_path), directory)
+    except OSError:
+        # Read-only deployment: serve from memory in this process
+        return KNNIndexModel(arrays, meta)
+    return KNNIndexModel.load(directory)
+
+
+def check(index, model, scaler, X):
+    """Compare with scikit-learn; returns (rows that differ, rows that differ without a tie)"""
+    expected = model.predict_proba(scaler.transform(X))
+    differ = ~(index.predict_proba(X) == expected).all(axis=1)
+    if not differ.any():
+        return 0, 0
+    # A difference is a tie if the k-th and (k+1)-th neighbours are equally far
+    distances, _ = index.tree.query((X[differ] - index.mean) / index.scale, k=index.k + 1)
+    untied = np.count_nonzero(distances[:, -2] != distances[:, -1])
+    return int(differ.sum()), int(untied)
+
+
+def _median_us(predict, rows):
+    for row in rows[:20]:
+        predict(row)
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and check the KNN serving index")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--output", default=None, help="Index directory (default: knn_index/ next to the model)")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV used to check predictions")
+    args = parser.parse_args(argv)
+    directory = args.output or index_dir(args.model)
+
+    import joblib
+    import warnings
+    from compiled_model import load_verification_rows
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+
+    arrays, meta = build_knn_index(model, scaler)
+    save_knn_index(arrays, meta, file_fingerprint(args.model, args.scaler), directory)
+    index = KNNIndexModel.load(directory)
+    index_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    print(f"KNN index: {len(arrays['data'])} rows, {index_bytes} bytes in {directory} "
+          f"(model pickle {os.path.getsize(args.model)} bytes)")
+
+    X = load_verification_rows(args.data)
+    start = time.perf_counter()
+    index.predict_proba(X)
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    model.predict_proba(scaler.transform(X))
+    sklearn_batch_time = time.perf_counter() - start
+    rows = X[:500]
+    single = _median_us(index.predict_one, rows)
+    sklearn_single = _median_us(lambda row: model.predict_proba(scaler.transform(row.reshape(1, -1)))[0, 1], rows)
+    print(f"Single row: {single:.1f} us (scikit-learn {sklearn_single:.1f} us); "
+          f"{len(X)} rows: {batch_time:.2f} s (scikit-learn {sklearn_batch_time:.2f} s)")
+
+    differ, untied = check(index, model, scaler, X)
+    print(f"Checked {len(X)} rows against scikit-learn: {differ} differ, "
+          f"{'all at a tied k-th neighbour' if not untied else f'{untied} WITHOUT A TIE'}")
+    return 0 if not untied else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""Logistic regression trainer (3_manual_logistic_regression.ipynb as a module).
+
+Usage:
+    python Backend/logistic_regression.py [--solver sgd|lbfgs] [--batch-size 1024]
+                                          [--float32] [--chunksize N] [--compare-notebook]
+                                          [--save-dir DIR] [--output model.npz]
+
+The notebook runs 1500 full-batch gradient steps and computes X @ weights
+twice per step. This trainer computes it once per batch and reuses it for
+the gradient and the loss, and trains with either mini-batch gradient
+descent with momentum or L-BFGS. Training stops once the loss improves by
+less than tol for n_iter_no_change epochs. The sigmoid and log-loss are
+written so large |z| cannot overflow. With --chunksize, rows are streamed
+from the dataset cache chunk by chunk instead of held in memory.
+
+Features are standardized inside the trainer. --save-dir deploys the model:
+to_sklearn() turns it into a LogisticRegression and StandardScaler, written
+with train.save_artifacts like any other model (pickles, compiled model and
+a report with its accuracy and version), so the API's registry serves it.
+--output only exports the weights as a compiled linear model (see
+compiled_model.py) for use elsewhere; it never replaces the served model.
+partial_fit() continues training from the current weights on new rows only
+(see incremental.py).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from compiled_model import COMPILED_PATH, CompiledModel, fold_scaler, sigmoid
+from dataset import DATA_PATH, load_dataset
+from feature_schema import FEATURES
+
+SOLVERS = ("sgd", "lbfgs")
+
+
+def log_loss_sum(z, y):
+    """Summed binary cross-entropy from decision values, stable for large |z|"""
+    # log(1 + e^z) - y*z == -[y log p + (1 - y) log(1 - p)] with p = sigmoid(z)
+    return float(np.sum(np.logaddexp(0, z) - y * z))
+
+
+class LogisticRegressionTrainer:
+    """Binary logistic regression with mini-batch momentum SGD or L-BFGS"""
+
+    def __init__(self, solver="sgd", learning_rate=0.1, batch_size=1024, momentum=0.9, max_epochs=200,
+                 tol=1e-4, n_iter_no_change=3, alpha=0.0, dtype="float64", random_state=42):
+        self.solver = solver
+        self.learning_rate = learning_rate
+        self.batch_size = batch_size
+        self.momentum = momentum
+        self.max_epochs = max_epochs
+        self.tol = tol
+        self.n_iter_no_change = n_iter_no_change
+        self.alpha = alpha
+        self.dtype = dtype
+        self.random_state = random_state
+
+    def get_params(self, deep=True):
+        return {name: getattr(self, name) for name in (
+            "solver", "learning_rate", "batch_size", "momentum", "max_epochs",
+            "tol", "n_iter_no_change", "alpha", "dtype", "random_state")}
+
+    def set_params(self, **params):
+        for name, value in params.items():
+            setattr(self, name, value)
+        return self
+
+    # Fitting
+
+    def fit(self, X, y):
+        """Train on in-memory arrays"""
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        self.mean_ = X.mean(axis=0)
+        self.scale_ = _safe_scale(X.std(axis=0))
+        Xs = self._scale(X)
+        ys = y.astype(self.dtype)
+        return self._train(lambda rng: [(Xs, ys)], X.shape[0], X.shape[1])
+
+    def fit_chunks(self, chunks):
+        """Train out of core; chunks() must return a fresh iterable of (X, y) each call"""
+        # One pass for the scaler, combining per-chunk means and squared
+        # deviations (Chan et al.) rather than sums of squares
+        n, mean, m2 = 0, None, None
+        for X, _ in chunks():
+            X = np.asarray(X, dtype=np.float64)
+            k = X.shape[0]
+            if not k:
+                continue
+            chunk_mean = X.mean(axis=0)
+            chunk_m2 = ((X - chunk_mean) ** 2).sum(axis=0)
+            if mean is None:
+                n, mean, m2 = k, chunk_mean, chunk_m2
+                continue
+            delta = chunk_mean - mean
+            total = n + k
+            mean = mean + delta * k / total
+            m2 = m2 + chunk_m2 + delta ** 2 * n * k / total
+            n = total
+        if not n:
+            raise ValueError("No training rows")
+        self.mean_ = mean
+        self.scale_ = _safe_scale(np.sqrt(m2 / n))
+
+        def scaled_chunks(rng):
+            for X, y in chunks():
+                yield self._scale(np.asarray(X, dtype=np.float64)), np.asarray(y).astype(self.dtype)
+
+        return self._train(scaled_chunks, n, len(mean))
+
+    def partial_fit(self, X, y):
+        """Continue training from the current weights on new rows only
+
+        The standardization stays as fitted, so the update costs epochs over
+        the new rows and the weights stay comparable with the model's.
+        Unfitted trainers fall back to fit().
+        """
+        if not hasattr(self, "_w"):
+            return self.fit(X, y)
+        Xs = self._scale(np.asarray(X, dtype=np.float64))
+        ys = np.asarray(y).astype(self.dtype)
+        return self._train(lambda rng: [(Xs, ys)], Xs.shape[0], Xs.shape[1], warm_start=True)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler, **params):
+        """Trainer holding a fitted scikit-learn LogisticRegression and its StandardScaler"""
+        trainer = cls(**params)
+        trainer.classes_ = np.array([0, 1])
+        trainer.n_features_in_ = len(scaler.mean_)
+        trainer.mean_ = np.asarray(scaler.mean_, dtype=np.float64)
+        trainer.scale_ = np.asarray(scaler.scale_, dtype=np.float64)
+        trainer._w = np.asarray(model.coef_[0], dtype=trainer.dtype)
+        trainer._b = float(model.intercept_[0])
+        return trainer
+
+    def _train(self, chunks, n_rows, n_features, warm_start=False):
+        if self.solver not in SOLVERS:
+            raise ValueError(f"solver must be one of {', '.join(SOLVERS)}")
+        self.classes_ = np.array([0, 1])
+        self.n_features_in_ = n_features
+        self.n_samples_ = n_rows
+        if not warm_start:
+            self._w = np.zeros(n_features, dtype=self.dtype)
+            self._b = 0.0
+        self.loss_curve_ = []
+        rng = np.random.RandomState(self.random_state)
+        start = time.perf_counter()
+        if self.solver == "lbfgs":
+            self._fit_lbfgs(chunks, n_rows, rng)
+        else:
+            self._fit_sgd(chunks, n_rows, rng)
+        self.fit_time_ = time.perf_counter() - start
+        return self
+
+    def _fit_sgd(self, chunks, n_rows, rng):
+        dtype = np.dtype(self.dtype).type
+        lr, momentum, alpha = dtype(self.learning_rate), dtype(self.momentum), dtype(self.alpha)
+        w, b = self._w, dtype(self._b)
+        velocity_w, velocity_b = np.zeros_like(w), dtype(0)
+        best, stalled = np.inf, 0
+        for epoch in range(self.max_epochs):
+            loss = 0.0
+            for X, y in chunks(rng):
+                order = rng.permutation(X.shape[0])
+                for i in range(0, len(order), self.batch_size):
+                    batch = order[i:i + self.batch_size]
+                    Xb, yb = X[batch], y[batch]
+                    # One matrix product per batch, shared by gradient and loss
+                    z = Xb @ w + b
+                    error = sigmoid(z) - yb
+                    loss += log_loss_sum(z, yb)
+                    grad_w = (Xb.T @ error) / dtype(len(batch)) + alpha * w
+                    velocity_w = momentum * velocity_w - lr * grad_w
+                    velocity_b = momentum * velocity_b - lr * dtype(error.mean())
+                    w = w + velocity_w
+                    b = b + velocity_b
+            loss = loss / n_rows + 0.5 * float(self.alpha) * float(w @ w)
+            self.loss_curve_.append(loss)
+
+            # Early stopping: the loss (averaged over the epoch's batches) has
+            # stopped improving by at least tol
+            if loss > best - self.tol:
+                stalled += 1
+                if stalled >= self.n_iter_no_change:
+                    break
+            else:
+                stalled = 0
+            best = min(best, loss)
+        self._w, self._b = w, float(b)
+        self.n_iter_ = len(self.loss_curve_)
+
+    def _fit_lbfgs(self, chunks, n_rows, rng):
+        try:
+            from scipy.optimize import minimize
+        except ImportError:
+            raise ImportError("The lbfgs solver needs scipy; use solver='sgd'") from None
+        dtype = self.dtype
+
+        def objective(params):
+            w = params[:-1].astype(dtype)
+            b = params[-1]
+            loss, grad_w, grad_b = 0.0, np.zeros(len(w)), 0.0
+            for X, y in chunks(rng):
+                z = X @ w + b
+                error = sigmoid(z) - y
+                loss += log_loss_sum(z, y)
+                grad_w += X.T @ error
+                grad_b += float(error.sum())
+            loss = loss / n_rows + 0.5 * self.alpha * float(params[:-1] @ params[:-1])
+            grad = np.append(grad_w / n_rows + self.alpha * params[:-1], grad_b / n_rows)
+            self.loss_curve_.append(loss)
+            return loss, grad
+
+        result = minimize(objective, np.append(self._w, self._b).astype(np.float64), jac=True, method="L-BFGS-B",
+                          tol=self.tol * 1e-3, options={"maxiter": self.max_epochs})
+        self._w = result.x[:-1].astype(dtype)
+        self._b = float(result.x[-1])
+        self.n_iter_ = int(result.nit)
+
+    # Prediction
+
+    def _scale(self, X):
+        return ((X - self.mean_) / self.scale_).astype(self.dtype)
+
+    @property
+    def coef_(self):
+        """Coefficients on standardized features, shaped like scikit-learn's"""
+        return np.asarray(self._w, dtype=np.float64).reshape(1, -1)
+
+    @property
+    def intercept_(self):
+        return np.array([self._b])
+
+    def decision_function(self, X):
+        return self._scale(np.asarray(X, dtype=np.float64)) @ self._w + self._b
+
+    def predict_proba(self, X):
+        p = sigmoid(self.decision_function(X).astype(np.float64))
+        return np.stack([1 - p, p], axis=1)
+
+    def predict(self, X):
+        return (self.decision_function(X) >= 0).astype(int)
+
+    def score(self, X, y):
+        """Accuracy"""
+        return float(np.mean(self.predict(X) == np.asarray(y)))
+
+    def loss(self, X, y):
+        """Mean log-loss"""
+        return log_loss_sum(self.decision_function(X).astype(np.float64), np.asarray(y)) / len(y)
+
+    def to_compiled(self, feature_names=None, fold=True):
+        """The trained weights as a CompiledModel (scaler folded in by default)"""
+        arrays = {
+            "mean": np.asarray(self.mean_, dtype=np.float64),
+            "scale": np.asarray(self.scale_, dtype=np.float64),
+            "classes": self.classes_,
+            "coef": self.coef_.T.copy(),
+            "intercept": self.intercept_,
+        }
+        meta = {
+            "kind": "linear",
+            "estimator": type(self).__name__,
+            "params": self.get_params(),
+            "feature_names": list(feature_names or []),
+        }
+        compiled = CompiledModel(meta, arrays)
+        return fold_scaler(compiled) if fold else compiled
+
+    def to_sklearn(self):
+        """The trained weights as a fitted scikit-learn (LogisticRegression, StandardScaler)"""
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler()
+        scaler.mean_ = np.asarray(self.mean_, dtype=np.float64)
+        scaler.scale_ = np.asarray(self.scale_, dtype=np.float64)
+        scaler.var_ = scaler.scale_ ** 2
+        scaler.n_features_in_ = len(scaler.mean_)
+        scaler.n_samples_seen_ = getattr(self, "n_samples_", 0)
+
+        # The same objective in scikit-learn's terms: C * summed loss + |w|^2 / 2
+        if self.alpha:
+            model = LogisticRegression(C=1.0 / (self.alpha * max(getattr(self, "n_samples_", 1), 1)),
+                                       max_iter=self.n_iter_)
+        else:
+            model = LogisticRegression(penalty=None, max_iter=self.n_iter_)
+        model.classes_ = self.classes_
+        model.coef_ = self.coef_
+        model.intercept_ = self.intercept_
+        model.n_features_in_ = self.n_features_in_
+        model.n_iter_ = np.array([self.n_iter_])
+        return model, scaler
+
+
+def _safe_scale(std):
+    # Constant features are left unscaled, as StandardScaler does
+    return np.where(std == 0, 1.0, std)
+
+
+def notebook_train(X, y, lr=0.05, epochs=1500):
+    """The notebook's full-batch training loop, kept for comparison"""
+    X = np.hstack((np.ones((X.shape[0], 1)), X))
+    weights = np.zeros(X.shape[1])
+    for _ in range(epochs):
+        y_pred = 1 / (1 + np.exp(-np.dot(X, weights)))
+        weights -= lr * np.dot(X.T, (y_pred - y)) / y.size
+        -np.mean(y * np.log(y_pred + 1e-9) + (1 - y) * np.log(1 - y_pred + 1e-9))
+    return weights
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the manual logistic regression model")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--features", default=",".join(FEATURES),
+                        help="Comma-separated features (the notebook used age,ap_hi,ap_lo,bmi,cholesterol,gluc)")
+    parser.add_argument("--solver", choices=SOLVERS, default="sgd")
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--momentum", type=float, default=0.9)
+    parser.add_argument("--max-epochs", type=int, default=200)
+    parser.add_argument("--tol", type=float, default=1e-4)
+    parser.add_argument("--alpha", type=float, default=0.0, help="L2 penalty")
+    parser.add_argument("--float32", action="store_true", help="Train in float32")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Stream training rows from the dataset cache in chunks of this size")
+    parser.add_argument("--compare-notebook", action="store_true",
+                        help="Also time the notebook's 1500-epoch full-batch loop")
+    parser.add_argument("--save-dir", help="Deploy the model: write every artifact the API loads into this "
+                                           "directory (e.g. Backend/) through train.save_artifacts")
+    parser.add_argument("--output", help="Export only: write the weights as a compiled .npz elsewhere "
+                                         "(never the served cardio_model.npz)")
+    args = parser.parse_args(argv)
+
+    features = [f.strip() for f in args.features.split(",")]
+    unknown = [f for f in features if f not in FEATURES]
+    if unknown:
+        parser.error(f"Unknown features: {', '.join(unknown)}")
+    if args.save_dir and features != FEATURES:
+        parser.error(f"The API expects all features in training order: {','.join(FEATURES)}")
+    if args.output and os.path.basename(args.output) == os.path.basename(COMPILED_PATH):
+        # A lone .npz would not match the pickles and report the registry loads with it
+        parser.error("--output is export-only; use --save-dir to deploy the model")
+    columns = [FEATURES.index(f) for f in features]
+
+    # The notebook's split: seeded shuffle, first 80% for training
+    dataset = load_dataset(args.data)
+    indices = np.arange(len(dataset))
+    np.random.RandomState(42).shuffle(indices)
+    split = int(0.8 * len(indices))
+    train_idx, test_idx = np.sort(indices[:split]), indices[split:]
+    X_test, y_test = dataset.take(test_idx)
+    X_test = X_test[:, columns]
+
+    trainer = LogisticRegressionTrainer(
+        solver=args.solver, learning_rate=args.learning_rate, batch_size=args.batch_size,
+        momentum=args.momentum, max_epochs=args.max_epochs, tol=args.tol, alpha=args.alpha,
+        dtype="float32" if args.float32 else "float64")
+    if args.chunksize:
+        def chunks():
+            for i in range(0, len(train_idx), args.chunksize):
+                X, y = dataset.take(train_idx[i:i + args.chunksize])
+                yield X[:, columns], y
+        trainer.fit_chunks(chunks)
+    else:
+        X_train, y_train = dataset.take(train_idx)
+        trainer.fit(X_train[:, columns], y_train)
+    print(f"{args.solver}{' (float32)' if args.float32 else ''}"
+          f"{f', chunks of {args.chunksize}' if args.chunksize else ''}: {trainer.n_iter_} epochs/iterations "
+          f"in {trainer.fit_time_ * 1000:.1f} ms, test loss {trainer.loss(X_test, y_test):.4f}, "
+          f"accuracy {trainer.score(X_test, y_test):.4f}")
+
+    if args.compare_notebook:
+        X_train, y_train = dataset.take(train_idx)
+        X_train = (X_train[:, columns] - trainer.mean_) / trainer.scale_
+        start = time.perf_counter()
+        weights = notebook_train(X_train, y_train)
+        elapsed = time.perf_counter() - start
+        X_scaled = np.hstack((np.ones((len(X_test), 1)), (X_test - trainer.mean_) / trainer.scale_))
+        accuracy = np.mean(((X_scaled @ weights) >= 0).astype(int) == y_test)
+        print(f"notebook loop: 1500 epochs in {elapsed * 1000:.1f} ms, accuracy {accuracy:.4f}")
+
+    if args.save_dir:
+        from train import save_artifacts
+        model, scaler = trainer.to_sklearn()
+        name = "Logistic Regression"
+        accuracy = trainer.score(X_test, y_test)
+        report = {
+            "models": {name: accuracy},
+            "best_model": name,
+            "details": {name: {"accuracy": accuracy, "solver": args.solver, "epochs": trainer.n_iter_,
+                               "fit_time_s": round(trainer.fit_time_, 3)}},
+            "trainer": "logistic_regression.py",
+            "trained_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        save_artifacts(model, scaler, report, args.save_dir)
+        print(f"Artifacts written to {args.save_dir}")
+
+    if args.output:
+        compiled = trainer.to_compiled(features)
+        compiled.save(args.output)
+        diff = np.max(np.abs(compiled.predict_proba(X_test)[:, 1] - trainer.predict_proba(X_test)[:, 1]))
+        print(f"Compiled model written to {args.output} (max |diff| vs trainer {diff:.2g})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
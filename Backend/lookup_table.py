@@ -0,0 +1,240 @@
+"""Precomputed leaf-region lookup table for the decision tree model.
+
+Usage:
+    python Backend/lookup_table.py [--output DIR]
+
+A decision tree only ever compares each feature against a handful of split
+values, so every input falls into one cell of a grid cut by those splits, and
+every cell belongs to exactly one leaf. This module builds that grid once
+(a flat uint8/uint16 array of leaf ids) and stores it as .npy files that are
+memory-mapped at load time, so all worker processes share one copy. Scoring
+a row is then a binary search per feature plus one array read. A leaf also
+fixes the path to it, so the path attributions of every leaf are stored too
+and explaining a row is the same lookup.
+
+Serving uses it when CARDIO_SERVING_MODE=lookup; the table is (re)built
+automatically if it is missing or was built from a different model.
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from compiled_model import (COMPILED_PATH, DATA_PATH, MODEL_PATH, SCALER_PATH, CompiledModel, fold_scaler,
+                            save_arrays)
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+LOOKUP_DIR = os.path.join(BACKEND_DIR, "lookup_table")
+
+# Bump when the saved arrays change; tables in another format are rebuilt
+LOOKUP_FORMAT = 2
+
+# Refuse to build grids larger than this many cells
+MAX_GRID_CELLS = 50_000_000
+
+
+def lookup_dir(model_path=MODEL_PATH):
+    """Directory holding the table for the model pickle at model_path (LOOKUP_DIR by default)"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), os.path.basename(LOOKUP_DIR))
+
+
+def model_fingerprint(compiled):
+    """Hash of the compiled model arrays, used to detect a stale table"""
+    digest = hashlib.sha256()
+    for key in sorted(compiled.arrays):
+        digest.update(key.encode())
+        digest.update(np.ascontiguousarray(compiled.arrays[key]).tobytes())
+    return digest.hexdigest()
+
+
+def build_lookup_table(compiled):
+    """Build the leaf-id grid for a single decision tree"""
+    if compiled.kind != "tree":
+        raise ValueError(f"Lookup tables are only built for decision trees, not '{compiled.kind}' models")
+    compiled = fold_scaler(compiled)
+    a = compiled.arrays
+    feature, threshold, left, right = a["feature"], a["threshold"], a["left"], a["right"]
+    is_leaf = left == np.arange(len(left))
+    n_features = compiled.n_features
+
+    # Sorted split values per feature; bin b holds edges[b-1] < x <= edges[b]
+    edges = [np.unique(threshold[~is_leaf & (feature == f)]) for f in range(n_features)]
+    shape = tuple(len(e) + 1 for e in edges)
+    n_cells = int(np.prod(shape, dtype=np.int64))
+    if n_cells > MAX_GRID_CELLS:
+        raise ValueError(f"Lookup grid would need {n_cells} cells (limit {MAX_GRID_CELLS})")
+
+    leaves = np.flatnonzero(is_leaf)
+    leaf_index = np.full(len(left), -1, dtype=np.int64)
+    leaf_index[leaves] = np.arange(len(leaves))
+    dtype = np.uint8 if len(leaves) <= np.iinfo(np.uint8).max else np.uint16
+    grid = np.zeros(shape, dtype=dtype)
+    positive = a["proba"][:, 1]
+    contributions = np.zeros((len(leaves), n_features), dtype=np.float64)
+
+    # Walk the tree narrowing a box of bins; each leaf fills its box. Path
+    # attributions are added up on the way down, split by split, in the
+    # same order as CompiledModel.explain
+    stack = [(0, [0] * n_features, list(shape), np.zeros(n_features))]
+    while stack:
+        node, lo, hi, path = stack.pop()
+        if is_leaf[node]:
+            grid[tuple(slice(l, h) for l, h in zip(lo, hi))] = leaf_index[node]
+            contributions[leaf_index[node]] = path
+            continue
+        f = feature[node]
+        split = int(np.searchsorted(edges[f], threshold[node]))
+        left_hi = list(hi)
+        left_hi[f] = min(hi[f], split + 1)
+        right_lo = list(lo)
+        right_lo[f] = max(lo[f], split + 1)
+        left_path, right_path = path.copy(), path.copy()
+        left_path[f] += positive[left[node]] - positive[node]
+        right_path[f] += positive[right[node]] - positive[node]
+        stack.append((left[node], lo, left_hi, left_path))
+        stack.append((right[node], right_lo, hi, right_path))
+
+    offsets = np.cumsum([0] + [len(e) for e in edges])
+    return {
+        "grid": grid.reshape(-1),
+        "shape": np.array(shape, dtype=np.int64),
+        "edges": np.concatenate(edges).astype(np.float64),
+        "edge_offsets": offsets.astype(np.int64),
+        "proba": a["proba"][leaves],
+        "contributions": contributions,
+        "base_value": positive[:1].copy(),
+    }
+
+
+def save_lookup_table(table, fingerprint, directory=LOOKUP_DIR):
+    # Workers may be mapping the old table: files are replaced, never rewritten
+    meta = {"format": LOOKUP_FORMAT, "model_fingerprint": fingerprint, "cells": int(table["grid"].size)}
+    save_arrays(table, meta, directory)
+
+
+class LookupModel:
+    """Scores rows by looking up their grid cell; wraps the compiled tree"""
+
+    def __init__(self, model, directory=LOOKUP_DIR):
+        self.model = model
+        self.kind = "lookup"
+        self.classes_ = model.classes_
+        self.params = model.params
+        self.meta = model.meta
+        self.n_features = model.n_features
+        if hasattr(model, "feature_importances_"):
+            self.feature_importances_ = model.feature_importances_
+
+        # The grid is memory-mapped: pages are shared between processes
+        self.grid = np.load(os.path.join(directory, "grid.npy"), mmap_mode="r")
+        shape = np.load(os.path.join(directory, "shape.npy"))
+        edges = np.load(os.path.join(directory, "edges.npy"))
+        offsets = np.load(os.path.join(directory, "edge_offsets.npy"))
+        self.proba = np.load(os.path.join(directory, "proba.npy"))
+        self.contributions = np.load(os.path.join(directory, "contributions.npy"))
+        self.base_value = float(np.load(os.path.join(directory, "base_value.npy"))[0])
+        self.arrays = {"edges": edges, "proba": self.proba, "grid": self.grid, "contributions": self.contributions}
+
+        self.edges = [edges[offsets[f]:offsets[f + 1]] for f in range(len(shape))]
+        self.strides = np.cumprod(np.append(shape[1:], 1)[::-1])[::-1].astype(np.int64)
+        self._edge_lists = [e.tolist() for e in self.edges]
+        self._stride_list = self.strides.tolist()
+        self._positive = self.proba[:, 1].tolist()
+        self._contribution_lists = self.contributions.tolist()
+
+    def _cells(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        cell = np.zeros(X.shape[0], dtype=np.int64)
+        for f, edges in enumerate(self.edges):
+            if len(edges):
+                cell += np.searchsorted(edges, X[:, f], side="left") * self.strides[f]
+        return cell
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2-D array of raw features"""
+        return self.proba[self.grid[self._cells(X)]]
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def _leaf_one(self, row):
+        row = np.asarray(row, dtype=np.float64).reshape(-1).tolist()
+        if len(row) != self.n_features:
+            raise ValueError(f"X has {len(row)} features, but the model expects {self.n_features}")
+        cell = 0
+        for x, edges, stride in zip(row, self._edge_lists, self._stride_list):
+            cell += bisect.bisect_left(edges, x) * stride
+        return int(self.grid[cell])
+
+    def predict_one(self, row):
+        """Positive-class probability for a single row of raw features"""
+        return self._positive[self._leaf_one(row)]
+
+    def explain(self, X):
+        """Scores, base value and path attributions (see CompiledModel.explain), read from the table"""
+        leaves = self.grid[self._cells(X)]
+        return self.proba[leaves, 1], self.base_value, self.contributions[leaves]
+
+    def explain_one(self, row):
+        """Risk score and per-feature contributions (a list) for a single row"""
+        leaf = self._leaf_one(row)
+        return self._positive[leaf], list(self._contribution_lists[leaf])
+
+
+def load_lookup_model(model, directory=LOOKUP_DIR):
+    """Load the lookup table for a compiled tree, rebuilding it if stale"""
+    fingerprint = model_fingerprint(model)
+    meta_path = os.path.join(directory, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        stale = meta.get("model_fingerprint") != fingerprint or meta.get("format") != LOOKUP_FORMAT
+    if stale:
+        save_lookup_table(build_lookup_table(model), fingerprint, directory)
+    return LookupModel(model, directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and check the decision tree lookup table")
+    parser.add_argument("--compiled", default=COMPILED_PATH)
+    parser.add_argument("--output", default=LOOKUP_DIR)
+    parser.add_argument("--data", default=DATA_PATH, help="CSV used to check predictions")
+    args = parser.parse_args(argv)
+
+    compiled = CompiledModel.load(args.compiled)
+    table = build_lookup_table(compiled)
+    save_lookup_table(table, model_fingerprint(compiled), args.output)
+    lookup = LookupModel(compiled, args.output)
+    print(f"Lookup table: {table['grid'].size} cells, "
+          f"{sum(a.nbytes for a in table.values())} bytes, written to {args.output}")
+
+    import joblib
+    import warnings
+    from compiled_model import load_verification_rows
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    X = load_verification_rows(args.data)
+    expected = model.predict_proba(scaler.transform(X))
+    single = np.array([lookup.predict_one(row) for row in X])
+    exact = np.array_equal(lookup.predict_proba(X), expected) and np.array_equal(single, expected[:, 1])
+    print(f"Checked {len(X)} rows against scikit-learn: {'bit-for-bit match' if exact else 'MISMATCH'}")
+    scores, base_value, contributions = lookup.explain(X)
+    expected_scores, expected_base, expected_contributions = fold_scaler(compiled).explain(X)
+    same_explanations = (np.array_equal(scores, expected_scores) and base_value == expected_base
+                         and np.array_equal(contributions, expected_contributions))
+    print(f"Explanations against the compiled tree: {'bit-for-bit match' if same_explanations else 'MISMATCH'}")
+    return 0 if exact and same_explanations else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,21 @@
-import joblib
 import numpy as np
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import json
-import time
 import os
+import re
+import time
+import zipfile
+
+from model_registry import ModelLoadError, ModelNotFoundError, registry
+from prediction_cache import PredictionCache, cache_key
+from micro_batcher import MICRO_BATCH_ENABLED, MicroBatcher
+from instrumentation import Metrics
+from feature_schema import FEATURES, FIELDS, encoder
+from risk_percentiles import get_distribution
+from risk_levels import LEVEL_BY_CATEGORY, classify_risk
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -13,27 +23,76 @@ app = Flask(__name__)
 # Enable CORS to allow requests from frontend
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Try to load the trained model and scaler
-try:
-    model = joblib.load("Backend/cardio_model.pkl")
-    scaler = joblib.load("Backend/scaler.pkl")
-    model_loaded = True
-except:
-    # Fallback for demo purposes
-    model = None
-    scaler = None
-    model_loaded = False
-
-# Model information
-model_name = "Random Forest Classifier"
-model_accuracy = 0.942
-model_version = "v2.4"
+# Model information reported when no trained model could be loaded
+MOCK_MODEL_INFO = {"model_name": "Mock Model (no trained model loaded)", "model_version": "mock", "accuracy": None}
+mock_warning_logged = False
 
 # Track model uptime (when server starts)
 model_start_time = datetime.now()
 
-# Track inference times for average calculation
-inference_times = []
+# Latency histograms for each stage of the request handlers (see instrumentation.py)
+metrics = Metrics(
+    [("predict", stage) for stage in ("parse", "validate", "inference", "feature_impact", "serialize", "total")]
+    + [("predict_batch", stage) for stage in ("parse", "validate", "inference", "serialize", "total")]
+    + [("report", stage) for stage in ("parse", "build", "serialize", "total")]
+    + [("assess", stage) for stage in ("parse", "validate", "inference", "build", "serialize", "total")]
+)
+
+# Cache of recent predictions, dropped whenever a new model is swapped in
+prediction_cache = PredictionCache()
+registry.add_listener(lambda previous, current: prediction_cache.clear())
+
+# Population risk distribution for report percentiles (see risk_percentiles.py).
+# serve.py builds it before forking, so workers only map the saved index; after
+# a model swap it is rebuilt in the background and reports go without
+# percentiles until it is ready
+def load_population(entry, wait=False):
+    """Risk distribution for the entry's model, or None if it is not ready or cannot be built"""
+    try:
+        return get_distribution(entry, wait=wait)
+    except Exception as e:
+        app.logger.warning("No population percentiles: %s", e)
+        return None
+
+# Coalesces concurrent single predictions into vectorized batches (opt-in)
+micro_batcher = MicroBatcher() if MICRO_BATCH_ENABLED else None
+
+# Upper bound on records accepted by one batch request
+MAX_BATCH_SIZE = int(os.environ.get("CARDIO_MAX_BATCH_SIZE", 100000))
+
+# Records scored per model pass when /api/assess streams its results
+ASSESS_CHUNK_SIZE = int(os.environ.get("CARDIO_ASSESS_CHUNK_SIZE", 1000))
+
+CLINICAL_NOTES = "This prediction is for informational purposes only and should not replace professional medical advice."
+REPORT_DISCLAIMER = "HIPAA Compliant • Confidential Patient Data"
+
+# Function to get the active model from the shared registry (see model_registry.py)
+def get_model():
+    """Return the loaded model entry, or None when falling back to mock predictions
+
+    Only a missing model falls back to mock predictions; artifacts that are
+    there but cannot be loaded (wrong serving mode, missing index, hash
+    mismatch) raise ModelLoadError, answered with a 503.
+    """
+    global mock_warning_logged
+    try:
+        return registry.get()
+    except ModelNotFoundError as e:
+        if not mock_warning_logged:
+            app.logger.warning("Using mock predictions: %s", e)
+            mock_warning_logged = True
+        return None
+
+@app.errorhandler(ModelLoadError)
+def model_unavailable(e):
+    """Artifacts present but unusable: 503 rather than mock predictions"""
+    return jsonify({"error": f"Model unavailable: {e}"}), 503
+
+def model_info(entry):
+    """Model name, version and accuracy for API responses"""
+    if entry is None:
+        return dict(MOCK_MODEL_INFO)
+    return {"model_name": entry.name, "model_version": entry.version, "accuracy": entry.accuracy}
 
 # Function to calculate BMI
 def calculate_bmi(height, weight):
@@ -42,38 +101,44 @@ def calculate_bmi(height, weight):
     bmi = weight / (height_in_meters ** 2)
     return bmi
 
-# Function to get feature importance impact
-def get_feature_impact(features_dict):
-    """Calculate feature impact based on actual model feature importance"""
-    # Get actual feature importance from model if available
-    if model_loaded and hasattr(model, 'feature_importances_'):
-        feature_names = ['age', 'bmi', 'cholesterol', 'gluc', 'systolic_bp', 'diastolic_bp', 
-                        'smoking_status', 'alcohol_intake', 'physical_activity']
-        importances = model.feature_importances_
+# Feature impacts reported when no trained model is loaded
+MOCK_FEATURE_IMPACTS = {
+    "systolic_bp": 68.9,
+    "age": 12.8,
+    "cholesterol": 7.2,
+    "bmi": 2.5,
+    "diastolic_bp": 3.1,
+    "smoking_status": 2.8,
+    "physical_activity": 1.9,
+    "alcohol_intake": 0.8
+}
+
+def feature_impacts(contributions):
+    """Per-patient feature impacts in risk percentage points, keyed by API field
+
+    contributions come from the model's explain() in training column order;
+    they add up to the patient's risk score minus the model's base rate.
+    """
+    return {field.api: round(value * 100, 1) for field, value in zip(FIELDS, contributions)}
+
+def get_feature_impact(contributions=None):
+    """Feature impacts for one prediction, falling back to global importances"""
+    if contributions is not None:
+        return feature_impacts(contributions)
+    entry = get_model()
+    model = entry.predictor if entry else None
+    if model is not None and hasattr(model, 'feature_importances_'):
+        importances = np.asarray(model.feature_importances_, dtype=np.float64)
         # Normalize to percentages
-        total = sum(importances)
-        impacts = {}
-        for i, name in enumerate(feature_names):
-            if i < len(importances):
-                impacts[name] = round((importances[i] / total) * 100, 1)
-        return impacts
-    else:
-        # Fallback to mock values
-        impacts = {
-            "systolic_bp": 68.9,
-            "age": 12.8,
-            "cholesterol": 7.2,
-            "bmi": 2.5,
-            "diastolic_bp": 3.1,
-            "smoking_status": 2.8,
-            "physical_activity": 1.9,
-            "alcohol_intake": 0.8
-        }
-        return impacts
+        return {field.api: round(value * 100, 1) for field, value in zip(FIELDS, importances / importances.sum())}
+    if model is not None:
+        # Models without explanations or importances (e.g. KNN)
+        return {}
+    return dict(MOCK_FEATURE_IMPACTS)
 
 def get_feature_importance_list():
     """Get feature importance as a list for display"""
-    impacts = get_feature_impact({})
+    impacts = get_feature_impact()
     # Sort by importance
     sorted_features = sorted(impacts.items(), key=lambda x: x[1], reverse=True)
     return [{"name": name, "label": get_feature_label(name), "value": value} 
@@ -87,12 +152,209 @@ def get_feature_label(name):
         "cholesterol": "Cholesterol",
         "age": "Age",
         "bmi": "BMI",
+        "gender": "Gender",
+        "gluc": "Glucose",
         "smoking_status": "Smoking Status",
         "physical_activity": "Physical Activity",
         "alcohol_intake": "Alcohol Intake"
     }
     return labels.get(name, name.replace("_", " ").title())
 
+# Function to classify a risk score
+def parse_batch_payload():
+    """Read patient records from a JSON list or a newline-delimited JSON body"""
+    records = []
+    line_errors = {}
+    mimetype = request.mimetype or ""
+    if mimetype in ("application/x-ndjson", "application/jsonl", "application/jsonlines"):
+        lines = [line for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        for i, line in enumerate(lines):
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                records.append(None)
+                line_errors[i] = [f"Invalid JSON: {str(e)}"]
+        return records, line_errors
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("records")
+    if not isinstance(data, list):
+        raise ValueError("Expected a JSON list of patient records or newline-delimited JSON")
+    return data, line_errors
+
+def build_feature_matrix(records, row_errors=None):
+    """Validate records column-wise and build one feature matrix in model column order"""
+    return encoder.encode_many(records, row_errors)
+
+def score_matrix(X, entry, explain=False):
+    """Score a raw feature matrix with a single vectorized model pass
+
+    Returns (risk_scores, contributions); contributions is None unless
+    explain is set and the model supports explain().
+    """
+    if entry is not None:
+        if explain and hasattr(entry.predictor, "explain"):
+            risk_scores, _, contributions = entry.predictor.explain(X)
+            return risk_scores, contributions
+        return entry.predictor.predict_proba(X)[:, 1], None
+    # Mock prediction for demo
+    return np.minimum(0.9, (X[:, 2] / 140 + X[:, 4] / 300 + X[:, 0] / 100) / 3), None
+
+def score_one(features, entry):
+    """Risk score and contributions (or None) for one encoded row
+
+    The score and its attribution come from one call to the serving
+    predictor (a compiled tree walk, a lookup-table read or a packed forest
+    walk, see model_registry.SERVING_MODE); repeated inputs are answered from
+    the cache without touching the model.
+    """
+    if entry is None:
+        # Mock prediction for demo
+        return min(0.9, (features[2] / 140 + features[4] / 300 + features[0] / 100) / 3), None
+    key = cache_key(entry.version, features)
+    cached = prediction_cache.get(key)
+    if cached is not None:
+        return cached
+    contributions = None
+    if micro_batcher is not None:
+        risk_score, contributions = micro_batcher.score(features, entry.predictor)
+    elif hasattr(entry.predictor, "explain_one"):
+        risk_score, contributions = entry.predictor.explain_one(features)
+    else:
+        risk_score = entry.predictor.predict_one(features)
+    prediction_cache.put(key, (risk_score, contributions))
+    return risk_score, contributions
+
+def get_recommendations(values):
+    """Recommendations for one patient's encoded values"""
+    recommendations = [
+        "Monitor blood pressure regularly" if values["ap_hi"] > 130 else None,
+        "Consider cholesterol management" if values["cholesterol"] > 1 else None,
+        "Increase physical activity" if values["active"] == 0 else None,
+        "Consult with healthcare provider for personalized advice"
+    ]
+    return [r for r in recommendations if r]
+
+def display_number(value):
+    """Whole numbers as ints (45.0 -> 45), others unchanged"""
+    return int(value) if float(value).is_integer() else value
+
+def patient_name(record):
+    """Patient name from a record, if it carries one"""
+    if not isinstance(record, dict):
+        return None
+    name = record.get("name") or record.get("patient_name")
+    return str(name).strip() if name else None
+
+def population_percentile(values, risk_score, entry):
+    """Where the risk score falls among patients of the same age band and gender"""
+    population = load_population(entry) if entry is not None else None
+    if population is None:
+        return None
+    return population.describe(risk_score, values["age"], values["gender"])
+
+def build_report(values, risk_score, generated_at, report_id, name=None, population=None):
+    """Report document for one scored patient; population comes from population_percentile()"""
+    summary = {
+        "age": display_number(values["age"]),
+        "bmi": round(values["bmi"], 2),
+        "blood_pressure": f"{display_number(values['ap_hi'])}/{display_number(values['ap_lo'])}",
+        "cholesterol": display_number(values["cholesterol"])
+    }
+    if name:
+        summary = {"name": name, **summary}
+    return {
+        "report_id": report_id,
+        "generated_at": generated_at.isoformat(),
+        "patient_summary": summary,
+        "risk_assessment": {
+            "score": round(float(risk_score), 3),
+            "category": classify_risk(risk_score),
+            # Percentage of the reference population scoring lower (null without a model)
+            **(population or {"percentile": None})
+        },
+        "clinical_notes": CLINICAL_NOTES,
+        "disclaimer": REPORT_DISCLAIMER
+    }
+
+def build_assessment(values, risk_score, contributions, generated_at, report_id, name=None, population=None):
+    """Score, category, feature impacts, recommendations and report for one patient"""
+    return {
+        "risk_score": round(float(risk_score), 3),
+        "risk_category": classify_risk(risk_score),
+        "risk_percentage": int(risk_score * 100),
+        "feature_impacts": get_feature_impact(contributions),
+        "recommendations": get_recommendations(values),
+        "report": build_report(values, risk_score, generated_at, report_id, name, population)
+    }
+
+def assess_records(records, line_errors, entry):
+    """Assess records chunk by chunk; yields (index, name, values, assessment, errors)
+
+    Each chunk is validated and scored in one vectorized pass, so a streamed
+    response starts after the first chunk instead of after the whole batch.
+    """
+    generated_at = datetime.now()
+    stamp = generated_at.strftime('%Y%m%d%H%M%S')
+    for start in range(0, len(records), ASSESS_CHUNK_SIZE):
+        chunk = records[start:start + ASSESS_CHUNK_SIZE]
+        chunk_errors = {i - start: m for i, m in line_errors.items() if start <= i < start + len(chunk)}
+        X, valid, row_errors = build_feature_matrix(chunk, chunk_errors)
+        if valid.any():
+            risk_scores, contributions = score_matrix(X[valid], entry, explain=True)
+        else:
+            risk_scores, contributions = np.empty(0), None
+        rows = X[valid].tolist()
+        contributions = contributions.tolist() if contributions is not None else [None] * len(rows)
+        scored = iter(zip(rows, risk_scores.tolist(), contributions))
+        for i, record in enumerate(chunk):
+            index = start + i
+            name = patient_name(record)
+            if not valid[i]:
+                yield index, name, None, None, row_errors[i]
+                continue
+            row, risk_score, row_contributions = next(scored)
+            values = dict(zip(FEATURES, row))
+            assessment = build_assessment(values, risk_score, row_contributions, generated_at,
+                                          f"CARDIO-{stamp}-{index + 1:05d}", name,
+                                          population_percentile(values, risk_score, entry))
+            yield index, name, values, assessment, None
+
+def report_pdf(values, assessment, name, entry):
+    """PDF report for one assessment (see pdf_report.py)"""
+    from pdf_report import render_report
+    return render_report(
+        name=name or "N/A",
+        age=display_number(values["age"]),
+        bmi=values["bmi"],
+        ap_hi=display_number(values["ap_hi"]),
+        ap_lo=display_number(values["ap_lo"]),
+        risk_percent=assessment["risk_score"] * 100,
+        model_name=model_info(entry)["model_name"],
+        generated_at=datetime.fromisoformat(assessment["report"]["generated_at"]),
+        # The level of the JSON category, so the report never contradicts it
+        level=LEVEL_BY_CATEGORY[assessment["risk_category"]]
+    )
+
+class ZipStream:
+    """Write-only file object collecting what zipfile writes, for streaming"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
 # API Routes
 @app.route('/')
 def home():
@@ -101,116 +363,179 @@ def home():
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    try:
+        model_loaded = get_model() is not None
+    except ModelLoadError:
+        model_loaded = False
     return jsonify({"status": "healthy", "model_loaded": model_loaded})
 
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness check: 200 only once a real model is loaded and scoring"""
+    try:
+        entry = get_model()
+    except ModelLoadError as e:
+        return jsonify({"ready": False, "reason": str(e)}), 503
+    if entry is None:
+        return jsonify({"ready": False, "reason": "Model not loaded"}), 503
+    return jsonify({"ready": True, "model_version": entry.version, "pid": os.getpid()})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage latency histograms in the Prometheus text format"""
+    return app.response_class(metrics.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/api/metrics', methods=['GET'])
+def latency_metrics():
+    """Stage latency percentiles (p50/p95/p99/max) per endpoint"""
+    return jsonify(metrics.summary())
+
+@app.route('/api/model', methods=['GET'])
+def model_status():
+    """Loaded model version, content hash, load time and memory footprint"""
+    try:
+        get_model()
+    except ModelLoadError:
+        # registry.info() reports the error
+        pass
+    return jsonify(registry.info())
+
+@app.route('/api/model/reload', methods=['POST'])
+def reload_model():
+    """Load new model artifacts from disk and swap them in without a restart"""
+    token = os.environ.get("CARDIO_ADMIN_TOKEN")
+    if token and request.headers.get("X-Admin-Token") != token:
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        registry.reload(force=request.args.get("force") == "1")
+    except ModelLoadError as e:
+        return jsonify({"error": str(e), **registry.info()}), 500
+    return jsonify(registry.info())
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """Main prediction endpoint"""
+    timer = metrics.timer("predict")
     try:
         data = request.get_json()
+        timer.mark("parse")
         
-        # Validate required fields
-        required_fields = ['age', 'bmi', 'cholesterol', 'gluc', 'systolic_bp', 'diastolic_bp', 
-                          'smoking_status', 'alcohol_intake', 'physical_activity']
-        
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
-
-        # Extract and convert data types
-        age = float(data['age'])
-        bmi = float(data['bmi'])
-        cholesterol = float(data['cholesterol'])
-        gluc = float(data['gluc'])
-        systolic_bp = float(data['systolic_bp'])
-        diastolic_bp = float(data['diastolic_bp'])
-        smoking_status = int(data['smoking_status'])
-        alcohol_intake = int(data['alcohol_intake'])
-        physical_activity = int(data['physical_activity'])
-
-        # Prepare the input data for prediction
-        input_data = np.array([[age, bmi, cholesterol, gluc, systolic_bp, diastolic_bp, 
-                               smoking_status, alcohol_intake, physical_activity]])
-
-        # Measure inference time
-        inference_start = time.time()
-        
-        # Scale the input data
-        if model_loaded and scaler:
-            input_scaled = scaler.transform(input_data)
-            prediction = model.predict_proba(input_scaled)
-            risk_score = float(prediction[0][1])
-        else:
-            # Mock prediction for demo
-            risk_score = min(0.9, (systolic_bp / 140 + cholesterol / 300 + age / 100) / 3)
+        # Validate and encode in training column order (see feature_schema.py)
+        features, errors = encoder.encode_one(data)
+        if errors:
+            return jsonify({"error": errors[0], "errors": errors}), 400
+        values = dict(zip(FEATURES, features.tolist()))
+        input_data = features.reshape(1, -1)
+
+        timer.mark("validate")
+
+        # Score the raw features (the scaler is folded into the model) and
+        # attribute the score to them in the same tree walk
+        entry = get_model()
+        risk_score, contributions = score_one(input_data[0], entry)
         
-        # Calculate inference time in milliseconds
-        inference_time_ms = (time.time() - inference_start) * 1000
-        inference_times.append(inference_time_ms)
-        # Keep only last 100 inference times for average
-        if len(inference_times) > 100:
-            inference_times.pop(0)
+        timer.mark("inference")
 
         # Classify risk category
-        if risk_score >= 0.7:
-            risk_category = "High Risk"
-        elif risk_score >= 0.5:
-            risk_category = "Moderate Risk"
-        else:
-            risk_category = "Low Risk"
+        risk_category = classify_risk(risk_score)
 
         # Get feature impacts
-        feature_impacts = get_feature_impact(data)
+        impacts = get_feature_impact(contributions)
 
         # Prepare the response
         response = {
             "risk_score": round(risk_score, 3),
             "risk_category": risk_category,
             "risk_percentage": int(risk_score * 100),
-            "model_name": model_name,
-            "model_version": model_version,
-            "accuracy": model_accuracy,
+            **model_info(entry),
             "timestamp": datetime.now().isoformat(),
-            "feature_impacts": feature_impacts,
-            "recommendations": [
-                "Monitor blood pressure regularly" if systolic_bp > 130 else None,
-                "Consider cholesterol management" if cholesterol > 240 else None,
-                "Increase physical activity" if physical_activity == 0 else None,
-                "Consult with healthcare provider for personalized advice"
-            ]
+            "feature_impacts": impacts,
+            "recommendations": get_recommendations(values)
         }
-        
-        # Remove None recommendations
-        response["recommendations"] = [r for r in response["recommendations"] if r]
+        timer.mark("feature_impact")
 
-        return jsonify(response)
+        response = jsonify(response)
+        timer.mark("serialize")
+        timer.finish()
+        return response
 
     except ValueError as e:
         return jsonify({"error": f"Invalid data format: {str(e)}"}), 400
+    except ModelLoadError:
+        # Answered with a 503 by model_unavailable
+        raise
     except Exception as e:
         return jsonify({"error": f"Prediction error: {str(e)}"}), 500
 
-@app.route('/api/assessment', methods=['GET'])
-def assessment_info():
-    """Get assessment information"""
-    # Calculate model uptime
-    uptime_delta = datetime.now() - model_start_time
-    uptime_seconds = int(uptime_delta.total_seconds())
-    uptime_hours = uptime_seconds // 3600
-    uptime_minutes = (uptime_seconds % 3600) // 60
-    uptime_days = uptime_seconds // 86400
-    
-    # Calculate average inference speed
-    avg_inference_ms = sum(inference_times) / len(inference_times) if inference_times else 0
-    
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    """Batch prediction endpoint scoring many patients in one vectorized pass"""
+    timer = metrics.timer("predict_batch")
+    try:
+        records, line_errors = parse_batch_payload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"}), 413
+
+    timer.mark("parse")
+
+    try:
+        X, valid, row_errors = build_feature_matrix(records, line_errors)
+        timer.mark("validate")
+
+        # Explanations come from the same vectorized pass (?explain=0 skips them)
+        explain = request.args.get("explain", "1") != "0"
+        entry = get_model()
+        if valid.any():
+            risk_scores, contributions = score_matrix(X[valid], entry, explain=explain)
+        else:
+            risk_scores, contributions = np.empty(0), None
+        inference_time_ms = timer.mark("inference") * 1000
+
+        results = [
+            {
+                "index": int(i),
+                "risk_score": round(float(score), 3),
+                "risk_category": classify_risk(score),
+                "risk_percentage": int(score * 100)
+            }
+            for i, score in zip(np.flatnonzero(valid), risk_scores)
+        ]
+        if contributions is not None:
+            for result, row in zip(results, contributions.tolist()):
+                result["feature_impacts"] = feature_impacts(row)
+        errors = [{"index": i, "errors": messages} for i, messages in sorted(row_errors.items())]
+
+        response = jsonify({
+            **model_info(entry),
+            "timestamp": datetime.now().isoformat(),
+            "total": len(records),
+            "scored": len(results),
+            "failed": len(errors),
+            "inference_time_ms": round(inference_time_ms, 3),
+            "results": results,
+            "errors": errors
+        })
+        timer.mark("serialize")
+        timer.finish()
+        return response
+    except ModelLoadError:
+        # Answered with a 503 by model_unavailable
+        raise
+    except Exception as e:
+        return jsonify({"error": f"Prediction error: {str(e)}"}), 500
+
+def build_assessment_static(entry):
+    """The parts of /api/assessment that only change with the model"""
     # Get hyperparameters from model if available
     hyperparameters = {}
-    if model_loaded and hasattr(model, 'n_estimators'):
+    params = entry.predictor.params if entry else {}
+    if params:
         hyperparameters = {
-            "n_estimators": int(model.n_estimators),
-            "max_depth": int(model.max_depth) if model.max_depth else None,
-            "min_samples_leaf": int(model.min_samples_leaf),
-            "random_state": int(model.random_state) if hasattr(model, 'random_state') else 42
+            key: params[key]
+            for key in ("n_estimators", "max_depth", "min_samples_leaf", "n_neighbors", "C", "max_iter", "random_state")
+            if key in params
         }
     else:
         # Default hyperparameters for Random Forest
@@ -220,77 +545,239 @@ def assessment_info():
             "min_samples_leaf": 1,
             "random_state": 42
         }
-    
-    # Get feature importance
-    feature_importance = get_feature_importance_list()
-    
-    return jsonify({
-        "model_name": model_name,
-        "model_version": model_version,
-        "accuracy": model_accuracy,
-        "auc_roc": 0.96,
-        "f1_score": 0.91,
+
+    # Hold-out metrics recorded by train.py in model_report.json (null if it has none)
+    details = entry.report.get("details", {}).get(entry.name, {}) if entry else {}
+    return {
+        **model_info(entry),
+        "auc_roc": details.get("auc_roc"),
+        "f1_score": details.get("f1_score"),
         "training_dataset": "Heart Disease Research Dataset (HRDD)",
-        "features": [
-            "Age (years)",
-            "BMI (Body Mass Index)",
-            "Total Cholesterol (mg/dL)",
-            "Glucose Level",
-            "Systolic Blood Pressure (mmHg)",
-            "Diastolic Blood Pressure (mmHg)",
-            "Smoking Status",
-            "Alcohol Intake",
-            "Physical Activity Level"
-        ],
-        "model_metrics": {
-            "uptime": {
-                "days": uptime_days,
-                "hours": uptime_hours,
-                "minutes": uptime_minutes,
-                "seconds": uptime_seconds,
-                "formatted": f"{uptime_days}d {uptime_hours}h {uptime_minutes}m" if uptime_days > 0 else f"{uptime_hours}h {uptime_minutes}m"
-            },
-            "inference_speed": {
-                "average_ms": round(avg_inference_ms, 2),
-                "total_predictions": len(inference_times)
-            },
-            "trained_at": "2024-01-05T13:04:00",  # From model training
-            "library": "scikit-learn",
-            "feature_count": 9
-        },
+        # The model's inputs in training column order (see feature_schema.py)
+        "features": [get_feature_label(field.api) for field in FIELDS],
         "hyperparameters": hyperparameters,
-        "feature_importance": feature_importance
-    })
+        "feature_importance": get_feature_importance_list()
+    }
+
+def build_assessment_metrics(entry):
+    """Live model metrics for /api/assessment (uptime, latency, caches)"""
+    # Calculate model uptime
+    uptime_delta = datetime.now() - model_start_time
+    uptime_seconds = int(uptime_delta.total_seconds())
+    uptime_hours = uptime_seconds // 3600
+    uptime_minutes = (uptime_seconds % 3600) // 60
+    uptime_days = uptime_seconds // 86400
+
+    # Inference speed from the latency histograms (all workers)
+    inference_stats = metrics.summary()["predict"]["inference"]
+
+    return {
+        "uptime": {
+            "days": uptime_days,
+            "hours": uptime_hours,
+            "minutes": uptime_minutes,
+            "seconds": uptime_seconds,
+            "formatted": f"{uptime_days}d {uptime_hours}h {uptime_minutes}m" if uptime_days > 0 else f"{uptime_hours}h {uptime_minutes}m"
+        },
+        "inference_speed": {
+            "average_ms": round(inference_stats.get("mean_ms", 0), 2),
+            "p50_ms": inference_stats.get("p50_ms", 0),
+            "p95_ms": inference_stats.get("p95_ms", 0),
+            "p99_ms": inference_stats.get("p99_ms", 0),
+            "max_ms": inference_stats.get("max_ms", 0),
+            "total_predictions": inference_stats["count"]
+        },
+        "prediction_cache": prediction_cache.stats(),
+        "micro_batching": micro_batcher.stats() if micro_batcher else {"enabled": False},
+        "trained_at": entry.report.get("trained_at") if entry else None,
+        "library": "scikit-learn",
+        "feature_count": len(FEATURES)
+    }
+
+# Seconds the live metrics in /api/assessment are reused before being rebuilt
+ASSESSMENT_METRICS_TTL = float(os.environ.get("CARDIO_ASSESSMENT_METRICS_TTL", 5))
+
+# (model version, serialized static part) and (static part, expiry, body, etag, last modified)
+assessment_static = (None, None)
+assessment_body = (None, 0.0, None, None, None)
+
+def get_assessment_body():
+    """Serialized /api/assessment body with its ETag and Last-Modified time"""
+    global assessment_static, assessment_body
+    entry = get_model()
+    version = entry.version if entry else "mock"
+    if assessment_static[0] != version:
+        # Serialized once per model version; the closing brace is left off so
+        # the live metrics can be appended as plain text
+        assessment_static = (version, json.dumps(build_assessment_static(entry))[:-1])
+    static = assessment_static[1]
+
+    cached_static, expires, body, etag, last_modified = assessment_body
+    now = time.monotonic()
+    if cached_static is not static or now >= expires:
+        body = f'{static}, "model_metrics": {json.dumps(build_assessment_metrics(entry))}}}'.encode()
+        # The validators cover the metrics snapshot too, so they change with
+        # every refresh and a revalidating client never keeps stale metrics
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        assessment_body = (static, now + ASSESSMENT_METRICS_TTL, body, etag, last_modified)
+    return body, etag, last_modified
+
+@app.route('/api/assessment', methods=['GET'])
+def assessment_info():
+    """Get assessment information
+
+    The model-dependent part is built once per model version and the live
+    metrics at most every ASSESSMENT_METRICS_TTL seconds. The ETag and
+    Last-Modified identify that snapshot: If-None-Match or If-Modified-Since
+    get a 304 until the metrics are next refreshed, and the new body after.
+    """
+    body, etag, last_modified = get_assessment_body()
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Cacheable, but revalidated on every use
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/report', methods=['POST'])
 def generate_report():
-    """Generate detailed risk report"""
+    """Generate detailed risk report, scoring the patient server-side"""
+    timer = metrics.timer("report")
     try:
         data = request.get_json()
-        risk_score = data.get('risk_score', 0.5)
-        
-        report = {
-            "report_id": f"CARDIO-{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "generated_at": datetime.now().isoformat(),
-            "patient_summary": {
-                "age": data.get('age'),
-                "bmi": data.get('bmi'),
-                "blood_pressure": f"{data.get('systolic_bp')}/{data.get('diastolic_bp')}",
-                "cholesterol": data.get('cholesterol')
-            },
-            "risk_assessment": {
-                "score": risk_score,
-                "category": "High Risk" if risk_score >= 0.7 else "Moderate Risk" if risk_score >= 0.5 else "Low Risk",
-                "percentile": f"Top {int((1-risk_score)*100)}%"
-            },
-            "clinical_notes": "This prediction is for informational purposes only and should not replace professional medical advice.",
-            "disclaimer": "HIPAA Compliant • Confidential Patient Data"
-        }
-        
-        return jsonify(report)
+        timer.mark("parse")
+
+        # The risk is computed here from the patient fields, never taken from the client
+        features, errors = encoder.encode_one(data)
+        if errors:
+            return jsonify({"error": errors[0], "errors": errors}), 400
+        entry = get_model()
+        risk_score, _ = score_one(features, entry)
+        values = dict(zip(FEATURES, features.tolist()))
+        generated_at = datetime.now()
+        report = build_report(values, risk_score, generated_at, f"CARDIO-{generated_at.strftime('%Y%m%d%H%M%S')}",
+                              patient_name(data), population_percentile(values, risk_score, entry))
+        timer.mark("build")
+
+        response = jsonify(report)
+        timer.mark("serialize")
+        timer.finish()
+        return response
+    except ModelLoadError:
+        # Answered with a 503 by model_unavailable
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-# Run the app
+@app.route('/api/assess', methods=['POST'])
+def assess():
+    """Score, classify, attribute and report in one call, for one patient or many
+
+    A JSON object gets one assessment back. A JSON list, {"records": [...]} or
+    newline-delimited JSON is a batch: one JSON document by default, or
+    streamed as it is produced with ?format=ndjson (one JSON line per patient)
+    or ?format=pdf (a zip of PDF reports). The Accept header works too.
+    """
+    timer = metrics.timer("assess")
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict) and "records" not in data:
+        try:
+            features, errors = encoder.encode_one(data)
+            if errors:
+                return jsonify({"error": errors[0], "errors": errors}), 400
+            values = dict(zip(FEATURES, features.tolist()))
+            timer.mark("validate")
+            entry = get_model()
+            risk_score, contributions = score_one(features, entry)
+            timer.mark("inference")
+            generated_at = datetime.now()
+            assessment = build_assessment(values, risk_score, contributions, generated_at,
+                                          f"CARDIO-{generated_at.strftime('%Y%m%d%H%M%S')}", patient_name(data),
+                                          population_percentile(values, risk_score, entry))
+            timer.mark("build")
+            response = jsonify({**assessment, **model_info(entry), "timestamp": generated_at.isoformat()})
+            timer.mark("serialize")
+            timer.finish()
+            return response
+        except ModelLoadError:
+            # Answered with a 503 by model_unavailable
+            raise
+        except Exception as e:
+            return jsonify({"error": f"Assessment error: {str(e)}"}), 500
+
+    try:
+        records, line_errors = parse_batch_payload()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"}), 413
+    timer.mark("parse")
+
+    output = request.args.get("format")
+    if output is None:
+        best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson", "application/zip"])
+        output = {"application/x-ndjson": "ndjson", "application/zip": "pdf"}.get(best, "json")
+    if output not in ("json", "ndjson", "pdf"):
+        return jsonify({"error": f"Unknown format '{output}' (expected json, ndjson or pdf)"}), 400
+
+    entry = get_model()
+    info = model_info(entry)
+    headers = {"X-Model-Name": info["model_name"], "X-Model-Version": info["model_version"]}
+    assessments = assess_records(records, line_errors, entry)
+
+    if output == "json":
+        try:
+            results, errors = [], []
+            for index, name, values, assessment, row_errors in assessments:
+                if assessment is None:
+                    errors.append({"index": index, "errors": row_errors})
+                else:
+                    results.append({"index": index, **assessment})
+            timer.mark("build")
+            response = jsonify({
+                **info,
+                "timestamp": datetime.now().isoformat(),
+                "total": len(records),
+                "assessed": len(results),
+                "failed": len(errors),
+                "results": results,
+                "errors": errors
+            })
+            timer.mark("serialize")
+            timer.finish()
+            return response
+        except Exception as e:
+            return jsonify({"error": f"Assessment error: {str(e)}"}), 500
+
+    if output == "ndjson":
+        def generate():
+            for index, name, values, assessment, row_errors in assessments:
+                line = {"index": index, **assessment} if assessment is not None else {"index": index, "errors": row_errors}
+                yield json.dumps(line) + "\n"
+            timer.mark("build")
+            timer.finish()
+        return Response(generate(), mimetype="application/x-ndjson", headers=headers)
+
+    def generate_zip():
+        stream = ZipStream()
+        errors = []
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+            for index, name, values, assessment, row_errors in assessments:
+                if assessment is None:
+                    errors.append({"index": index, "errors": row_errors})
+                    continue
+                slug = re.sub(r"[^A-Za-z0-9_-]+", "_", name or "patient").strip("_") or "patient"
+                archive.writestr(f"{index + 1:05d}_{slug}.pdf", report_pdf(values, assessment, name, entry))
+                yield stream.take()
+            if errors:
+                archive.writestr("errors.json", json.dumps(errors, indent=2))
+        yield stream.take()
+        timer.mark("build")
+        timer.finish()
+    headers["Content-Disposition"] = "attachment; filename=cardio_reports.zip"
+    return Response(generate_zip(), mimetype="application/zip", headers=headers)
+
+# Run the app with the Flask development server (use serve.py in production)
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5005)
+    app.run(debug=True, host='0.0.0.0', port=int(os.environ.get("PORT", 5000)))
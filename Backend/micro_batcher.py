@@ -0,0 +1,118 @@
+"""Coalesce concurrent single-row predictions into vectorized batches.
+
+Each request thread hands its feature row to the batcher and waits. A
+background thread collects rows until either max_batch_size rows are queued or
+max_wait_ms has passed since the first one, scores them with one explain (or
+predict_proba) call, and hands each request its own score and feature
+contributions. Larger windows give bigger
+batches (throughput) at the price of added latency.
+
+Enabled in main.py with CARDIO_MICRO_BATCH=1; CARDIO_BATCH_WAIT_MS and
+CARDIO_BATCH_MAX tune the window and batch size.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+MICRO_BATCH_ENABLED = os.environ.get("CARDIO_MICRO_BATCH", "0") == "1"
+BATCH_WAIT_MS = float(os.environ.get("CARDIO_BATCH_WAIT_MS", 2))
+BATCH_MAX = int(os.environ.get("CARDIO_BATCH_MAX", 64))
+
+
+class MicroBatcher:
+    """Queues single rows and scores them together in small batches"""
+
+    def __init__(self, max_batch_size=BATCH_MAX, max_wait_ms=BATCH_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+
+    def _ensure_worker(self):
+        # Started lazily, and again after a fork: threads do not survive fork
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                    self._queue = queue.Queue()
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, row, predictor):
+        """Queue one row of raw features; returns a Future for (risk score, contributions)"""
+        row = np.asarray(row, dtype=np.float64).reshape(-1)
+        if len(row) != predictor.n_features:
+            raise ValueError(f"X has {len(row)} features, but the model expects {predictor.n_features}")
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((row, predictor, future))
+        return future
+
+    def score(self, row, predictor, timeout=None):
+        """Score one row, blocking until its batch has been scored; returns (risk score, contributions)
+
+        contributions is None when the model has no explain() (e.g. KNN).
+        """
+        return self.submit(row, predictor).result(timeout)
+
+    def _run(self):
+        wait = self.max_wait_ms / 1000
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._score(batch)
+
+    def _score(self, batch):
+        with self._lock:
+            self.requests += len(batch)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+
+        # Rows for different model versions (during a hot swap) are scored apart
+        groups = {}
+        for row, predictor, future in batch:
+            groups.setdefault(id(predictor), (predictor, []))[1].append((row, future))
+        for predictor, items in groups.values():
+            X = np.vstack([row for row, _ in items])
+            try:
+                if hasattr(predictor, "explain"):
+                    scores, _, contributions = predictor.explain(X)
+                    contributions = contributions.tolist()
+                else:
+                    scores = predictor.predict_proba(X)[:, 1]
+                    contributions = [None] * len(items)
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), score, row_contributions in zip(items, scores.tolist(), contributions):
+                future.set_result((score, row_contributions))
+
+    def stats(self):
+        return {
+            "window_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self._queue.qsize(),
+            "requests": self.requests,
+            "batches": self.batches,
+            "average_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.max_batch_seen,
+        }
@@ -0,0 +1,234 @@
+"""Process-wide registry for the trained model artifacts.
+
+Both the Flask API (main.py) and the Streamlit app (app.py) get the model from
+here. Artifacts are loaded lazily, once per process (or once before forking
+workers), and identified by a content hash of the files plus the version in
+model_report.json. A new model can be swapped in without restarting: write the
+new files (ideally to a temp name, then rename over the old ones) and either
+call reload() or let the periodic file check pick them up.
+
+Reports written by train.save_artifacts list the sha256 of each artifact.
+Files that do not match their report (an update half-way through its renames)
+are not loaded; the current model stays in place until they do.
+
+With no trained model on disk at all, get() raises ModelNotFoundError (the
+API serves mock predictions then); anything else that stops a model from
+loading is a ModelLoadError.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from compiled_model import COMPILED_PATH, MODEL_PATH, SCALER_PATH, load_predictor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_PATH = os.path.join(BACKEND_DIR, "model_report.json")
+
+# How predictions are computed: "compiled" walks the compiled tree/forest/linear
+# model (KNN models query the index in knn_index.py), "lookup" uses the
+# precomputed grid in lookup_table.py (decision trees), "packed" the narrow
+# node arrays in packed_forest.py (random forests and decision trees)
+SERVING_MODE = os.environ.get("CARDIO_SERVING_MODE", "compiled")
+
+# Seconds between checks of the artifact files for a new model (0 disables)
+RELOAD_INTERVAL = float(os.environ.get("CARDIO_MODEL_RELOAD_INTERVAL", 30))
+
+
+class ModelLoadError(Exception):
+    """Raised when the model artifacts cannot be loaded"""
+
+
+class ModelNotFoundError(ModelLoadError):
+    """Raised when there is no trained model on disk at all"""
+
+
+class LoadedModel:
+    """One loaded version of the model with its report metadata"""
+
+    def __init__(self, predictor, report, content_hash, load_time_ms, files):
+        self.predictor = predictor
+        self.report = report
+        self.content_hash = content_hash
+        self.load_time_ms = load_time_ms
+        self.files = files
+        self.loaded_at = datetime.now()
+
+        self.accuracies = report.get("models", {})
+        self.name = report.get("best_model", type(predictor).__name__)
+        self.accuracy = self.accuracies.get(self.name)
+        # model_report.json may carry an explicit version; otherwise the
+        # content hash identifies the artifacts
+        self.version = str(report.get("version") or f"sha-{content_hash[:12]}")
+
+    @property
+    def memory_bytes(self):
+        """Approximate memory held by the model arrays"""
+        arrays = getattr(self.predictor, "arrays", None)
+        if arrays is not None:
+            return int(sum(a.nbytes for a in arrays.values()))
+        return int(sum(os.path.getsize(path) for path in self.files))
+
+    def info(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "content_hash": self.content_hash,
+            "kind": getattr(self.predictor, "kind", None),
+            "accuracy": self.accuracy,
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_time_ms": round(self.load_time_ms, 2),
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+class ModelRegistry:
+    """Lazily loads the model once per process and hot-swaps it on change"""
+
+    def __init__(self, compiled_path=COMPILED_PATH, model_path=MODEL_PATH,
+                 scaler_path=SCALER_PATH, report_path=REPORT_PATH, reload_interval=RELOAD_INTERVAL,
+                 serving_mode=SERVING_MODE):
+        self.compiled_path = compiled_path
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.report_path = report_path
+        self.reload_interval = reload_interval
+        self.serving_mode = serving_mode
+
+        self._lock = threading.Lock()
+        self._current = None
+        self._error = None
+        self._signature = None
+        self._last_check = 0.0
+        self._listeners = []
+        self.reloads = 0
+
+    def _file_signature(self):
+        """(path, mtime, size) of each artifact, with None for files that are missing"""
+        signature = []
+        for path in (self.compiled_path, self.model_path, self.scaler_path, self.report_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                signature.append((path, None, None))
+            else:
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _check_artifacts(self, report, hashes):
+        """Raise ModelLoadError unless the files match the hashes listed in the report"""
+        expected = report.get("artifacts")
+        if expected is None:
+            # Written before reports listed their artifacts
+            return
+        paths = {"model": self.model_path, "scaler": self.scaler_path, "compiled": self.compiled_path}
+        for role, path in paths.items():
+            if hashes.get(path) != expected.get(role):
+                raise ModelLoadError(f"{os.path.basename(path)} does not match model_report.json "
+                                     "(artifacts are being updated)")
+
+    def _load(self):
+        start = time.perf_counter()
+        signature = self._file_signature()
+        files = [path for path, mtime, _ in signature if mtime is not None]
+        if self.model_path not in files and self.compiled_path not in files:
+            raise ModelNotFoundError(f"No trained model at {self.model_path} or {self.compiled_path}")
+        digest = hashlib.sha256()
+        hashes = {}
+        try:
+            for path in files:
+                file_digest = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+                        file_digest.update(block)
+                hashes[path] = file_digest.hexdigest()
+            if self.serving_mode == "packed":
+                # Scored and explained from the packed arrays alone: the
+                # compiled model is not loaded
+                from packed_forest import load_packed_forest
+                predictor = load_packed_forest(self.model_path, self.scaler_path)
+            else:
+                predictor = load_predictor(self.compiled_path, self.model_path, self.scaler_path)
+            if self.serving_mode == "lookup":
+                from lookup_table import load_lookup_model, lookup_dir
+                predictor = load_lookup_model(predictor, lookup_dir(self.model_path))
+            elif self.serving_mode not in ("compiled", "packed"):
+                raise ValueError(f"Unknown serving mode '{self.serving_mode}'")
+            with open(self.report_path, "r") as f:
+                report = json.load(f)
+        except Exception as e:
+            raise ModelLoadError(f"Could not load model artifacts: {e}") from e
+        self._check_artifacts(report, hashes)
+        if self._file_signature() != signature:
+            raise ModelLoadError("Model artifacts changed while loading")
+        load_time_ms = (time.perf_counter() - start) * 1000
+        return LoadedModel(predictor, report, digest.hexdigest(), load_time_ms, files)
+
+    def get(self):
+        """Return the current model, loading it on first use"""
+        current = self._current
+        if current is None and self._error is None:
+            return self.reload()
+        if self.reload_interval and time.monotonic() - self._last_check > self.reload_interval:
+            self._last_check = time.monotonic()
+            if self._file_signature() != self._signature:
+                try:
+                    return self.reload()
+                except ModelLoadError:
+                    # Keep serving the model we have
+                    pass
+        if current is None:
+            raise self._error
+        return current
+
+    def reload(self, force=False):
+        """Load the artifacts from disk and swap them in if they changed"""
+        with self._lock:
+            signature = self._file_signature()
+            if self._current is not None and signature == self._signature and not force:
+                return self._current
+            try:
+                loaded = self._load()
+            except ModelLoadError as e:
+                if self._current is None:
+                    self._error = e
+                raise
+            previous = self._current
+            self._signature = signature
+            self._last_check = time.monotonic()
+            self._error = None
+            if previous is not None and previous.content_hash == loaded.content_hash:
+                return previous
+            # Swapping the reference is atomic; requests in flight keep the
+            # model object they already hold
+            self._current = loaded
+            if previous is not None:
+                self.reloads += 1
+        for listener in self._listeners:
+            listener(previous, loaded)
+        return loaded
+
+    def add_listener(self, callback):
+        """Call callback(previous, current) whenever a new model is swapped in"""
+        self._listeners.append(callback)
+
+    @property
+    def loaded(self):
+        return self._current is not None
+
+    def info(self):
+        """Registry state for health and metrics endpoints"""
+        info = {"loaded": self.loaded, "reloads": self.reloads, "reload_interval_s": self.reload_interval,
+                "serving_mode": self.serving_mode}
+        if self._current is not None:
+            info.update(self._current.info())
+        elif self._error is not None:
+            info["error"] = str(self._error)
+        return info
+
+
+# Shared instance used by main.py and app.py
+registry = ModelRegistry()
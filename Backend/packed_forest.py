@@ -0,0 +1,499 @@
+"""Compact packed representation of the Random Forest (or decision tree) model.
+
+Usage:
+    python Backend/packed_forest.py [--model cardio_model.pkl] [--output DIR] [--threads N]
+                                    [--explain-rows N]
+
+scikit-learn stores every node of every tree as a 64-byte record plus its
+class values, so the 200-tree, unlimited-depth Random Forest from train.py
+pickles to hundreds of megabytes. Packing keeps only the split nodes, in
+narrow dtypes: int16 feature ids, float32 thresholds and int32 children.
+Leaves are replaced by one shared node per distinct leaf class fraction
+(fully grown trees have almost only pure leaves, so a few hundred of these
+stand in for millions of leaves); each loops back onto itself, so a walk can
+take extra steps without leaving its leaf. Thresholds are rounded down to the
+nearest float32, which is exact: scikit-learn compares float32 inputs, and
+x <= t for a float32 x is x <= (largest float32 <= t). The arrays are written
+as .npy files next to the model and memory-mapped at load time, so worker
+processes share one copy.
+
+Scoring is vectorized one tree level per step. Small batches (a single
+patient) walk every (row, tree) pair together; large batches walk one tree
+at a time over all rows, which keeps that tree's nodes in cache. Trees can
+be split across a thread pool. Probabilities are summed in tree order, as
+scikit-learn does, so they match it bit for bit. predict() exits early:
+trees are scored in blocks, and a row stops as soon as the trees left cannot
+move its average across the decision threshold.
+
+Explanations walk the same arrays: every node also keeps its positive-class
+value (float32), and each split on a row's path credits its feature with the
+change in that value, as CompiledModel.explain does. The model's params and
+feature importances are stored with the arrays, so serving never builds the
+compiled model (whose node lists take gigabytes for a forest this size).
+
+Serving uses it when CARDIO_SERVING_MODE=packed; the arrays are (re)built
+automatically if they are missing, were built from different artifacts or
+by an older version of this module.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from compiled_model import DATA_PATH, MODEL_PATH, SCALER_PATH, TREE_LEAF, file_fingerprint, save_arrays
+
+PACKED_DIRNAME = "packed_forest"
+
+# Bump when the arrays change; older packs are rebuilt
+PACKED_FORMAT = 2
+
+# Threads the trees of a batch are split over
+THREADS = int(os.environ.get("CARDIO_FOREST_THREADS", 1))
+
+# Rows scored together (bounds the per-batch working memory)
+BATCH_ROWS = 32768
+
+# Batches with at least this many rows are walked one tree at a time
+TREE_WALK_ROWS = 2048
+
+# Rows whose leaf values are summed together
+SUM_ROWS = 2048
+
+# Walk steps between dropping the rows that have reached a leaf
+COMPACT_EVERY = 4
+
+# Trees scored between early-exit checks in predict()
+EXIT_BLOCK = 16
+
+# Rows whose bounds are this close to the threshold are scored in full
+EXIT_MARGIN = 1e-9
+
+# Rows explained together (all their trees are walked at once)
+EXPLAIN_ROWS = 256
+
+# Largest difference main() accepts between packed and compiled explanations
+EXPLAIN_TOLERANCE = 1e-6
+
+ARRAY_NAMES = ["feature", "threshold", "children", "roots", "values", "node_value", "tree_min", "tree_max",
+               "classes", "mean", "scale", "feature_importances"]
+
+
+def packed_dir(model_path=MODEL_PATH):
+    """Directory holding the packed arrays for the model pickle at model_path"""
+    return os.path.join(os.path.dirname(os.path.abspath(model_path)), PACKED_DIRNAME)
+
+
+def _float32_below(threshold):
+    """Largest float32 <= each float64 threshold"""
+    t32 = threshold.astype(np.float32)
+    above = t32.astype(np.float64) > threshold
+    t32[above] = np.nextafter(t32[above], np.float32(-np.inf))
+    return t32
+
+
+def pack_forest(model, scaler):
+    """Packed arrays and metadata for a fitted forest or decision tree"""
+    if hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_"):
+        kind, estimators = "forest", model.estimators_
+    elif hasattr(model, "tree_"):
+        kind, estimators = "tree", [model]
+    else:
+        raise ValueError(f"Only tree models can be packed, not {type(model).__name__}")
+
+    # Class fractions of every node, as _compile_trees reads them
+    fractions, leaf_values = [], []
+    for estimator in estimators:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :estimator.n_classes_]
+        totals = value.sum(axis=1, keepdims=True)
+        if not np.allclose(totals, 1.0):
+            totals[totals == 0] = 1
+            value = value / totals
+        fractions.append(value)
+        leaf_values.append(value[tree.children_left == TREE_LEAF])
+    values, leaf_codes = np.unique(np.concatenate(leaf_values), axis=0, return_inverse=True)
+    leaf_codes = leaf_codes.reshape(-1)
+
+    n_splits = sum(int(np.count_nonzero(e.tree_.children_left != TREE_LEAF)) for e in estimators)
+    if n_splits + len(values) > np.iinfo(np.int32).max:
+        raise ValueError("Forest too large for int32 node ids")
+
+    features, thresholds, lefts, rights, roots, node_values = [], [], [], [], [], []
+    tree_min, tree_max = [], []
+    offset = leaf_offset = 0
+    for estimator, fraction, value in zip(estimators, fractions, leaf_values):
+        tree = estimator.tree_
+        is_leaf = tree.children_left == TREE_LEAF
+        # Split nodes are numbered consecutively across trees; a leaf becomes
+        # the shared node of its value, after all the split nodes
+        code = np.empty(tree.node_count, dtype=np.int64)
+        code[~is_leaf] = offset + np.arange(np.count_nonzero(~is_leaf))
+        code[is_leaf] = n_splits + leaf_codes[leaf_offset:leaf_offset + len(value)]
+        features.append(tree.feature[~is_leaf])
+        thresholds.append(_float32_below(tree.threshold[~is_leaf]))
+        lefts.append(code[tree.children_left[~is_leaf]])
+        rights.append(code[tree.children_right[~is_leaf]])
+        roots.append(code[0])
+        node_values.append(fraction[~is_leaf, -1])
+        tree_min.append(value[:, -1].min())
+        tree_max.append(value[:, -1].max())
+        offset += np.count_nonzero(~is_leaf)
+        leaf_offset += len(value)
+
+    # Leaf nodes compare against +inf and lead back to themselves either way
+    leaf_nodes = n_splits + np.arange(len(values))
+    features.append(np.zeros(len(values), dtype=np.int16))
+    thresholds.append(np.full(len(values), np.inf, dtype=np.float32))
+    lefts.append(leaf_nodes)
+    rights.append(leaf_nodes)
+    node_values.append(values[:, -1])
+    arrays = {
+        "feature": np.concatenate(features).astype(np.int16),
+        "threshold": np.concatenate(thresholds),
+        # children[node, x <= threshold] is the next node: right child first
+        "children": np.stack([np.concatenate(rights), np.concatenate(lefts)], axis=1).astype(np.int32),
+        "roots": np.array(roots, dtype=np.int32),
+        "values": values.astype(np.float64),
+        # Positive-class value of every node (split nodes, then leaf values), for explanations
+        "node_value": np.concatenate(node_values).astype(np.float32),
+        # Positive-class leaf value range of each tree, for early exit
+        "tree_min": np.array(tree_min, dtype=np.float64),
+        "tree_max": np.array(tree_max, dtype=np.float64),
+        "classes": np.asarray(model.classes_),
+        "mean": np.asarray(scaler.mean_, dtype=np.float64),
+        "scale": np.asarray(scaler.scale_, dtype=np.float64),
+        "feature_importances": np.asarray(model.feature_importances_, dtype=np.float64),
+    }
+    meta = {
+        "format": PACKED_FORMAT,
+        "kind": kind,
+        "estimator": type(model).__name__,
+        "params": {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+        "splits": n_splits,
+        "leaf_values": len(values),
+    }
+    return arrays, meta
+
+
+def save_packed_forest(arrays, meta, fingerprint, directory):
+    # Workers may have the old arrays memory-mapped; save_arrays never writes in place
+    save_arrays(arrays, dict(meta, model_fingerprint=fingerprint), directory)
+
+
+class PackedForest:
+    """Scores and explains rows from the packed node arrays"""
+
+    def __init__(self, arrays, meta, threads=THREADS):
+        self.arrays = arrays
+        self.meta = meta
+        self.threads = threads
+        self.kind = "packed"
+        self.classes_ = np.asarray(arrays["classes"])
+        self.n_features = len(arrays["mean"])
+        self.params = meta.get("params", {})
+        self.feature_importances_ = np.asarray(arrays["feature_importances"])
+
+        # Plain ndarray views of the memory maps: indexing an np.memmap goes
+        # through Python on every call
+        self.feature = np.asarray(arrays["feature"])
+        self.threshold = np.asarray(arrays["threshold"])
+        self.children = np.asarray(arrays["children"]).reshape(-1)
+        self.roots = np.asarray(arrays["roots"])
+        self.values = np.asarray(arrays["values"])
+        self.node_value = np.asarray(arrays["node_value"])
+        self.n_splits = meta["splits"]
+        self._mean = np.asarray(arrays["mean"])
+        self._scale = np.asarray(arrays["scale"])
+        self._n_trees = len(self.roots)
+        self._trees = np.arange(self._n_trees)
+        # Smallest and largest positive-class sum the trees from t on can add
+        self._suffix_min = np.append(np.cumsum(arrays["tree_min"][::-1])[::-1], 0.0)
+        self._suffix_max = np.append(np.cumsum(arrays["tree_max"][::-1])[::-1], 0.0)
+        self._pool = None
+
+    @classmethod
+    def load(cls, directory, threads=THREADS):
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        # Memory-mapped: pages are shared between processes
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+        return cls(arrays, meta, threads)
+
+    def _prepare(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features}")
+        # Same operations, in the same order, as StandardScaler.transform, then
+        # float32 as scikit-learn trees compare
+        X = X - self._mean
+        X /= self._scale
+        return X.astype(np.float32)
+
+    def _walk_pairs(self, X32, trees):
+        """Leaf value ids, one column per tree in trees, walking all (row, tree) pairs together"""
+        n_rows, n_features = X32.shape
+        flat = X32.reshape(-1)
+        node = np.tile(self.roots[trees], n_rows)
+        pair = np.arange(len(node))
+        offset = pair // len(trees) * n_features
+        leaves = np.empty(len(node), dtype=np.int32)
+        feature, threshold, children = self.feature, self.threshold, self.children
+        step = 0
+        while len(pair):
+            node = children[2 * node + (flat[offset + feature[node]] <= threshold[node])]
+            step += 1
+            if step % COMPACT_EVERY == 0:
+                done = node >= self.n_splits
+                leaves[pair[done]] = node[done] - self.n_splits
+                pair, node, offset = pair[~done], node[~done], offset[~done]
+        return leaves.reshape(n_rows, len(trees))
+
+    def _walk_trees(self, X32, trees):
+        """Leaf value ids, one column per tree in trees, walking one tree at a time"""
+        n_rows = X32.shape[0]
+        by_feature = np.ascontiguousarray(X32.T).reshape(-1)
+        leaves = np.empty((n_rows, len(trees)), dtype=np.int32)
+        feature, threshold, children = self.feature, self.threshold, self.children
+        for column, root in enumerate(self.roots[trees]):
+            row = np.arange(n_rows)
+            node = np.full(n_rows, root, dtype=np.int32)
+            step = 0
+            while len(row):
+                x = by_feature[feature[node].astype(np.intp) * n_rows + row]
+                node = children[2 * node + (x <= threshold[node])]
+                step += 1
+                if step % COMPACT_EVERY == 0:
+                    done = node >= self.n_splits
+                    leaves[row[done], column] = node[done] - self.n_splits
+                    row, node = row[~done], node[~done]
+        return leaves
+
+    def _leaves(self, X32, trees):
+        walk = self._walk_trees if X32.shape[0] >= TREE_WALK_ROWS else self._walk_pairs
+        if self.threads <= 1 or len(trees) < 2:
+            return walk(X32, trees)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+        parts = np.array_split(trees, self.threads)
+        return np.hstack(list(self._pool.map(lambda part: walk(X32, part), parts)))
+
+    def _proba(self, X32):
+        out = np.empty((X32.shape[0], self.values.shape[1]), dtype=np.float64)
+        for start in range(0, X32.shape[0], BATCH_ROWS):
+            leaves = self._leaves(X32[start:start + BATCH_ROWS], self._trees)
+            for first in range(0, len(leaves), SUM_ROWS):
+                # cumsum adds tree by tree, in order, like scikit-learn's accumulation
+                total = np.cumsum(self.values[leaves[first:first + SUM_ROWS]], axis=1)[:, -1]
+                out[start + first:start + first + len(total)] = total
+        if self.meta["kind"] == "forest":
+            out /= self._n_trees
+        return out
+
+    def predict_proba(self, X):
+        """Class probabilities for a 2-D array of raw features"""
+        return self._proba(self._prepare(X))
+
+    def _decide(self, X32, threshold):
+        """Positive-class decisions with early exit; returns (decisions, trees scored per row)"""
+        n = X32.shape[0]
+        cut = 0.5 if threshold is None else threshold
+        positive = np.zeros(n, dtype=bool)
+        partial = np.zeros(n, dtype=np.float64)
+        pending = np.arange(n)
+        scored = 0
+        for start in range(0, self._n_trees, EXIT_BLOCK):
+            trees = self._trees[start:start + EXIT_BLOCK]
+            leaves = self._leaves(X32[pending], trees)
+            scored += leaves.size
+            partial[pending] += self.values[leaves, -1].sum(axis=1)
+            end = start + len(trees)
+            low = (partial[pending] + self._suffix_min[end]) / self._n_trees
+            high = (partial[pending] + self._suffix_max[end]) / self._n_trees
+            yes = low > cut + EXIT_MARGIN
+            no = high < cut - EXIT_MARGIN
+            positive[pending[yes]] = True
+            pending = pending[~(yes | no)]
+            if not len(pending):
+                break
+        if len(pending):
+            # Too close to call from bounds: decide from the exact probabilities
+            proba = self._proba(X32[pending])
+            positive[pending] = proba[:, 1] > proba[:, 0] if threshold is None else proba[:, 1] >= threshold
+            scored += len(pending) * self._n_trees
+        return positive, scored / max(n, 1)
+
+    def predict(self, X, threshold=None):
+        """Predicted class labels, stopping each row once its vote is decided
+
+        With threshold=None this matches scikit-learn's predict (the most
+        probable class); otherwise rows with positive probability >= threshold
+        get the positive class.
+        """
+        X32 = self._prepare(X)
+        if self.meta["kind"] != "forest" or len(self.classes_) != 2:
+            proba = self._proba(X32)
+            if threshold is not None and len(self.classes_) == 2:
+                return self.classes_[(proba[:, 1] >= threshold).astype(int)]
+            return self.classes_[np.argmax(proba, axis=1)]
+        positive, _ = self._decide(X32, threshold)
+        return self.classes_[positive.astype(int)]
+
+    def predict_one(self, row):
+        """Positive-class probability for a single row of raw features"""
+        return float(self._proba(self._prepare(np.asarray(row, dtype=np.float64).reshape(1, -1)))[0, -1])
+
+    def _contributions(self, X32):
+        """Path attributions summed over the trees, one row per row of X32"""
+        n_rows, n_features = X32.shape
+        flat = X32.reshape(-1)
+        node = np.tile(self.roots, n_rows)
+        row = np.repeat(np.arange(n_rows), self._n_trees)
+        total = np.zeros(n_rows * n_features, dtype=np.float64)
+        feature, threshold, children, node_value = self.feature, self.threshold, self.children, self.node_value
+        while len(node):
+            cell = row * n_features + feature[node]
+            child = children[2 * node + (flat[cell] <= threshold[node])]
+            change = node_value[child].astype(np.float64) - node_value[node]
+            total += np.bincount(cell, weights=change, minlength=len(total))
+            # Rows stop at their leaf in each tree
+            inner = child < self.n_splits
+            node, row = child[inner], row[inner]
+        return total.reshape(n_rows, n_features)
+
+    def explain(self, X):
+        """Risk scores plus per-feature path attributions, as CompiledModel.explain
+
+        Scores are predict_proba's; base_value + contributions.sum() matches
+        them to float32 precision (the node values are stored as float32).
+        """
+        X32 = self._prepare(X)
+        scores = self._proba(X32)[:, -1]
+        contributions = np.empty((X32.shape[0], self.n_features), dtype=np.float64)
+        for start in range(0, X32.shape[0], EXPLAIN_ROWS):
+            contributions[start:start + EXPLAIN_ROWS] = self._contributions(X32[start:start + EXPLAIN_ROWS])
+        base_value = float(self.node_value[self.roots].astype(np.float64).mean())
+        if self.meta["kind"] == "forest":
+            contributions /= self._n_trees
+        return scores, base_value, contributions
+
+    def explain_one(self, row):
+        """Risk score and per-feature contributions (a list) for a single row"""
+        scores, _, contributions = self.explain(np.asarray(row, dtype=np.float64).reshape(1, -1))
+        return float(scores[0]), contributions[0].tolist()
+
+
+def load_packed_forest(model_path=MODEL_PATH, scaler_path=SCALER_PATH, threads=THREADS):
+    """Load the packed arrays for these artifacts, packing the pickle if they are stale"""
+    directory = packed_dir(model_path)
+    fingerprint = file_fingerprint(model_path, scaler_path)
+    meta_path = os.path.join(directory, "meta.json")
+    stale = True
+    if os.path.exists(meta_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        stale = meta.get("model_fingerprint") != fingerprint or meta.get("format") != PACKED_FORMAT
+    if stale:
+        import joblib
+        arrays, meta = pack_forest(joblib.load(model_path), joblib.load(scaler_path))
+        save_packed_forest(arrays, meta, fingerprint, directory)
+    return PackedForest.load(directory, threads)
+
+
+def _median_us(predict, rows):
+    for row in rows[:5]:
+        predict(row)
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack the forest model and compare it with scikit-learn")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--output", default=None,
+                        help="Directory for the arrays (default: packed_forest/ next to the model)")
+    parser.add_argument("--data", default=DATA_PATH, help="CSV used to check predictions")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1, help="Threads for the threaded batch timing")
+    parser.add_argument("--single-rows", type=int, default=200, help="Rows timed one at a time")
+    parser.add_argument("--explain-rows", type=int, default=2000, help="Rows whose explanations are checked")
+    args = parser.parse_args(argv)
+    directory = args.output or packed_dir(args.model)
+
+    import joblib
+    import warnings
+    from compiled_model import compile_model, load_verification_rows
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    (model, scaler), load_time = _timed(lambda: (joblib.load(args.model), joblib.load(args.scaler)))
+
+    arrays, meta = pack_forest(model, scaler)
+    save_packed_forest(arrays, meta, file_fingerprint(args.model, args.scaler), directory)
+    packed = PackedForest.load(directory, threads=1)
+    _, packed_load_time = _timed(PackedForest.load, directory)
+    packed_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    compiled = compile_model(model, scaler)
+    compiled_bytes = sum(a.nbytes for a in compiled.arrays.values())
+    print(f"{meta['estimator']}: {meta['splits']} split nodes, {meta['leaf_values']} distinct leaf values")
+    print(f"Size:  pickle {os.path.getsize(args.model) / 1e6:8.1f} MB (load {load_time:.2f} s), "
+          f"compiled arrays {compiled_bytes / 1e6:8.1f} MB, "
+          f"packed {packed_bytes / 1e6:8.1f} MB (load {packed_load_time * 1000:.1f} ms)")
+
+    X = load_verification_rows(args.data)
+    expected, sklearn_time = _timed(lambda: model.predict_proba(scaler.transform(X)))
+    proba, packed_time = _timed(packed.predict_proba, X)
+    threaded = PackedForest.load(directory, threads=args.threads)
+    proba_threaded, threaded_time = _timed(threaded.predict_proba, X)
+    _, compiled_time = _timed(compiled.predict_proba, X)
+    print(f"Batch: {len(X)} rows, scikit-learn {sklearn_time:.2f} s, compiled {compiled_time:.2f} s, "
+          f"packed {packed_time:.2f} s, packed on {args.threads} threads {threaded_time:.2f} s")
+
+    rows = X[:args.single_rows]
+    sklearn_single = _median_us(lambda row: model.predict_proba(scaler.transform(row.reshape(1, -1)))[0, 1], rows)
+    compiled_single = _median_us(compiled.predict_one, rows)
+    packed_single = _median_us(packed.predict_one, rows)
+    print(f"Single row: scikit-learn {sklearn_single / 1000:.2f} ms, compiled {compiled_single / 1000:.2f} ms, "
+          f"packed {packed_single / 1000:.2f} ms")
+
+    expected_labels = model.predict(scaler.transform(X))
+    (positive, trees_per_row), exit_time = _timed(packed._decide, packed._prepare(X), None)
+    labels = packed.classes_[positive.astype(int)]
+    print(f"predict() with early exit: {exit_time:.2f} s (all trees {packed_time:.2f} s), "
+          f"{trees_per_row:.1f} of {packed._n_trees} trees per row")
+
+    exact = np.array_equal(proba, expected) and np.array_equal(proba_threaded, expected)
+    same_labels = np.array_equal(labels, expected_labels)
+    print(f"Checked {len(X)} rows against scikit-learn: "
+          f"{'bit-for-bit match' if exact else 'PROBABILITIES DIFFER'}, "
+          f"{'same classes' if same_labels else 'CLASSES DIFFER'}")
+
+    # Explanations against the compiled model's (float32 node values, so not bit for bit)
+    rows = X[:args.explain_rows]
+    scores, base_value, contributions = packed.explain(rows)
+    expected_scores, expected_base, expected_contributions = compiled.explain(rows)
+    explain_diff = max(float(np.abs(scores - expected_scores).max()), abs(base_value - expected_base),
+                       float(np.abs(contributions - expected_contributions).max()))
+    explained = explain_diff < EXPLAIN_TOLERANCE
+    print(f"Explanations of {len(rows)} rows against the compiled model: max difference {explain_diff:.2e} "
+          f"({'ok' if explained else 'EXPLANATIONS DIFFER'}); single row: compiled "
+          f"{_median_us(compiled.explain_one, rows[:args.single_rows]) / 1000:.2f} ms, "
+          f"packed {_median_us(packed.explain_one, rows[:args.single_rows]) / 1000:.2f} ms")
+    return 0 if exact and same_labels and explained else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Cardiovascular health report PDFs, filled into pre-rendered templates.
+
+Usage:
+    python Backend/pdf_report.py PATIENTS.csv REPORTS.zip [--processes N]
+
+Everything on a report except six lines (name, age, BMI, blood pressure,
+risk and generation time) depends only on the risk level and the model name.
+So each (risk level, model name) pair is laid out and serialized with FPDF
+once, uncompressed, with a fixed-width placeholder where each patient line
+goes. A report is then that template with the placeholders overwritten by
+the patient's values, padded to the same width. Every byte offset in the
+file stays valid, so no PDF code runs per report. Values too long for their
+slot are rendered from scratch instead.
+
+render_report() is memoized on the displayed values. render_reports()
+spreads many reports over a process pool for clinic batch runs.
+"""
+import argparse
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+from risk_levels import risk_level
+
+# Recommendations printed for each risk level (thresholds in risk_levels.py)
+RECOMMENDATIONS = {
+    "LOW": [
+        "Maintain active lifestyle",
+        "Follow balanced diet",
+        "Annual health screening recommended"
+    ],
+    "MODERATE": [
+        "Increase physical activity",
+        "Monitor blood pressure regularly",
+        "Adopt preventive lifestyle measures"
+    ],
+    "HIGH": [
+        "Consult a cardiologist",
+        "Monitor blood pressure regularly",
+        "Adopt heart-healthy lifestyle changes"
+    ],
+}
+
+DISCLAIMER = (
+    "Disclaimer: This report is generated using a machine learning model "
+    "and is intended for educational purposes only. It should not be used "
+    "as a substitute for professional medical advice."
+)
+
+# Patient lines and their widths in characters (the placeholder size)
+SLOTS = [
+    ("name", "Name: {}", 64),
+    ("age", "Age: {} years", 8),
+    ("bmi", "BMI: {}", 8),
+    ("blood_pressure", "Blood Pressure: {} mmHg", 16),
+    ("risk", "Predicted Cardiovascular Risk: {}%", 8),
+    ("generated_on", "Generated on: {}", 24),
+]
+
+DATE_FORMAT = "%d %b %Y, %I:%M %p"
+
+# Rendered reports kept in memory, keyed by their displayed values
+CACHE_SIZE = int(os.environ.get("CARDIO_REPORT_CACHE_SIZE", 256))
+
+
+def _layout(values, level, recommendations, model_name):
+    """Lay out one report; values maps slot name -> text"""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.set_compression(False)
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
+
+    # Title
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Cardiovascular Health Report", ln=True, align="C")
+    pdf.ln(5)
+
+    # Patient Summary
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Patient Summary", ln=True)
+
+    pdf.set_font("Arial", size=11)
+    pdf.cell(0, 8, values["name"], ln=True)
+    pdf.cell(0, 8, values["age"], ln=True)
+    pdf.cell(0, 8, values["bmi"], ln=True)
+    pdf.cell(0, 8, values["blood_pressure"], ln=True)
+    pdf.ln(4)
+
+    # Risk Section
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Risk Assessment", ln=True)
+
+    pdf.set_font("Arial", size=11)
+    pdf.cell(0, 8, values["risk"], ln=True)
+    pdf.cell(0, 8, f"Risk Category: {level}", ln=True)
+    pdf.ln(4)
+
+    # Recommendations
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Recommendations", ln=True)
+
+    pdf.set_font("Arial", size=11)
+    for r in recommendations:
+        pdf.cell(0, 8, f"- {r}", ln=True)
+    pdf.ln(6)
+
+    # Disclaimer
+    pdf.set_font("Arial", "I", 9)
+    pdf.multi_cell(0, 6, DISCLAIMER)
+
+    # Footer on the same page: model on the left, generation time on the right
+    pdf.set_auto_page_break(auto=False)
+    pdf.set_y(-15)
+    pdf.set_font("Arial", size=9)
+    pdf.set_x(10)
+    pdf.cell(0, 8, f"Model Used: {model_name}", align="L")
+    # Left-aligned from where a typical date ends at the right margin, so the
+    # text never moves when the template is filled in
+    width = pdf.get_string_width("Generated on: 28 Sep 2026, 10:45 PM")
+    pdf.set_x(pdf.w - pdf.r_margin - width)
+    pdf.cell(width, 8, values["generated_on"], align="L")
+    return pdf.output(dest="S").encode("latin-1")
+
+
+def _latin1(text):
+    """Text limited to what the core PDF fonts can print"""
+    return str(text).encode("latin-1", errors="replace").decode("latin-1")
+
+
+def _escape(text):
+    """Text as FPDF writes it inside a PDF string literal"""
+    return text.replace("\\", "\\\\").replace(")", "\\)").replace("(", "\\(").replace("\r", "\\r")
+
+
+@lru_cache(maxsize=32)
+def _template(level, model_name):
+    """Serialized report with placeholders; returns (bytes, slot positions, date position)"""
+    recommendations = RECOMMENDATIONS[level]
+    markers = {slot: fmt.format(f"@{i}".ljust(width, "#")) for i, (slot, fmt, width) in enumerate(SLOTS)}
+    document = _layout(markers, level, recommendations, model_name)
+    positions = []
+    for slot, fmt, width in SLOTS:
+        prefix, suffix = (_escape(part).encode("latin-1") for part in fmt.split("{}"))
+        start = document.index(_escape(markers[slot]).encode("latin-1")) + len(prefix)
+        positions.append((slot, start, width, suffix))
+    date_at = document.index(b"/CreationDate (D:") + len(b"/CreationDate (D:")
+    return document, positions, date_at
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _render(level, model_name, **values):
+    """One report from its template; values maps slot name -> displayed text"""
+    document, positions, date_at = _template(level, model_name)
+    out = bytearray(document)
+    for slot, start, width, suffix in positions:
+        text = _escape(values[slot]).encode("latin-1")
+        if len(text) > width:
+            # Too long for its placeholder: lay this report out from scratch
+            recommendations = RECOMMENDATIONS[level]
+            texts = {s: fmt.format(values[s]) for s, fmt, _ in SLOTS}
+            return _layout(texts, level, recommendations, model_name)
+        # The fixed text after the value (" years", "%") moves up behind it and
+        # the rest of the placeholder becomes trailing spaces, which print nothing
+        end = start + width + len(suffix)
+        out[start:end] = (text + suffix).ljust(end - start)
+    out[date_at:date_at + 14] = datetime.now().strftime("%Y%m%d%H%M%S").encode()
+    return bytes(out)
+
+
+def render_report(name, age, bmi, ap_hi, ap_lo, risk_percent, model_name, generated_at=None, level=None):
+    """PDF bytes for one patient report
+
+    level defaults to the risk level of risk_percent; callers that already
+    named the unrounded score pass theirs. Reports are memoized on the values
+    as printed (BMI to 2 decimals, risk to 1, time to the minute), so repeat
+    downloads cost nothing.
+    """
+    level = level or risk_level(risk_percent / 100)
+    generated_at = generated_at or datetime.now()
+    return _render(
+        level,
+        _latin1(model_name),
+        name=_latin1(name),
+        age=f"{age}",
+        bmi=f"{bmi:.2f}",
+        blood_pressure=f"{ap_hi}/{ap_lo}",
+        risk=f"{risk_percent:.1f}",
+        generated_on=generated_at.strftime(DATE_FORMAT),
+    )
+
+
+def _render_many(rows):
+    return [render_report(**row) for row in rows]
+
+
+def render_reports(rows, processes=None, chunk_size=64):
+    """PDF bytes for many reports (dicts of render_report arguments), in order
+
+    Work is split into chunks across a process pool; with processes=1 (or a
+    small batch) everything runs in this process.
+    """
+    rows = list(rows)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1 or len(rows) <= chunk_size:
+        return _render_many(rows)
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return [pdf for chunk in pool.map(_render_many, chunks) for pdf in chunk]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a patient CSV and write one PDF report per patient")
+    parser.add_argument("input", help="CSV shaped like cardio_train.csv or cleaned_cardio.csv")
+    parser.add_argument("output", help="Zip file to write the reports to")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+    from dataset import detect_separator
+    from model_registry import registry
+    from preprocessing import build_features, clean_data
+
+    entry = registry.get()
+    df = clean_data(pd.read_csv(args.input, sep=detect_separator(args.input)))
+    risk = entry.predictor.predict_proba(build_features(df))[:, 1] * 100
+    ids = df["id"].tolist() if "id" in df.columns else list(range(len(df)))
+    generated_at = datetime.now()
+    rows = [
+        {"name": f"Patient {pid}", "age": int(age), "bmi": float(bmi), "ap_hi": int(hi), "ap_lo": int(lo),
+         "risk_percent": float(r), "model_name": entry.name, "generated_at": generated_at}
+        for pid, age, bmi, hi, lo, r in zip(ids, df["age"], df["bmi"], df["ap_hi"], df["ap_lo"], risk)
+    ]
+
+    start = time.perf_counter()
+    reports = render_reports(rows, processes=args.processes)
+    elapsed = time.perf_counter() - start
+    with zipfile.ZipFile(args.output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for pid, pdf in zip(ids, reports):
+            archive.writestr(f"patient_{pid}.pdf", pdf)
+    print(f"Rendered {len(reports)} reports in {elapsed:.2f}s, written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Bounded LRU + TTL cache for prediction results.
+
+API inputs are small discrete values (whole-year ages, mmHg readings, 1-3
+categories, 0/1 flags), so the same feature vectors come up again and again.
+Entries are keyed by model version plus the canonical feature vector, so a new
+model never serves stale results; the cache is also cleared on model swap.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Maximum number of cached predictions (0 disables the cache)
+CACHE_SIZE = int(os.environ.get("CARDIO_CACHE_SIZE", 10000))
+
+# Seconds a cached prediction stays valid (0 means no expiry)
+CACHE_TTL = float(os.environ.get("CARDIO_CACHE_TTL", 3600))
+
+
+def cache_key(model_version, features):
+    """Canonical key: model version plus the feature vector as plain floats"""
+    return (model_version, tuple(float(v) for v in features))
+
+
+class PredictionCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, stored_at = item
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,193 @@
+"""Data cleaning and feature building shared by training, batch scoring and reports.
+
+Usage:
+    python Backend/preprocessing.py [cardio_train.csv] [--repeat 5]
+
+The rules are those of 2_preprocessing_EDA.ipynb, applied in one vectorized
+pass: every rule is evaluated on the raw columns into a single keep mask and
+each output column is copied exactly once, instead of the notebook's chain of
+filtered frame copies. Integer columns come out in narrow dtypes (int8 codes
+and flags, int16 age, height and blood pressure). clean_with_report() also
+counts the rows each rule dropped, in the notebook's order. The command line
+runs both versions on a CSV and compares their output, time and memory.
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Feature columns in the order the model was trained on (see feature_schema.py)
+from feature_schema import DATASET_GENDER_CODES, FEATURES
+
+# Raw dataset columns needed to build the features
+RAW_COLUMNS = ["age", "gender", "height", "weight", "ap_hi", "ap_lo",
+               "cholesterol", "gluc", "smoke", "alco", "active"]
+
+# Ages above this are taken to be in days (cardio_train.csv) rather than years
+MAX_AGE_YEARS = 150
+
+# Plausible ranges (inclusive); rows outside them are dropped
+AP_HI_RANGE = (80, 200)
+AP_LO_RANGE = (40, 120)
+BMI_RANGE = (15, 50)
+
+# Integer columns are stored in these dtypes when their values fit
+NARROW_DTYPES = {
+    "id": np.int32,
+    "age": np.int16,
+    "gender": np.int8,
+    "height": np.int16,
+    "ap_hi": np.int16,
+    "ap_lo": np.int16,
+    "cholesterol": np.int8,
+    "gluc": np.int8,
+    "smoke": np.int8,
+    "alco": np.int8,
+    "active": np.int8,
+    "cardio": np.int8,
+}
+
+
+def _narrow(values, dtype):
+    """values in dtype if they are integers that fit, otherwise unchanged"""
+    if values.dtype.kind not in "iu" or not len(values):
+        return values
+    info = np.iinfo(dtype)
+    if values.min() < info.min or values.max() > info.max:
+        return values
+    return values.astype(dtype)
+
+
+def clean_with_report(df):
+    """Apply the cleaning rules; returns (cleaned frame, report)
+
+    The report has the input and output row counts and, per rule, the rows
+    it dropped among those that survived the rules before it.
+    """
+    n = len(df)
+    if "id" in df.columns and df["id"].is_unique:
+        # Distinct ids rule out duplicate rows without hashing every column
+        keep = np.ones(n, dtype=bool)
+    else:
+        keep = ~df.duplicated().to_numpy()
+    dropped = {"duplicates": n - int(np.count_nonzero(keep))}
+
+    # Age in days -> whole years (already-cleaned files are left as they are)
+    age = df["age"].to_numpy()
+    age = np.where(age > MAX_AGE_YEARS, (age / 365).astype(int), age)
+    bmi = df["weight"].to_numpy() / ((df["height"].to_numpy() / 100) ** 2)
+    ap_hi = df["ap_hi"].to_numpy()
+    ap_lo = df["ap_lo"].to_numpy()
+
+    # Remove unrealistic blood pressure and BMI values
+    rules = [
+        ("ap_hi_range", (ap_hi >= AP_HI_RANGE[0]) & (ap_hi <= AP_HI_RANGE[1])),
+        ("ap_lo_range", (ap_lo >= AP_LO_RANGE[0]) & (ap_lo <= AP_LO_RANGE[1])),
+        ("ap_hi_above_ap_lo", ap_hi > ap_lo),
+        ("bmi_range", (bmi >= BMI_RANGE[0]) & (bmi <= BMI_RANGE[1])),
+    ]
+    for name, mask in rules:
+        dropped[name] = int(np.count_nonzero(keep & ~mask))
+        keep &= mask
+
+    rows = np.flatnonzero(keep)
+    computed = {"age": age, "bmi": bmi}
+    columns = {}
+    for name in list(df.columns) + (["bmi"] if "bmi" not in df.columns else []):
+        values = computed[name] if name in computed else df[name].to_numpy()
+        values = values[rows]
+        columns[name] = _narrow(values, NARROW_DTYPES[name]) if name in NARROW_DTYPES else values
+    cleaned = pd.DataFrame(columns, index=df.index[rows])
+    report = {"rows_in": n, "rows_out": len(rows), "dropped": dropped}
+    return cleaned, report
+
+
+def clean_data(df):
+    """Apply the cleaning rules from 2_preprocessing_EDA.ipynb"""
+    return clean_with_report(df)[0]
+
+
+def build_features(df):
+    """Build the model feature matrix from cleaned data (5_final_model_training.ipynb)"""
+    X = np.empty((len(df), len(FEATURES)), dtype=np.float64)
+    for j, name in enumerate(FEATURES):
+        if name == "gender":
+            # Gender: Female=0, Male=1 (other codes become NaN, as with .map)
+            gender = df["gender"].to_numpy()
+            X[:, j] = np.nan
+            for raw, code in DATASET_GENDER_CODES.items():
+                X[gender == raw, j] = code
+        else:
+            X[:, j] = df[name].to_numpy()
+    return X
+
+
+def notebook_preprocess(df):
+    """The notebooks' cleaning and feature steps as written, kept for comparison"""
+    df = df.drop_duplicates()
+    df['age'] = (df['age'] / 365).astype(int)
+    df['bmi'] = df['weight'] / ((df['height'] / 100) ** 2)
+    df = df[(df['ap_hi'] <= 200) & (df['ap_hi'] >= 80)]
+    df = df[(df['ap_lo'] <= 120) & (df['ap_lo'] >= 40)]
+    df = df[df['ap_hi'] > df['ap_lo']]
+    df = df[(df['bmi'] >= 15) & (df['bmi'] <= 50)]
+    categorical_cols = ['gender', 'cholesterol', 'gluc', 'smoke', 'alco', 'active']
+    df[categorical_cols] = df[categorical_cols].astype('category')
+
+    # 5_final_model_training.ipynb
+    df = df.copy()
+    df["gender"] = df["gender"].map({1: 0, 2: 1})
+    df["smoke"] = df["smoke"].map({0: 0, 1: 1})
+    df["alco"] = df["alco"].map({0: 0, 1: 1})
+    df["active"] = df["active"].map({0: 0, 1: 1})
+    return df, df[FEATURES].to_numpy(dtype=np.float64)
+
+
+def _measure(fn, raw, repeat):
+    """Best time and peak traced allocation of fn(raw.copy())"""
+    times = []
+    for _ in range(repeat):
+        df = raw.copy()
+        start = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - start)
+    df = raw.copy()
+    tracemalloc.start()
+    result = fn(df)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the fused preprocessing with the notebook steps")
+    parser.add_argument("csv", nargs="?", default="cardio_train.csv")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    from dataset import detect_separator
+    raw = pd.read_csv(args.csv, sep=detect_separator(args.csv))
+
+    def fused(df):
+        cleaned, report = clean_with_report(df)
+        return cleaned, build_features(cleaned), report
+
+    (cleaned, X, report), fused_time, fused_peak = _measure(fused, raw, args.repeat)
+    (_, X_notebook), notebook_time, notebook_peak = _measure(notebook_preprocess, raw, args.repeat)
+
+    print(f"{report['rows_in']} rows in, {report['rows_out']} kept")
+    for rule, count in report["dropped"].items():
+        print(f"  {rule:20s} dropped {count}")
+    print(f"fused:    {fused_time * 1000:7.1f} ms, peak allocations {fused_peak / 1e6:6.1f} MB, "
+          f"output {cleaned.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+    print(f"notebook: {notebook_time * 1000:7.1f} ms, peak allocations {notebook_peak / 1e6:6.1f} MB")
+    same = X.shape == X_notebook.shape and np.array_equal(X, X_notebook)
+    print(f"feature matrices identical: {same}")
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Risk levels, the one threshold table for naming a risk score.
+
+The API's risk_category, bulk_score.py's output column, the PDF reports and
+the Streamlit app all name scores from RISK_LEVELS, so a JSON response and
+the report attached to it always agree.
+"""
+import numpy as np
+
+# Upper bound of each level's risk scores (exclusive), its name on reports
+# and in the Streamlit app, and its API category
+RISK_LEVELS = [
+    (0.5, "LOW", "Low Risk"),
+    (0.7, "MODERATE", "Moderate Risk"),
+    (float("inf"), "HIGH", "High Risk"),
+]
+
+# Report level of each API category
+LEVEL_BY_CATEGORY = {category: level for _, level, category in RISK_LEVELS}
+
+_LIMITS = [limit for limit, _, _ in RISK_LEVELS[:-1]]
+_CATEGORIES = np.array([category for _, _, category in RISK_LEVELS])
+
+
+def _index(risk_score):
+    for i, limit in enumerate(_LIMITS):
+        if risk_score < limit:
+            return i
+    return len(_LIMITS)
+
+
+def risk_level(risk_score):
+    """Level name (LOW, MODERATE, HIGH) for a risk score between 0 and 1"""
+    return RISK_LEVELS[_index(risk_score)][1]
+
+
+def classify_risk(risk_score):
+    """API risk category for a risk score between 0 and 1"""
+    return RISK_LEVELS[_index(risk_score)][2]
+
+
+def classify_risks(risk_scores):
+    """classify_risk for an array of risk scores"""
+    return _CATEGORIES[np.searchsorted(_LIMITS, risk_scores, side="right")]
@@ -0,0 +1,357 @@
+"""Population risk distribution, for real percentiles in reports.
+
+Usage:
+    python Backend/risk_percentiles.py [--data cleaned_cardio.csv] [--output DIR]
+
+Scores every row of cleaned_cardio.csv once with the serving model and keeps
+the sorted scores, for the whole population and for each age band and
+gender, as distinct values with cumulative counts (the decision tree only
+produces a few dozen distinct scores, so this is far smaller than the scores
+themselves, and exact for any model). The arrays are .npy files memory-mapped
+at load time, so all worker processes share them read-only.
+
+A patient's percentile is the percentage of the reference group scoring
+below them, counting ties as half (the mid-rank), found with two binary
+searches. The index records the model version and content hash it was built
+from and is rebuilt automatically when a different model is loaded. The API
+does that in a background thread and reports go without percentiles until
+it is ready; a file lock makes one worker build while the others wait and
+map its index. A build that fails is not retried for that model for
+CARDIO_PERCENTILES_RETRY_INTERVAL seconds.
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not coordinated between processes
+    fcntl = None
+
+from compiled_model import save_arrays
+from dataset import DATA_PATH
+from feature_schema import BY_NAME, FEATURES
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+RISK_INDEX_DIR = os.path.join(BACKEND_DIR, "risk_index")
+
+# Seconds before a model whose distribution failed to build is tried again
+RETRY_INTERVAL = float(os.environ.get("CARDIO_PERCENTILES_RETRY_INTERVAL", 300))
+
+# Age bands start at these ages (years); the first band is everyone younger
+AGE_BAND_EDGES = [40, 50, 60]
+
+GENDER_GROUPS = {code: "women" if label == "Female" else "men"
+                 for label, code in BY_NAME["gender"].labels.items()}
+
+AGE = FEATURES.index("age")
+GENDER = FEATURES.index("gender")
+
+
+def age_band_name(band):
+    if band == 0:
+        return f"under {AGE_BAND_EDGES[0]}"
+    if band == len(AGE_BAND_EDGES):
+        return f"{AGE_BAND_EDGES[-1]} and over"
+    return f"aged {AGE_BAND_EDGES[band - 1]}-{AGE_BAND_EDGES[band] - 1}"
+
+
+def group_names():
+    """Group 0 is everyone; then one group per (age band, gender)"""
+    names = ["all patients"]
+    for band in range(len(AGE_BAND_EDGES) + 1):
+        for code in sorted(GENDER_GROUPS):
+            names.append(f"{GENDER_GROUPS[code]} {age_band_name(band)}")
+    return names
+
+
+def group_ids(ages, genders):
+    """Group of each (age, gender) pair (0, everyone, for unknown genders)"""
+    ages = np.asarray(ages, dtype=np.float64)
+    genders = np.asarray(genders, dtype=np.float64)
+    bands = np.searchsorted(AGE_BAND_EDGES, ages, side="right")
+    codes = sorted(GENDER_GROUPS)
+    slot = np.searchsorted(codes, genders)
+    known = np.isin(genders, codes)
+    return np.where(known, 1 + bands * len(codes) + np.minimum(slot, len(codes) - 1), 0)
+
+
+def build_distribution(scores, ages, genders):
+    """Distinct sorted scores and cumulative counts for every group, concatenated"""
+    scores = np.asarray(scores, dtype=np.float64)
+    groups = group_ids(ages, genders)
+    values, cumulative, offsets = [], [], [0]
+    for g in range(len(group_names())):
+        members = scores if g == 0 else scores[groups == g]
+        distinct, counts = np.unique(members, return_counts=True)
+        values.append(distinct)
+        cumulative.append(np.cumsum(counts))
+        offsets.append(offsets[-1] + len(distinct))
+    return {
+        "values": np.concatenate(values),
+        "cumulative": np.concatenate(cumulative).astype(np.int32),
+        "offsets": np.array(offsets, dtype=np.int64),
+    }
+
+
+def save_distribution(arrays, meta, directory=RISK_INDEX_DIR):
+    # Workers still mapping the old index keep reading intact (unlinked) files
+    save_arrays(arrays, meta, directory)
+
+
+class RiskDistribution:
+    """Percentile lookups against the saved population scores"""
+
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.arrays = arrays
+        # Plain ndarray views of the memory maps (np.memmap indexing goes through Python)
+        values = np.asarray(arrays["values"])
+        cumulative = np.asarray(arrays["cumulative"])
+        offsets = np.asarray(arrays["offsets"]).tolist()
+        self.names = meta["groups"]
+        self._groups = [(values[a:b], cumulative[a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+        self.sizes = [int(c[-1]) if len(c) else 0 for _, c in self._groups]
+
+    @classmethod
+    def load(cls, directory=RISK_INDEX_DIR):
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        # Memory-mapped: pages are shared between processes
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in ("values", "cumulative", "offsets")}
+        return cls(arrays, meta)
+
+    def group(self, age=None, gender=None):
+        """Group id for a patient (everyone if age or gender is unknown)"""
+        codes = sorted(GENDER_GROUPS)
+        if age is None or gender not in codes:
+            return 0
+        return 1 + bisect.bisect_right(AGE_BAND_EDGES, age) * len(codes) + codes.index(gender)
+
+    def percentile(self, score, age=None, gender=None):
+        """Percentage of the group scoring below score, ties counted as half (None if the group is empty)"""
+        g = self.group(age, gender)
+        values, cumulative = self._groups[g]
+        if not len(values):
+            return None
+        i = int(np.searchsorted(values, score, side="left"))
+        below = int(cumulative[i - 1]) if i else 0
+        equal = int(cumulative[i]) - below if i < len(values) and values[i] == score else 0
+        return 100.0 * (below + 0.5 * equal) / self.sizes[g]
+
+    def percentiles(self, scores, ages=None, genders=None):
+        """Vectorized percentile() for arrays of patients"""
+        scores = np.asarray(scores, dtype=np.float64)
+        groups = np.zeros(len(scores), dtype=np.int64) if ages is None else group_ids(ages, genders)
+        out = np.full(len(scores), np.nan)
+        for g in np.unique(groups):
+            values, cumulative = self._groups[g]
+            if not len(values):
+                continue
+            rows = groups == g
+            padded = np.concatenate([[0], cumulative])
+            below = padded[np.searchsorted(values, scores[rows], side="left")]
+            at_or_below = padded[np.searchsorted(values, scores[rows], side="right")]
+            out[rows] = 100.0 * (below + 0.5 * (at_or_below - below)) / self.sizes[g]
+        return out
+
+    def describe(self, score, age=None, gender=None):
+        """Percentiles for a report: within the patient's group and overall"""
+        g = self.group(age, gender)
+        overall = self.percentile(score)
+        if not self.sizes[g]:
+            g = 0
+        group_percentile = self.percentile(score, age, gender) if g else overall
+        return {
+            # None for an empty index
+            "percentile": None if group_percentile is None else round(group_percentile, 1),
+            "percentile_group": self.names[g],
+            "percentile_group_size": self.sizes[g],
+            "overall_percentile": None if overall is None else round(overall, 1),
+        }
+
+
+def score_population(predictor, data_path=DATA_PATH):
+    """Risk scores, ages and genders for every row of the reference dataset"""
+    from dataset import load_dataset
+    X = load_dataset(data_path).feature_matrix()
+    return predictor.predict_proba(X)[:, 1], X[:, AGE], X[:, GENDER]
+
+
+def build_index(entry, directory=RISK_INDEX_DIR, data_path=DATA_PATH):
+    """Score the reference population with a loaded model and save its distribution"""
+    start = time.perf_counter()
+    scores, ages, genders = score_population(entry.predictor, data_path)
+    arrays = build_distribution(scores, ages, genders)
+    meta = {
+        "model_name": entry.name,
+        "model_version": entry.version,
+        "content_hash": entry.content_hash,
+        "data": os.path.basename(data_path),
+        "rows": int(len(scores)),
+        "groups": group_names(),
+        "age_band_edges": AGE_BAND_EDGES,
+        "build_time_s": round(time.perf_counter() - start, 3),
+    }
+    try:
+        save_distribution(arrays, meta, directory)
+    except OSError:
+        # Read-only deployment: keep this process's copy in memory
+        return RiskDistribution(arrays, meta)
+    return RiskDistribution.load(directory)
+
+
+def _load_saved(entry, directory):
+    """The saved distribution if it was built from this model, else None"""
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("content_hash") == entry.content_hash and meta.get("model_version") == entry.version:
+        return RiskDistribution.load(directory)
+    return None
+
+
+@contextmanager
+def _build_lock(directory):
+    """Held while building, so only one process scores the population for a model"""
+    try:
+        f = open(f"{directory.rstrip(os.sep)}.lock", "a")
+    except OSError:
+        # Read-only deployment: every process builds its own copy in memory
+        yield
+        return
+    with f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def load_distribution(entry, directory=RISK_INDEX_DIR, data_path=DATA_PATH):
+    """Distribution for a loaded model (see model_registry.py), rebuilt if built from another one"""
+    distribution = _load_saved(entry, directory)
+    if distribution is not None:
+        return distribution
+    with _build_lock(directory):
+        # Another worker may have built it while this one waited
+        distribution = _load_saved(entry, directory)
+        if distribution is not None:
+            return distribution
+        return build_index(entry, directory, data_path)
+
+
+_lock = threading.Lock()
+_current = None
+# Guards _builds, separately so starting a build never waits on one running
+_builds_lock = threading.Lock()
+# Content hash -> time.monotonic() after which a failed build may be retried
+_failures = {}
+# Content hash -> background thread loading or building its distribution
+_builds = {}
+# Content hash -> error of a failed background build, not yet reported
+_errors = {}
+
+
+def _build_in_background(entry):
+    try:
+        get_distribution(entry, wait=True)
+    except Exception as e:
+        _errors[entry.content_hash] = e
+
+
+def _start_build(entry):
+    """Load or build the entry's distribution in a background thread, once at a time"""
+    with _builds_lock:
+        thread = _builds.get(entry.content_hash)
+        # Threads do not survive a fork, so a dead one is started again
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_build_in_background, args=(entry,), name="risk-percentiles",
+                                      daemon=True)
+            _builds[entry.content_hash] = thread
+            thread.start()
+    return thread
+
+
+def get_distribution(entry, wait=True):
+    """Process-wide distribution for the given model entry, loaded (or rebuilt) on first use
+
+    With wait=False the distribution is loaded in a background thread and
+    None returned until it is ready, so requests never wait on a build; an
+    error from that build is raised to the next caller. Returns None while a
+    failed build for this model waits out RETRY_INTERVAL; the failure itself
+    is raised to the caller that hit it.
+    """
+    global _current
+    current = _current
+    if current is not None and current.meta["content_hash"] == entry.content_hash:
+        return current
+    error = _errors.pop(entry.content_hash, None)
+    if error is not None:
+        raise error
+    if time.monotonic() < _failures.get(entry.content_hash, 0.0):
+        return None
+    if not wait:
+        _start_build(entry)
+        return None
+    with _lock:
+        if _current is None or _current.meta["content_hash"] != entry.content_hash:
+            if time.monotonic() < _failures.get(entry.content_hash, 0.0):
+                return None
+            try:
+                _current = load_distribution(entry)
+            except Exception:
+                _failures[entry.content_hash] = time.monotonic() + RETRY_INTERVAL
+                raise
+            _failures.pop(entry.content_hash, None)
+        return _current
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the population risk distribution for the serving model")
+    parser.add_argument("--data", default=DATA_PATH, help="Reference population CSV")
+    parser.add_argument("--output", default=RISK_INDEX_DIR)
+    args = parser.parse_args(argv)
+
+    from model_registry import registry
+    entry = registry.get()
+    distribution = build_index(entry, args.output, args.data)
+    size = sum(a.nbytes for a in distribution.arrays.values())
+    print(f"{entry.name} ({entry.version}): {distribution.meta['rows']} patients scored in "
+          f"{distribution.meta['build_time_s']:.2f} s, {len(distribution.arrays['values'])} distinct scores, "
+          f"{size} bytes")
+    for name, n in zip(distribution.names, distribution.sizes):
+        print(f"  {name:24s} {n:6d} patients")
+
+    # Check against a direct count and time single lookups
+    scores, ages, genders = score_population(entry.predictor, args.data)
+    rows = np.random.default_rng(0).choice(len(scores), size=min(2000, len(scores)), replace=False)
+    groups = group_ids(ages, genders)
+    expected = []
+    for i in rows:
+        group = scores[groups == groups[i]]
+        expected.append(100.0 * (np.sum(group < scores[i]) + 0.5 * np.sum(group == scores[i])) / len(group))
+    expected = np.array(expected)
+    single = np.array([distribution.percentile(scores[i], ages[i], genders[i]) for i in rows])
+    batch = distribution.percentiles(scores[rows], ages[rows], genders[rows])
+    exact = np.allclose(single, expected, rtol=0, atol=1e-9) and np.allclose(batch, expected, rtol=0, atol=1e-9)
+    timings = []
+    for i in rows:
+        t0 = time.perf_counter()
+        distribution.percentile(scores[i], ages[i], genders[i])
+        timings.append(time.perf_counter() - t0)
+    print(f"Single lookup: median {np.median(timings) * 1e6:.1f} us; "
+          f"{len(rows)} lookups checked against a direct count: {'match' if exact else 'MISMATCH'}")
+    return 0 if exact else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Production entry point: the Flask API under a multi-worker gunicorn server.
+
+Usage:
+    python Backend/serve.py [--workers N] [--threads N] [--bind HOST:PORT]
+
+The model is loaded in the master process before the workers are forked, so
+every worker shares the same model pages copy-on-write instead of loading its
+own copy. Settings can also come from the environment (CARDIO_WORKERS,
+CARDIO_THREADS, CARDIO_BIND, CARDIO_TIMEOUT, CARDIO_GRACEFUL_TIMEOUT).
+Latency histograms are shared through CARDIO_METRICS_DIR (a temporary
+directory by default) so /metrics covers all workers.
+
+Micro-batching (CARDIO_MICRO_BATCH=1) can only coalesce requests a worker has
+in flight at the same time, so with it enabled workers default to
+BATCHING_THREADS request threads (gthread workers) instead of one.
+
+On SIGTERM gunicorn stops accepting connections and gives in-flight requests
+up to the graceful timeout to finish. Load balancers should probe /api/ready,
+which only reports ready once a real model is loaded in the worker.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+from micro_batcher import MICRO_BATCH_ENABLED
+
+DEFAULT_BIND = os.environ.get("CARDIO_BIND", f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Request threads per worker when micro-batching is enabled
+BATCHING_THREADS = 8
+
+
+def default_workers():
+    return int(os.environ.get("CARDIO_WORKERS", multiprocessing.cpu_count()))
+
+
+def default_threads():
+    if "CARDIO_THREADS" in os.environ:
+        return int(os.environ["CARDIO_THREADS"])
+    return BATCHING_THREADS if MICRO_BATCH_ENABLED else 1
+
+
+class CardioServer(BaseApplication):
+    """Runs a preloaded WSGI app with the given gunicorn settings"""
+
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s started with the preloaded model", worker.pid)
+
+
+def worker_int(worker):
+    worker.log.info("Worker %s interrupted, finishing in-flight requests", worker.pid)
+
+
+def on_exit(server):
+    if os.environ.get("CARDIO_METRICS_DIR_OWNED") == "1":
+        shutil.rmtree(os.environ["CARDIO_METRICS_DIR"], ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the CardioML API with gunicorn")
+    parser.add_argument("--bind", default=DEFAULT_BIND, help=f"Address to listen on (default: {DEFAULT_BIND})")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="Worker processes (default: one per CPU core)")
+    parser.add_argument("--threads", type=int, default=default_threads(),
+                        help=f"Threads per worker (default: 1, or {BATCHING_THREADS} with CARDIO_MICRO_BATCH=1)")
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("CARDIO_TIMEOUT", 30)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("CARDIO_GRACEFUL_TIMEOUT", 30)),
+                        help="Seconds in-flight requests get to finish on shutdown")
+    args = parser.parse_args(argv)
+    if MICRO_BATCH_ENABLED and args.threads < 2:
+        print("Warning: micro-batching needs --threads > 1; with one thread per worker nothing is coalesced",
+              file=sys.stderr)
+
+    # Workers write latency histograms here so /metrics can sum them
+    if not os.environ.get("CARDIO_METRICS_DIR"):
+        os.environ["CARDIO_METRICS_DIR"] = tempfile.mkdtemp(prefix="cardio-metrics-")
+        os.environ["CARDIO_METRICS_DIR_OWNED"] = "1"
+
+    # Import the app and load the model before forking
+    from main import app, load_population, registry
+    entry = registry.get()
+    print(f"Preloaded {entry.name} ({entry.version}) in {entry.load_time_ms:.1f} ms")
+    # Build (or map) the population percentiles once, so workers share them
+    load_population(entry, wait=True)
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread" if args.threads > 1 else "sync",
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "preload_app": True,
+        "accesslog": "-",
+        "post_fork": post_fork,
+        "worker_int": worker_int,
+        "on_exit": on_exit,
+    }
+    CardioServer(app, options).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
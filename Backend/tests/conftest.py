@@ -0,0 +1,98 @@
+import os
+import sys
+import warnings
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Rows of cleaned_cardio.csv the small test models are trained on
+TRAIN_ROWS = 3000
+
+PATIENT = {
+    "age": 55, "gender": 1, "bmi": 27.4, "cholesterol": 2, "gluc": 1, "systolic_bp": 145,
+    "diastolic_bp": 90, "smoking_status": 0, "alcohol_intake": 0, "physical_activity": 1,
+}
+
+PATIENTS = [
+    PATIENT,
+    dict(PATIENT, age=42, systolic_bp=118, diastolic_bp=76, cholesterol=1),
+    dict(PATIENT, age=63, gender=0, bmi=33.1, gluc=3, smoking_status=1),
+]
+
+
+@pytest.fixture(scope="session")
+def training_rows():
+    from dataset import load_dataset
+    dataset = load_dataset()
+    return dataset.feature_matrix(0, TRAIN_ROWS), dataset.labels[:TRAIN_ROWS]
+
+
+@pytest.fixture(scope="session")
+def tree_dir(tmp_path_factory, training_rows):
+    """Artifacts of a small decision tree, written like train.py writes them"""
+    from sklearn.tree import DecisionTreeClassifier
+    return write_artifacts(tmp_path_factory.mktemp("tree"), DecisionTreeClassifier(max_depth=5, random_state=0),
+                           training_rows)
+
+
+def write_artifacts(directory, model, training_rows):
+    """Fit model on the training rows and write it like train.py does"""
+    from sklearn.preprocessing import StandardScaler
+    from train import save_artifacts
+
+    X, y = training_rows
+    scaler = StandardScaler().fit(X)
+    model.fit(scaler.transform(X), y)
+    name = type(model).__name__
+    save_artifacts(model, scaler, {"models": {name: 0.7}, "best_model": name, "trained_at": "2026-01-01T00:00:00"},
+                   str(directory))
+    return directory
+
+
+@pytest.fixture
+def make_registry():
+    """ModelRegistry over the artifacts in a directory, in a given serving mode"""
+    from model_registry import ModelRegistry
+
+    def make(directory, serving_mode="compiled"):
+        return ModelRegistry(
+            compiled_path=os.path.join(directory, "cardio_model.npz"),
+            model_path=os.path.join(directory, "cardio_model.pkl"),
+            scaler_path=os.path.join(directory, "scaler.pkl"),
+            report_path=os.path.join(directory, "model_report.json"),
+            reload_interval=0,
+            serving_mode=serving_mode,
+        )
+    return make
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Flask test client of main.py serving from the given registry"""
+    import main
+
+    def client(registry):
+        monkeypatch.setattr(main, "registry", registry)
+        # Percentiles would score the whole reference dataset; not under test here
+        monkeypatch.setattr(main, "load_population", lambda entry: None)
+        monkeypatch.setattr(main, "micro_batcher", None)
+        main.prediction_cache.clear()
+        return main.app.test_client()
+    return client
+
+
+def spy(monkeypatch, cls, names):
+    """Record calls to the named methods of cls; returns the list of names called"""
+    calls = []
+    for name in names:
+        original = getattr(cls, name)
+
+        def wrapper(self, *args, _name=name, _original=original, **kwargs):
+            calls.append(_name)
+            return _original(self, *args, **kwargs)
+        monkeypatch.setattr(cls, name, wrapper)
+    return calls
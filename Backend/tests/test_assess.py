@@ -0,0 +1,56 @@
+import io
+import json
+import zipfile
+
+from conftest import PATIENT, PATIENTS
+
+INVALID = dict(PATIENT, systolic_bp="high")
+BATCH = [dict(PATIENTS[0], name="Ann Lee"), INVALID, dict(PATIENTS[1], name="Bo/Chen"), PATIENTS[2]]
+
+
+def test_json_batch_lists_failed_records(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    single = client.post("/api/assess", json=BATCH[0]).get_json()
+
+    body = client.post("/api/assess", json=BATCH).get_json()
+    assert (body["total"], body["assessed"], body["failed"]) == (4, 3, 1)
+    assert [result["index"] for result in body["results"]] == [0, 2, 3]
+    assert body["results"][0]["risk_score"] == single["risk_score"]
+    assert body["results"][0]["report"]["patient_summary"] == single["report"]["patient_summary"]
+    assert body["errors"][0]["index"] == 1
+    assert "systolic_bp" in str(body["errors"][0]["errors"])
+
+
+def test_ndjson_output_has_one_line_per_record(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    response = client.post("/api/assess?format=ndjson", json=BATCH)
+    assert response.mimetype == "application/x-ndjson"
+    assert response.headers["X-Model-Version"]
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2, 3]
+    assert "errors" in lines[1] and "risk_score" not in lines[1]
+    assert all("risk_score" in line for i, line in enumerate(lines) if i != 1)
+
+    # Asked for with the Accept header instead
+    response = client.post("/api/assess", json=BATCH, headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+
+
+def test_pdf_output_is_a_zip_of_one_report_per_record(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    response = client.post("/api/assess?format=pdf", json=BATCH)
+    assert response.mimetype == "application/zip"
+    assert "cardio_reports.zip" in response.headers["Content-Disposition"]
+
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names == ["00001_Ann_Lee.pdf", "00003_Bo_Chen.pdf", "00004_patient.pdf", "errors.json"]
+        for name in names[:-1]:
+            assert archive.read(name).startswith(b"%PDF")
+        assert [error["index"] for error in json.loads(archive.read("errors.json"))] == [1]
+
+
+def test_unknown_format_is_rejected(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    assert client.post("/api/assess?format=xml", json=BATCH).status_code == 400
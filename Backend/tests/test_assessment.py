@@ -0,0 +1,46 @@
+import pytest
+
+from conftest import PATIENT
+
+
+@pytest.fixture
+def client(tree_dir, make_registry, api, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "assessment_static", (None, None))
+    monkeypatch.setattr(main, "assessment_body", (None, 0.0, None, None, None))
+    clock = [1000.0]
+    monkeypatch.setattr(main.time, "monotonic", lambda: clock[0])
+    client = api(make_registry(str(tree_dir)))
+    client.clock = clock
+    return client
+
+
+def test_revalidation_within_the_ttl_is_a_304(client):
+    first = client.get("/api/assessment")
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "no-cache"
+    etag = first.headers["ETag"]
+
+    again = client.get("/api/assessment", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert client.get("/api/assessment", headers={"If-None-Match": '"something-else"'}).status_code == 200
+
+
+def test_revalidation_after_the_ttl_gets_the_new_metrics(client):
+    import main
+
+    first = client.get("/api/assessment")
+    predictions = first.get_json()["model_metrics"]["inference_speed"]["total_predictions"]
+    assert client.post("/api/predict", json=PATIENT).status_code == 200
+
+    # Still the cached snapshot until the metrics are refreshed
+    assert client.get("/api/assessment", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    client.clock[0] += main.ASSESSMENT_METRICS_TTL
+    refreshed = client.get("/api/assessment", headers={"If-None-Match": first.headers["ETag"]})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != first.headers["ETag"]
+    assert refreshed.get_json()["model_metrics"]["inference_speed"]["total_predictions"] == predictions + 1
+    assert refreshed.get_json()["model_name"] == first.get_json()["model_name"]
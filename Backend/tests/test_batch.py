@@ -0,0 +1,45 @@
+import json
+
+from conftest import PATIENT, PATIENTS
+
+INVALID = dict(PATIENT, cholesterol=7)
+
+
+def test_batch_scores_the_valid_records_and_lists_the_rest(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    singles = [client.post("/api/predict", json=patient).get_json()["risk_score"] for patient in PATIENTS]
+
+    response = client.post("/api/predict/batch", json=[PATIENTS[0], INVALID, PATIENTS[1], PATIENTS[2]])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["total"], body["scored"], body["failed"]) == (4, 3, 1)
+    assert [result["index"] for result in body["results"]] == [0, 2, 3]
+    assert [result["risk_score"] for result in body["results"]] == singles
+    assert all("feature_impacts" in result for result in body["results"])
+    assert body["errors"][0]["index"] == 1
+    assert "cholesterol" in str(body["errors"][0]["errors"])
+
+    # {"records": [...]} is the same batch; ?explain=0 leaves out the impacts
+    body = client.post("/api/predict/batch?explain=0", json={"records": [PATIENTS[0], INVALID]}).get_json()
+    assert (body["scored"], body["failed"]) == (1, 1)
+    assert "feature_impacts" not in body["results"][0]
+
+
+def test_ndjson_batch_reports_bad_lines_by_index(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    lines = [json.dumps(PATIENTS[0]), "{not json", json.dumps(INVALID), "", json.dumps(PATIENTS[1])]
+
+    response = client.post("/api/predict/batch", data="\n".join(lines) + "\n", content_type="application/x-ndjson")
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["total"], body["scored"], body["failed"]) == (4, 2, 2)
+    assert [result["index"] for result in body["results"]] == [0, 3]
+    errors = {error["index"]: error["errors"] for error in body["errors"]}
+    assert sorted(errors) == [1, 2]
+    assert errors[1][0].startswith("Invalid JSON")
+
+
+def test_batch_rejects_a_body_that_is_not_a_list(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+    response = client.post("/api/predict/batch", json=PATIENT)
+    assert response.status_code == 400
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from conftest import TRAIN_ROWS
+
+
+def test_both_separators_clean_the_same(tmp_path):
+    from dataset import DATA_PATH, detect_separator, read_clean
+
+    rows = pd.read_csv(DATA_PATH, nrows=TRAIN_ROWS)
+    rows.to_csv(tmp_path / "comma.csv", index=False)
+    rows.to_csv(tmp_path / "semicolon.csv", index=False, sep=";")
+    assert detect_separator(tmp_path / "comma.csv") == ","
+    assert detect_separator(tmp_path / "semicolon.csv") == ";"
+
+    comma, _ = read_clean(tmp_path / "comma.csv")
+    semicolon, _ = read_clean(tmp_path / "semicolon.csv")
+    pd.testing.assert_frame_equal(comma, semicolon)
+
+
+def test_appended_rows_survive_a_rebuild(tmp_path):
+    from dataset import DATA_PATH, append_dataset, load_dataset
+
+    rows = pd.read_csv(DATA_PATH, nrows=TRAIN_ROWS + 200)
+    data_path, records_path = str(tmp_path / "data.csv"), str(tmp_path / "records.csv")
+    rows[:TRAIN_ROWS].to_csv(data_path, index=False)
+    rows[TRAIN_ROWS:].to_csv(records_path, index=False)
+    cache_dir = str(tmp_path / "cache")
+
+    dataset = load_dataset(data_path, cache_dir)
+    before = dataset.feature_matrix().copy()
+    appended, count = append_dataset(dataset, records_path)
+    assert count == 200 and len(appended) == len(dataset) + 200
+    # Columns are replaced, not rewritten: the old mapping still reads the old rows
+    assert np.array_equal(dataset.feature_matrix(), before)
+    assert np.array_equal(appended.feature_matrix(0, len(dataset)), before)
+
+    # Replayed from the append log into a rebuilt cache and into a new one
+    rebuilt = load_dataset(data_path, cache_dir, rebuild=True)
+    fresh = load_dataset(data_path, str(tmp_path / "other"))
+    for rebuilt in (rebuilt, fresh):
+        assert np.array_equal(rebuilt.feature_matrix(), appended.feature_matrix())
+        assert np.array_equal(rebuilt["id"], appended["id"])
+    assert append_dataset(load_dataset(data_path, cache_dir), records_path)[1] == 0
@@ -0,0 +1,48 @@
+import json
+
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+
+from conftest import TRAIN_ROWS, write_artifacts
+
+NEW_ROWS = 300
+
+
+def read_report(model_dir):
+    with open(model_dir / "model_report.json", "r") as f:
+        return json.load(f)
+
+
+def test_dry_run_leaves_the_records_for_the_real_run(tmp_path, training_rows):
+    from dataset import DATA_PATH, load_dataset
+    from incremental import main
+
+    rows = pd.read_csv(DATA_PATH, nrows=TRAIN_ROWS + NEW_ROWS)
+    data_path, records_path = tmp_path / "data.csv", tmp_path / "records.csv"
+    rows[:TRAIN_ROWS].to_csv(data_path, index=False)
+    rows[TRAIN_ROWS:].to_csv(records_path, index=False)
+    cache_dir = tmp_path / "cache"
+    model_dir = tmp_path / "model"
+    model_dir.mkdir()
+    write_artifacts(model_dir, DecisionTreeClassifier(max_depth=4, random_state=0), training_rows)
+    args = [str(records_path), "--data", str(data_path), "--cache-dir", str(cache_dir),
+            "--model-dir", str(model_dir)]
+    rows_before = len(load_dataset(str(data_path), str(cache_dir)))
+    report_before = read_report(model_dir)
+
+    assert main(args + ["--no-save"]) == 0
+    assert len(load_dataset(str(data_path), str(cache_dir))) == rows_before
+    assert read_report(model_dir) == report_before
+
+    assert main(args) == 0
+    dataset = load_dataset(str(data_path), str(cache_dir))
+    report = read_report(model_dir)
+    assert len(dataset) == rows_before + NEW_ROWS
+    assert report["version"] == f"{report_before['trained_at']}+u1"
+    assert report["updates"][-1]["rows"] == NEW_ROWS
+    assert report["updates"][-1]["dataset_rows"] == len(dataset)
+
+    # The same records are not applied twice
+    assert main(args) == 0
+    assert len(load_dataset(str(data_path), str(cache_dir))) == rows_before + NEW_ROWS
+    assert read_report(model_dir)["version"] == report["version"]
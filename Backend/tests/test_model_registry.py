@@ -0,0 +1,53 @@
+import os
+import shutil
+
+from conftest import PATIENT
+
+
+def test_no_model_on_disk_falls_back_to_mock_predictions(tmp_path, make_registry, api):
+    client = api(make_registry(str(tmp_path)))
+    response = client.post("/api/predict", json=PATIENT)
+    assert response.status_code == 200
+    assert response.get_json()["model_version"] == "mock"
+    assert client.get("/api/ready").get_json() == {"ready": False, "reason": "Model not loaded"}
+
+
+def test_a_model_that_cannot_be_loaded_is_a_503(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir), serving_mode="lokup"))
+    for response in (client.post("/api/predict", json=PATIENT),
+                     client.post("/api/predict/batch", json=[PATIENT]),
+                     client.post("/api/assess", json=PATIENT)):
+        assert response.status_code == 503
+        assert "Unknown serving mode 'lokup'" in response.get_json()["error"]
+    ready = client.get("/api/ready")
+    assert ready.status_code == 503
+    assert "Unknown serving mode 'lokup'" in ready.get_json()["reason"]
+    assert client.get("/api/health").get_json()["model_loaded"] is False
+
+
+def test_a_file_removed_while_checking_is_part_of_the_signature(tmp_path, tree_dir, make_registry, monkeypatch):
+    import model_registry
+
+    directory = str(tmp_path / "model")
+    shutil.copytree(tree_dir, directory)
+    registry = make_registry(directory)
+    entry = registry.get()
+    report_path = os.path.join(directory, "model_report.json")
+
+    # The report is removed by an update just as it is checked
+    real_stat = os.stat
+    removed = []
+
+    def stat(path, *args, **kwargs):
+        if path == report_path and not removed:
+            removed.append(path)
+            os.remove(path)
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(model_registry.os, "stat", stat)
+
+    signature = registry._file_signature()
+    assert (report_path, None, None) in signature
+    assert signature != registry._signature
+    # The model already loaded keeps serving
+    registry.reload_interval = 1e-9
+    assert registry.get() is entry
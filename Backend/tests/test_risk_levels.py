@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from conftest import PATIENT
+
+
+def test_scalar_and_array_classification_agree():
+    from risk_levels import LEVEL_BY_CATEGORY, classify_risk, classify_risks, risk_level
+
+    scores = np.array([0.0, 0.3, 0.4, 0.4999, 0.5, 0.6, 0.6999, 0.7, 0.95, 1.0])
+    categories = [classify_risk(score) for score in scores]
+    assert classify_risks(scores).tolist() == categories
+    assert [LEVEL_BY_CATEGORY[category] for category in categories] == [risk_level(score) for score in scores]
+    assert categories[2:5] == ["Low Risk", "Low Risk", "Moderate Risk"]
+
+
+@pytest.mark.parametrize("risk_score, level", [(0.4, "LOW"), (0.4996, "LOW"), (0.55, "MODERATE"), (0.8, "HIGH")])
+def test_pdf_report_matches_the_json_category(risk_score, level, monkeypatch):
+    import main
+    from risk_levels import classify_risk
+
+    pytest.importorskip("fpdf")
+    values = {"age": 55, "bmi": 27.4, "ap_hi": 145, "ap_lo": 90}
+    # The JSON carries the score rounded to 3 places; the category comes from the full score
+    assessment = {"risk_score": round(risk_score, 3), "risk_category": classify_risk(risk_score),
+                  "report": {"generated_at": "2026-01-01T00:00:00"}}
+    monkeypatch.setattr(main, "model_info", lambda entry: {"model_name": "Test"})
+    pdf = main.report_pdf(values, assessment, PATIENT.get("name"), None)
+    assert f"Risk Category: {level})".encode() in pdf
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import pytest
+
+
+class Entry:
+    """Stands in for model_registry.LoadedModel"""
+
+    def __init__(self, content_hash):
+        self.content_hash = content_hash
+        self.version = f"sha-{content_hash}"
+        self.name = "Test"
+
+
+@pytest.fixture
+def percentiles(monkeypatch):
+    import risk_percentiles
+    monkeypatch.setattr(risk_percentiles, "_current", None)
+    monkeypatch.setattr(risk_percentiles, "_failures", {})
+    monkeypatch.setattr(risk_percentiles, "_builds", {})
+    monkeypatch.setattr(risk_percentiles, "_errors", {})
+    return risk_percentiles
+
+
+def test_a_failed_build_is_not_retried_until_the_interval_passes(percentiles, monkeypatch):
+    calls = []
+
+    def load_distribution(entry):
+        calls.append(entry.content_hash)
+        raise OSError("read-only file system")
+    monkeypatch.setattr(percentiles, "load_distribution", load_distribution)
+    clock = [1000.0]
+    monkeypatch.setattr(percentiles.time, "monotonic", lambda: clock[0])
+
+    with pytest.raises(OSError):
+        percentiles.get_distribution(Entry("a"))
+    for _ in range(50):
+        assert percentiles.get_distribution(Entry("a")) is None
+    assert calls == ["a"]
+
+    # Another model is tried at once; the first one again after the interval
+    with pytest.raises(OSError):
+        percentiles.get_distribution(Entry("b"))
+    clock[0] += percentiles.RETRY_INTERVAL + 1
+    with pytest.raises(OSError):
+        percentiles.get_distribution(Entry("a"))
+    assert calls == ["a", "b", "a"]
+
+
+def test_requests_do_not_wait_for_a_build(percentiles, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def load_distribution(entry):
+        calls.append(entry.content_hash)
+        started.set()
+        release.wait(10)
+        return percentiles.RiskDistribution(percentiles.build_distribution([0.2, 0.6], [50, 50], [0, 0]),
+                                            {"groups": percentiles.group_names(), "content_hash": entry.content_hash})
+    monkeypatch.setattr(percentiles, "load_distribution", load_distribution)
+
+    assert percentiles.get_distribution(Entry("a"), wait=False) is None
+    assert started.wait(10)
+    # Still building: more requests neither block nor start another build
+    for _ in range(20):
+        assert percentiles.get_distribution(Entry("a"), wait=False) is None
+    release.set()
+    percentiles._builds["a"].join(10)
+    assert percentiles.get_distribution(Entry("a"), wait=False).describe(0.4, 50, 0)["percentile"] == 50.0
+    assert calls == ["a"]
+
+
+def test_a_failed_background_build_is_raised_once(percentiles, monkeypatch):
+    def load_distribution(entry):
+        raise ValueError("no reference data")
+    monkeypatch.setattr(percentiles, "load_distribution", load_distribution)
+
+    assert percentiles.get_distribution(Entry("a"), wait=False) is None
+    percentiles._builds["a"].join(10)
+    with pytest.raises(ValueError):
+        percentiles.get_distribution(Entry("a"), wait=False)
+    assert percentiles.get_distribution(Entry("a"), wait=False) is None
+    assert not percentiles._builds["a"].is_alive()
+
+
+def test_concurrent_builds_score_the_population_once(percentiles, tmp_path, monkeypatch):
+    built = []
+
+    def build_index(entry, directory, data_path):
+        built.append(entry.content_hash)
+        time.sleep(0.2)
+        percentiles.save_distribution(percentiles.build_distribution([0.2, 0.6], [50, 50], [0, 0]),
+                                      {"groups": percentiles.group_names(), "content_hash": entry.content_hash,
+                                       "model_version": entry.version}, directory)
+        return percentiles.RiskDistribution.load(directory)
+    monkeypatch.setattr(percentiles, "build_index", build_index)
+
+    # Each thread opens the lock file itself, like separate worker processes
+    directory = str(tmp_path / "risk_index")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(percentiles.load_distribution(Entry("a"), directory)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert built == ["a"]
+    assert [r.meta["content_hash"] for r in results] == ["a"] * 4
+
+
+def test_describe_an_empty_index(percentiles):
+    distribution = percentiles.RiskDistribution(percentiles.build_distribution([], [], []),
+                                                {"groups": percentiles.group_names()})
+    described = distribution.describe(0.4, 55, 1)
+    assert described["percentile"] is None
+    assert described["overall_percentile"] is None
+    assert described["percentile_group_size"] == 0
+
+
+def test_loading_a_model_starts_no_threads(tmp_path, training_rows, make_registry):
+    from sklearn.tree import DecisionTreeClassifier
+    from conftest import write_artifacts
+    import main  # noqa: F401 (registers its listeners on the shared registry)
+    from model_registry import registry
+
+    write_artifacts(tmp_path, DecisionTreeClassifier(max_depth=3, random_state=0), training_rows)
+    loaded = make_registry(str(tmp_path))
+    loaded._listeners = list(registry._listeners)
+    before = threading.active_count()
+    loaded.get()
+    # Nothing runs in the background of a process that is about to fork (serve.py)
+    assert threading.active_count() == before
@@ -0,0 +1,122 @@
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from conftest import PATIENT, PATIENTS, spy, write_artifacts
+
+SCORING_METHODS = ["predict_one", "predict_proba", "explain", "explain_one"]
+
+
+@pytest.fixture(scope="module")
+def forest_dir(tmp_path_factory, training_rows):
+    return write_artifacts(tmp_path_factory.mktemp("forest"),
+                           RandomForestClassifier(n_estimators=20, max_depth=8, random_state=0), training_rows)
+
+
+def call_endpoints(client):
+    """Every endpoint that scores patients; returns the scores and impacts each one reported"""
+    responses = {
+        "predict": client.post("/api/predict", json=PATIENT),
+        "predict_batch": client.post("/api/predict/batch", json=PATIENTS),
+        "report": client.post("/api/report", json=PATIENT),
+        "assess": client.post("/api/assess", json=PATIENT),
+        "assess_batch": client.post("/api/assess", json=PATIENTS),
+    }
+    for name, response in responses.items():
+        assert response.status_code == 200, (name, response.get_json())
+    out = {name: response.get_json() for name, response in responses.items()}
+    return {
+        "predict": (out["predict"]["risk_score"], out["predict"]["feature_impacts"]),
+        "predict_batch": [(r["risk_score"], r["feature_impacts"]) for r in out["predict_batch"]["results"]],
+        "report": out["report"]["risk_assessment"]["score"],
+        "assess": (out["assess"]["risk_score"], out["assess"]["feature_impacts"]),
+        "assess_batch": [(r["risk_score"], r["feature_impacts"]) for r in out["assess_batch"]["results"]],
+    }
+
+
+def test_lookup_mode_scores_from_the_table(tree_dir, make_registry, api, monkeypatch):
+    from compiled_model import CompiledModel
+    from lookup_table import LookupModel
+
+    expected = call_endpoints(api(make_registry(str(tree_dir), "compiled")))
+
+    registry = make_registry(str(tree_dir), "lookup")
+    assert isinstance(registry.get().predictor, LookupModel)
+    lookup_calls = spy(monkeypatch, LookupModel, SCORING_METHODS)
+    compiled_calls = spy(monkeypatch, CompiledModel, SCORING_METHODS)
+    client = api(registry)
+
+    assert call_endpoints(client) == expected
+    # Every endpoint went through the table, never the compiled tree it wraps
+    assert lookup_calls
+    assert not compiled_calls
+
+
+def test_each_endpoint_calls_the_lookup_predictor(tree_dir, make_registry, api, monkeypatch):
+    from lookup_table import LookupModel
+
+    client = api(make_registry(str(tree_dir), "lookup"))
+    calls = spy(monkeypatch, LookupModel, SCORING_METHODS)
+    requests = [
+        ("/api/predict", PATIENT),
+        ("/api/predict/batch", PATIENTS),
+        ("/api/report", dict(PATIENT, age=48)),
+        ("/api/assess", dict(PATIENT, age=61)),
+        ("/api/assess", PATIENTS),
+    ]
+    for path, payload in requests:
+        del calls[:]
+        assert client.post(path, json=payload).status_code == 200
+        assert calls, f"{path} did not call the lookup table"
+
+
+def test_lookup_explanations_match_the_compiled_tree(tree_dir, make_registry, training_rows):
+    import numpy as np
+
+    compiled = make_registry(str(tree_dir), "compiled").get().predictor
+    lookup = make_registry(str(tree_dir), "lookup").get().predictor
+    X = training_rows[0][:500]
+    scores, base_value, contributions = lookup.explain(X)
+    expected_scores, expected_base, expected_contributions = compiled.explain(X)
+    assert np.array_equal(scores, expected_scores)
+    assert base_value == expected_base
+    assert np.array_equal(contributions, expected_contributions)
+    assert lookup.explain_one(X[0]) == compiled.explain_one(X[0])
+
+
+def test_packed_mode_never_builds_the_compiled_model(forest_dir, make_registry, api, monkeypatch):
+    import model_registry
+    from compiled_model import CompiledModel
+    from packed_forest import PackedForest
+
+    expected = call_endpoints(api(make_registry(str(forest_dir), "compiled")))
+
+    def load_predictor(*args):
+        raise AssertionError("packed mode loaded the compiled model")
+    monkeypatch.setattr(model_registry, "load_predictor", load_predictor)
+    compiled_calls = spy(monkeypatch, CompiledModel, SCORING_METHODS + ["__init__"])
+    registry = make_registry(str(forest_dir), "packed")
+    assert isinstance(registry.get().predictor, PackedForest)
+    packed_calls = spy(monkeypatch, PackedForest, SCORING_METHODS)
+
+    assert call_endpoints(api(registry)) == expected
+    assert packed_calls
+    assert not compiled_calls
+
+
+def test_packed_explanations_match_the_compiled_forest(forest_dir, make_registry, training_rows):
+    import numpy as np
+
+    compiled = make_registry(str(forest_dir), "compiled").get().predictor
+    packed = make_registry(str(forest_dir), "packed").get().predictor
+    X = training_rows[0][:500]
+    scores, base_value, contributions = packed.explain(X)
+    expected_scores, expected_base, expected_contributions = compiled.explain(X)
+    # Node values are stored as float32
+    assert np.allclose(scores, expected_scores, rtol=0, atol=1e-12)
+    assert base_value == pytest.approx(expected_base, abs=1e-7)
+    assert np.allclose(contributions, expected_contributions, rtol=0, atol=1e-6)
+    score, row_contributions = packed.explain_one(X[0])
+    assert score == scores[0]
+    assert np.allclose(row_contributions, contributions[0], rtol=0, atol=1e-12)
+    assert packed.params == compiled.params
+    assert np.array_equal(packed.feature_importances_, compiled.feature_importances_)
@@ -0,0 +1,20 @@
+from conftest import PATIENT, PATIENTS
+
+
+def without(record, field):
+    return {key: value for key, value in record.items() if key != field}
+
+
+def test_gender_is_required(tree_dir, make_registry, api):
+    client = api(make_registry(str(tree_dir)))
+
+    response = client.post("/api/predict", json=without(PATIENT, "gender"))
+    assert response.status_code == 400
+    assert "Missing required field: gender" in response.get_json()["errors"]
+
+    # In a batch only the record without it fails
+    response = client.post("/api/predict/batch", json=[PATIENTS[0], without(PATIENTS[1], "gender")])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert [error["index"] for error in body["errors"]] == [1]
+    assert "gender" in str(body["errors"][0])
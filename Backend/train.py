@@ -0,0 +1,239 @@
+"""Model selection training pipeline (5_final_model_training.ipynb as a module).
+
+Usage:
+    python Backend/train.py [--folds 5] [--jobs -1] [--latency-weight 0.0] [--no-save]
+
+Fits Logistic Regression, Decision Tree, KNN and Random Forest on the same
+stratified 80/20 split as the notebook, plus k-fold cross-validation on the
+training part. All fits run in parallel across cores. Data comes from the
+columnar dataset cache (dataset.py), so reruns skip parsing and cleaning.
+
+Besides accuracy, the report records fit time, serving latency (the compiled
+single-row path the API uses, or the prebuilt index for KNN) and model size.
+Selection maximises
+
+    accuracy - latency_weight * log10(latency in microseconds)
+
+so with the default weight of 0 the most accurate model wins, as in the
+notebook; a weight of 0.01 trades one accuracy point per 10x latency.
+Models over --max-latency-ms are never selected.
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import warnings
+from datetime import datetime
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from compiled_model import compile_model, file_fingerprint, fold_scaler
+from dataset import DATA_PATH, load_dataset
+from knn_index import KNNIndexModel, build_knn_index, index_dir, is_knn, save_knn_index
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+
+def candidate_models():
+    """The candidates from 5_final_model_training.ipynb"""
+    return {
+        "Logistic Regression": LogisticRegression(max_iter=1000, class_weight="balanced"),
+        "Decision Tree": DecisionTreeClassifier(max_depth=6, random_state=42),
+        "KNN": KNeighborsClassifier(n_neighbors=7),
+        "Random Forest": RandomForestClassifier(n_estimators=200, random_state=42),
+    }
+
+
+def fit_and_score(name, model, X_train, y_train, X_test, y_test, fold):
+    """Fit one candidate (scaler fitted on its own training rows) and score it
+
+    Hold-out fits also get AUC-ROC and F1 (reported by /api/assessment).
+    """
+    scaler = StandardScaler()
+    start = time.perf_counter()
+    X_train_scaled = scaler.fit_transform(X_train)
+    fitted = clone(model).fit(X_train_scaled, y_train)
+    fit_time = time.perf_counter() - start
+    X_test_scaled = scaler.transform(X_test)
+    predictions = fitted.predict(X_test_scaled)
+    scores = {"accuracy": accuracy_score(y_test, predictions)}
+    if fold is None:
+        scores["auc_roc"] = float(roc_auc_score(y_test, fitted.predict_proba(X_test_scaled)[:, 1]))
+        scores["f1_score"] = float(f1_score(y_test, predictions))
+    else:
+        # Only the hold-out fit is kept; CV folds just report accuracy
+        fitted = scaler = None
+    return name, fold, scores, fit_time, fitted, scaler
+
+
+def serving_latency_us(model, scaler, rows):
+    """Median single-row latency of the path the API would use for this model"""
+    try:
+        predictor = fold_scaler(compile_model(model, scaler))
+        predict = predictor.predict_one
+    except ValueError:
+        if is_knn(model):
+            predict = KNNIndexModel(*build_knn_index(model, scaler)).predict_one
+        else:
+            def predict(row):
+                return model.predict_proba(scaler.transform(row.reshape(1, -1)))[0, 1]
+    for row in rows[:10]:
+        predict(row)
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+
+def select_model(details, latency_weight=0.0, max_latency_ms=None):
+    """Best model by accuracy, penalised by serving latency"""
+    scores = {}
+    for name, d in details.items():
+        if max_latency_ms is not None and d["latency_us"] > max_latency_ms * 1000:
+            continue
+        scores[name] = d["accuracy"] - latency_weight * np.log10(max(d["latency_us"], 1.0))
+    if not scores:
+        raise ValueError("No model meets the latency budget")
+    return max(scores, key=scores.get), scores
+
+
+def save_atomic(obj, path):
+    tmp_path = path + ".tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_artifacts(model, scaler, report, output_dir):
+    """Write the model, scaler, compiled model and report the API loads
+
+    Each file is written to a temporary name and renamed, so none is ever
+    half-written, but the renames are separate: a reload between them could
+    see a new pickle next to an old scaler. The report goes last and lists
+    the sha256 of every other artifact; the registry (model_registry.py)
+    refuses a set of files that does not match it and keeps serving the
+    previous model until the report arrives.
+    """
+    model_path = os.path.join(output_dir, "cardio_model.pkl")
+    scaler_path = os.path.join(output_dir, "scaler.pkl")
+    save_atomic(model, model_path)
+    save_atomic(scaler, scaler_path)
+    fingerprint = file_fingerprint(model_path, scaler_path)
+    compiled_path = os.path.join(output_dir, "cardio_model.npz")
+    try:
+        compiled = fold_scaler(compile_model(model, scaler))
+        # Marks which pickles it was compiled from (see load_predictor)
+        compiled.meta["source_fingerprint"] = fingerprint
+        compiled.save(compiled_path + ".tmp.npz")
+        os.replace(compiled_path + ".tmp.npz", compiled_path)
+    except ValueError:
+        # Not compilable (KNN): drop any old compiled model so the API falls
+        # back to the new pickle, and prebuild its neighbour index
+        if os.path.exists(compiled_path):
+            os.remove(compiled_path)
+        if is_knn(model):
+            arrays, meta = build_knn_index(model, scaler)
+            save_knn_index(arrays, meta, fingerprint, index_dir(model_path))
+    artifacts = {"model": model_path, "scaler": scaler_path, "compiled": compiled_path}
+    report = dict(report, artifacts={role: file_fingerprint(path) for role, path in artifacts.items()
+                                     if os.path.exists(path)})
+    report_path = os.path.join(output_dir, "model_report.json")
+    with open(report_path + ".tmp", "w") as f:
+        json.dump(report, f)
+    os.replace(report_path + ".tmp", report_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and select the cardio risk model")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--folds", type=int, default=5, help="Cross-validation folds (0 to skip)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel jobs (default: all cores)")
+    parser.add_argument("--latency-weight", type=float, default=0.0,
+                        help="Accuracy given up per 10x serving latency (default: 0, accuracy only)")
+    parser.add_argument("--max-latency-ms", type=float, default=None, help="Never select slower models")
+    parser.add_argument("--output-dir", default=BACKEND_DIR)
+    parser.add_argument("--no-save", action="store_true", help="Print the report without writing artifacts")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dataset = load_dataset(args.data)
+    X, y = dataset.feature_matrix(), dataset.labels
+    load_time = time.perf_counter() - start
+    print(f"Loaded {len(X)} rows in {load_time:.2f}s")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    # Hold-out fits and CV folds for every candidate, all in one parallel pass
+    models = candidate_models()
+    jobs = [(name, model, X_train, y_train, X_test, y_test, None) for name, model in models.items()]
+    if args.folds > 1:
+        folds = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=42)
+        for k, (train_idx, test_idx) in enumerate(folds.split(X_train, y_train)):
+            for name, model in models.items():
+                jobs.append((name, model, X_train[train_idx], y_train[train_idx],
+                             X_train[test_idx], y_train[test_idx], k))
+    start = time.perf_counter()
+    outputs = Parallel(n_jobs=args.jobs)(delayed(fit_and_score)(*job) for job in jobs)
+    print(f"Ran {len(jobs)} fits in {time.perf_counter() - start:.2f}s")
+
+    rows = X_test[:500]
+    details, fitted = {}, {}
+    for name, fold, metrics, fit_time, model, scaler in outputs:
+        d = details.setdefault(name, {"cv_accuracies": []})
+        if fold is None:
+            fitted[name] = (model, scaler)
+            d.update(metrics)
+            d["fit_time_s"] = round(fit_time, 3)
+            d["latency_us"] = round(serving_latency_us(model, scaler, rows), 2)
+            d["size_bytes"] = len(pickle.dumps(model))
+        else:
+            d["cv_accuracies"].append(metrics["accuracy"])
+    for d in details.values():
+        if d["cv_accuracies"]:
+            d["cv_mean"] = float(np.mean(d["cv_accuracies"]))
+            d["cv_std"] = float(np.std(d["cv_accuracies"]))
+
+    best_name, scores = select_model(details, args.latency_weight, args.max_latency_ms)
+    for name, d in details.items():
+        print(f"{name:20s} accuracy {d['accuracy']:.4f}  cv {d.get('cv_mean', float('nan')):.4f}  "
+              f"fit {d['fit_time_s']:7.3f}s  latency {d['latency_us']:9.2f}us  size {d['size_bytes']:>10d} B")
+    print(f"Best model selected: {best_name}")
+
+    report = {
+        "models": {name: d["accuracy"] for name, d in details.items()},
+        "best_model": best_name,
+        "details": details,
+        "selection": {
+            "latency_weight": args.latency_weight,
+            "max_latency_ms": args.max_latency_ms,
+            "scores": scores,
+        },
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    if args.no_save:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    best_model, scaler = fitted[best_name]
+    save_artifacts(best_model, scaler, report, args.output_dir)
+    print(f"Artifacts written to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -21,6 +21,7 @@ export const api = {
   endpoints: {
     health: `${API_BASE_URL}/api/health`,
     predict: `${API_BASE_URL}/api/predict`,
+    assess: `${API_BASE_URL}/api/assess`,
     assessment: `${API_BASE_URL}/api/assessment`,
     report: `${API_BASE_URL}/api/report`,
   },
@@ -97,10 +97,13 @@ export default function Assessment() {
     const smokeMap = { 'No': 0, 'Yes': 1 };
     const alcoholMap = { 'No': 0, 'Yes': 1 };
     const activeMap = { 'Inactive': 0, 'Active': 1 };
+    const genderMap = { 'Female': 0, 'Male': 1 };
 
     try {
       const payload = {
+        name: formData.name,
         age: parseFloat(formData.age),
+        gender: genderMap[formData.gender],
         bmi: bmi,
         cholesterol: cholMap[formData.chol],
         gluc: glucMap[formData.gluc],
@@ -111,7 +114,8 @@ export default function Assessment() {
         physical_activity: activeMap[formData.active],
       };
 
-      const response = await axios.post(api.endpoints.predict, payload);
+      // Score, feature impacts and report come back from a single call
+      const response = await axios.post(api.endpoints.assess, payload);
       
       // Store result and form data with patient name
       localStorage.setItem('assessmentResult', JSON.stringify(response.data));
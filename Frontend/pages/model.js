@@ -35,7 +35,7 @@ export default function Model() {
   const [activeTab, setActiveTab] = useState('metrics');
 
   useEffect(() => {
-    axios.get("api/assessment")
+    axios.get(api.endpoints.assessment)
       .then(response => {
         setModelInfo(response.data);
         setLoading(false);
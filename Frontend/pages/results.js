@@ -407,7 +407,7 @@ export default function Results() {
             </p>
           )}
           <p className="text-muted-foreground">
-            Prediction generated on {formatDate(result.timestamp)} • Ref ID: {formatRefId(result.timestamp)}
+            Prediction generated on {formatDate(result.timestamp)} • Ref ID: {result.report?.report_id || formatRefId(result.timestamp)}
           </p>
         </motion.div>
 
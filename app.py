@@ -1,10 +1,8 @@
+import os
+import sys
 import streamlit as st
 import numpy as np
-import joblib
-import json
-import plotly.graph_objects as go
-from fpdf import FPDF
-from datetime import datetime
+from functools import partial
 
 # ================== PAGE CONFIG ==================
 st.set_page_config(
@@ -14,14 +12,26 @@ st.set_page_config(
 )
 
 # ================== LOAD BEST MODEL ==================
-model = joblib.load("cardio_model.pkl")
-scaler = joblib.load("scaler.pkl")
+# Shared with the Flask API: loaded once per process, swapped when the files change
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+from feature_schema import FEATURES, encoder, get_field, validate_bp
+from risk_levels import risk_level as classify_level
 
-with open("model_report.json", "r") as f:
-    model_report = json.load(f)
 
-model_accuracies = model_report["models"]
-best_model_name = model_report["best_model"]
+@st.cache_resource(show_spinner="Loading model...")
+def get_registry():
+    # One registry for every session and rerun; get() below is a cheap check
+    # that still picks up a retrained model
+    from model_registry import registry
+    registry.get()
+    return registry
+
+
+loaded_model = get_registry().get()
+model = loaded_model.predictor
+
+model_accuracies = loaded_model.accuracies
+best_model_name = loaded_model.name
 
 # ================== SESSION STATE ==================
 if "step" not in st.session_state:
@@ -49,123 +59,46 @@ for k, v in defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
 
-# ================== BP VALIDATION ==================
-def validate_bp(sys_bp, dia_bp):
-    if sys_bp <= dia_bp:
-        return False, "Systolic BP must be higher than Diastolic BP."
-    if sys_bp < 70 or sys_bp > 250:
-        return False, "Systolic BP value looks unrealistic."
-    if dia_bp < 40 or dia_bp > 150:
-        return False, "Diastolic BP value looks unrealistic."
-    return True, ""
-
-# ================== PDF REPORT GENERATION ==================
-
-def generate_pdf_report(data, bmi, risk_percent, probability):
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-
-    # Title
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Cardiovascular Health Report", ln=True, align="C")
-    pdf.ln(5)
-
-    # Patient Summary
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, "Patient Summary", ln=True)
-
-    pdf.set_font("Arial", size=11)
-    pdf.cell(0, 8, f"Name: {data.get('name', 'N/A')}", ln=True)
-    pdf.cell(0, 8, f"Age: {data['age']} years", ln=True)
-    pdf.cell(0, 8, f"BMI: {bmi:.2f}", ln=True)
-    pdf.cell(0, 8, f"Blood Pressure: {data['ap_hi']}/{data['ap_lo']} mmHg", ln=True)
-    pdf.ln(4)
-
-    # Risk Section
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, "Risk Assessment", ln=True)
-
-    pdf.set_font("Arial", size=11)
-    pdf.cell(0, 8, f"Predicted Cardiovascular Risk: {risk_percent:.1f}%", ln=True)
-
-    if risk_percent < 30:
-        pdf.cell(0, 8, "Risk Category: LOW", ln=True)
-    elif risk_percent < 70:
-        pdf.cell(0, 8, "Risk Category: MODERATE", ln=True)
-    else:
-        pdf.cell(0, 8, "Risk Category: HIGH", ln=True)
-
+# ================== INPUT OPTIONS ==================
+# Labels and ranges come from the shared feature schema (Backend/feature_schema.py)
+GENDER_OPTIONS = list(get_field("gender").labels)
+LEVEL_OPTIONS = list(get_field("cholesterol").labels)
+YES_NO_OPTIONS = list(get_field("smoke").labels)
+ACTIVITY_OPTIONS = list(get_field("active").labels)
+SYSTOLIC = get_field("ap_hi")
+DIASTOLIC = get_field("ap_lo")
 
-    pdf.ln(4)
+# ================== RISK GAUGE ==================
 
-    # Recommendations
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, "Recommendations", ln=True)
-
-    pdf.set_font("Arial", size=11)
-    if risk_percent < 30:
-        recs = [
-            "Maintain active lifestyle",
-            "Follow balanced diet",
-            "Annual health screening recommended"
-        ]
-    elif risk_percent < 70:
-        recs = [
-            "Increase physical activity",
-            "Monitor blood pressure regularly",
-            "Adopt preventive lifestyle measures"
-        ]
-    else:
-        recs = [
-            "Consult a cardiologist",
-            "Monitor blood pressure regularly",
-            "Adopt heart-healthy lifestyle changes"
-        ]
+def risk_gauge(risk_percent, risk_level):
+    # plotly is only imported once a report is shown, not on the form steps
+    import plotly.graph_objects as go
 
+    fig = go.Figure(go.Pie(
+        values=[risk_percent, 100 - risk_percent],
+        hole=0.75,
+        marker=dict(colors=[
+            "#22c55e" if risk_level == "LOW" else
+            "#f59e0b" if risk_level == "MODERATE" else
+            "#ef4444",
+            "#e5e7eb"
+        ]),
 
-    for r in recs:
-        pdf.cell(0, 8, f"- {r}", ln=True)
-
-    pdf.ln(6)
-
-    # Disclaimer
-    pdf.set_font("Arial", "I", 9)
-    pdf.multi_cell(
-        0, 6,
-        "Disclaimer: This report is generated using a machine learning model "
-        "and is intended for educational purposes only. It should not be used "
-        "as a substitute for professional medical advice."
-    )
-
-    # ---------- FIXED FOOTER (SAME PAGE) ----------
-    pdf.set_auto_page_break(auto=False)  # 🔑 STOP page breaking
-
-    pdf.set_y(-15)  # 15mm from bottom
-    pdf.set_font("Arial", size=9)
-
-    # Left footer: Model Used
-    pdf.set_x(10)
-    pdf.cell(
-        0,
-        8,
-        f"Model Used: {best_model_name}",
-        align="L"
-    )
+        textinfo="none"
+    ))
 
-    # Right footer: Generated On
-    pdf.set_x(-90)
-    pdf.cell(
-        80,
-        8,
-        f"Generated on: {datetime.now().strftime('%d %b %Y, %I:%M %p')}",
-        align="R"
+    fig.update_layout(
+        showlegend=False,
+        annotations=[dict(
+            text=f"<b>{risk_percent:.1f}%</b><br>Risk",
+            x=0.5, y=0.5,
+            font_size=22,
+            showarrow=False
+        )],
+        height=320,
+        margin=dict(t=20, b=20, l=20, r=20)
     )
-
-    pdf.set_auto_page_break(auto=True, margin=15)  # 🔁 Restore
-
-
-    return pdf.output(dest="S").encode("latin-1")
+    return fig
 
 # ================== HEADER ==================
 st.markdown("""
@@ -236,8 +169,8 @@ if st.session_state.step == 1:
         st.session_state.age = st.slider("Age (Years)", 20, 90, st.session_state.age)
 
         st.session_state.gender = st.selectbox(
-            "Gender", ["Female", "Male"],
-            index=["Female", "Male"].index(st.session_state.gender)
+            "Gender", GENDER_OPTIONS,
+            index=GENDER_OPTIONS.index(st.session_state.gender)
         )
     with c2:
         st.session_state.height = st.number_input("Height (cm)", 140, 210, st.session_state.height)
@@ -257,19 +190,19 @@ elif st.session_state.step == 2:
 
     c1, c2 = st.columns(2)
     with c1:
-        st.session_state.ap_hi = st.number_input("Systolic BP", 70, 250, st.session_state.ap_hi)
-        st.session_state.ap_lo = st.number_input("Diastolic BP", 40, 150, st.session_state.ap_lo)
+        st.session_state.ap_hi = st.number_input("Systolic BP", SYSTOLIC.minimum, SYSTOLIC.maximum, st.session_state.ap_hi)
+        st.session_state.ap_lo = st.number_input("Diastolic BP", DIASTOLIC.minimum, DIASTOLIC.maximum, st.session_state.ap_lo)
 
     with c2:
         st.session_state.chol = st.selectbox(
             "Cholesterol Level",
-            ["Normal", "Above Normal", "Well Above Normal"],
-            index=["Normal", "Above Normal", "Well Above Normal"].index(st.session_state.chol)
+            LEVEL_OPTIONS,
+            index=LEVEL_OPTIONS.index(st.session_state.chol)
         )
         st.session_state.gluc = st.selectbox(
             "Glucose Level",
-            ["Normal", "Above Normal", "Well Above Normal"],
-            index=["Normal", "Above Normal", "Well Above Normal"].index(st.session_state.gluc)
+            LEVEL_OPTIONS,
+            index=LEVEL_OPTIONS.index(st.session_state.gluc)
         )
 
     valid, err = validate_bp(st.session_state.ap_hi, st.session_state.ap_lo)
@@ -293,18 +226,18 @@ elif st.session_state.step == 3:
     c1, c2 = st.columns(2)
     with c1:
         st.session_state.smoke = st.selectbox(
-            "Smoking", ["No", "Yes"],
-            index=["No", "Yes"].index(st.session_state.smoke)
+            "Smoking", YES_NO_OPTIONS,
+            index=YES_NO_OPTIONS.index(st.session_state.smoke)
         )
     with c2:   
         st.session_state.alcohol = st.selectbox(
-            "Alcohol Consumption", ["No", "Yes"],
-            index=["No", "Yes"].index(st.session_state.alcohol)
+            "Alcohol Consumption", YES_NO_OPTIONS,
+            index=YES_NO_OPTIONS.index(st.session_state.alcohol)
         )
     
     st.session_state.active = st.selectbox(
-        "Physical Activity", ["Inactive", "Active"],
-        index=["Inactive", "Active"].index(st.session_state.active)
+        "Physical Activity", ACTIVITY_OPTIONS,
+        index=ACTIVITY_OPTIONS.index(st.session_state.active)
     )
 
     b1, b2 = st.columns(2)
@@ -335,53 +268,47 @@ elif st.session_state.step == 4 and st.session_state.final_inputs:
 
     bmi = data["weight"] / ((data["height"] / 100) ** 2)
 
-    gender_val = 1 if st.session_state.gender == "Male" else 0
-    smoke_val = 1 if st.session_state.smoke == "Yes" else 0
-    alco_val = 1 if st.session_state.alcohol == "Yes" else 0
-    active_val = 1 if st.session_state.active == "Active" else 0
-
-    chol_map = {"Normal": 1, "Above Normal": 2, "Well Above Normal": 3}
-    gluc_map = {"Normal": 1, "Above Normal": 2, "Well Above Normal": 3}
-
-    input_data = np.array([[
-        data["age"],
-        gender_val,
-        data["ap_hi"],
-        data["ap_lo"],
-        chol_map[data["chol"]],
-        gluc_map[data["gluc"]],
-        smoke_val,
-        alco_val,
-        active_val,
-        bmi
-    ]])
-
-    input_scaled = scaler.transform(input_data)
-    probability = model.predict_proba(input_scaled)[0][1]
+    # Same validation and encoding as the API; labels map to the training codes
+    features, errors = encoder.encode_one({
+        "age": data["age"],
+        "gender": st.session_state.gender,
+        "ap_hi": data["ap_hi"],
+        "ap_lo": data["ap_lo"],
+        "cholesterol": data["chol"],
+        "gluc": data["gluc"],
+        "smoke": st.session_state.smoke,
+        "alco": st.session_state.alcohol,
+        "active": st.session_state.active,
+        "bmi": bmi,
+    })
+    if errors:
+        st.error(" ".join(errors))
+        st.stop()
+
+    # The scaler is folded into the model, so raw features go straight in
+    probability = model.predict_one(features)
     risk_percent = float(np.clip(probability * 100, 0, 100))
 
     # -------- RISK LEVEL CLASSIFICATION --------
-    if risk_percent < 30:
-        risk_level = "LOW"
-        recs = [
+    # Same thresholds as the API and the PDF report (risk_levels.py)
+    risk_level = classify_level(probability)
+    recs = {
+        "LOW": [
             "Maintain active lifestyle",
             "Balanced diet",
             "Annual health screening"
-        ]
-    elif risk_percent < 70:
-        risk_level = "MODERATE"
-        recs = [
+        ],
+        "MODERATE": [
             "Improve diet & physical activity",
             "Regular BP & glucose monitoring",
             "Preventive medical consultation"
-        ]
-    else:
-        risk_level = "HIGH"
-        recs = [
+        ],
+        "HIGH": [
             "Consult a cardiologist",
             "Monitor BP & cholesterol",
             "Immediate lifestyle modifications"
-        ]
+        ],
+    }[risk_level]
 
     st.subheader("📄 Cardiovascular Health Report")
 
@@ -397,30 +324,7 @@ elif st.session_state.step == 4 and st.session_state.final_inputs:
     st.divider()
 
     # -------- MODERN DONUT GAUGE --------
-    fig = go.Figure(go.Pie(
-        values=[risk_percent, 100 - risk_percent],
-        hole=0.75,
-        marker=dict(colors=[
-            "#22c55e" if risk_level == "LOW" else
-            "#f59e0b" if risk_level == "MODERATE" else
-            "#ef4444",
-            "#e5e7eb"
-        ]),
-
-        textinfo="none"
-    ))
-
-    fig.update_layout(
-        showlegend=False,
-        annotations=[dict(
-            text=f"<b>{risk_percent:.1f}%</b><br>Risk",
-            x=0.5, y=0.5,
-            font_size=22,
-            showarrow=False
-        )],
-        height=320,
-        margin=dict(t=20, b=20, l=20, r=20)
-    )
+    fig = risk_gauge(risk_percent, risk_level)
 
     c1, c2 = st.columns([1, 1])
     with c1:
@@ -441,6 +345,22 @@ elif st.session_state.step == 4 and st.session_state.final_inputs:
         for r in recs:
             st.markdown(f"- {r}")
 
+        # ---- Population Context ----
+        # Percentiles against every patient in cleaned_cardio.csv, scored by this model
+        from risk_percentiles import get_distribution
+        try:
+            distribution = get_distribution(loaded_model)
+        except Exception:
+            distribution = None
+        population = distribution.describe(
+            probability, features[FEATURES.index("age")], features[FEATURES.index("gender")]
+        ) if distribution is not None else None
+        if population and population["percentile"] is not None:
+            st.markdown(
+                f"**Population percentile:** {population['percentile']:.0f} among "
+                f"{population['percentile_group']} ({population['overall_percentile']:.0f} among all patients)"
+            )
+
 
     st.info("⚠️ This report is generated using a machine learning model and is for educational purposes only.")
 
@@ -453,11 +373,18 @@ elif st.session_state.step == 4 and st.session_state.final_inputs:
     )
 
     # -------- DOWNLOAD PDF REPORT --------
-    pdf_bytes = generate_pdf_report(
-        data=data,
+    # Built only when the button is clicked (and memoized), not on every rerun
+    from pdf_report import render_report
+    pdf_report = partial(
+        render_report,
+        name=data.get("name", "N/A"),
+        age=data["age"],
         bmi=bmi,
+        ap_hi=data["ap_hi"],
+        ap_lo=data["ap_lo"],
         risk_percent=risk_percent,
-        probability=probability
+        model_name=best_model_name,
+        level=risk_level
     )
 
     if patient_name:
@@ -468,9 +395,10 @@ elif st.session_state.step == 4 and st.session_state.final_inputs:
 
     st.download_button(
         label="📄 Download PDF Report",
-        data=pdf_bytes,
+        data=pdf_report,
         file_name=pdf_filename,
-        mime="application/pdf"
+        mime="application/pdf",
+        on_click="ignore"
     )
 
     if st.button("← Edit Information"):